@@ -0,0 +1,216 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import glob
+import hashlib
+import marshal
+import os
+import sys
+import tempfile
+import time
+import typing
+
+from LineIndex import LineIndex
+from TokenBuffer import TokenBuffer
+
+# Default bound on the total size of a cache directory
+DEFAULT_CACHE_SIZE = 256 * 1024 * 1024
+
+# Identifies (and versions) the binary format of cached token buffers
+TOKENS_MAGIC = b'JTOK1'
+
+# Age in seconds after which a temporary file is taken to be left over from
+# a build that was killed while writing it
+STALE_TEMPORARY_AGE = 60 * 60
+
+
+def compiler_version() -> str:
+    """
+    Returns:
+        str: a digest of the compiler's own source files and of the platform
+        details the cache format depends on, so any change to the compiler
+        invalidates the entries it wrote.
+    """
+    digest = hashlib.sha256(f"{sys.version_info[:2]} {sys.byteorder}".encode())
+    for path in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), '*.py'))):
+        with open(path, 'rb') as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+class BuildCache:
+    """A content-addressed cache directory shared by builds. Entries are named
+    after a hash of the source and the compiler version, and hold either the
+    token buffer of a source or the VM code it compiled to.
+
+    Entries are written to a temporary file and renamed into place, so
+    concurrent builds only ever see complete entries. Reading an entry marks
+    it as recently used, and the least recently used entries are deleted
+    whenever the directory grows past its size bound, along with temporary
+    files left behind by builds that were killed. The size of the directory
+    is counted from a scan of it on the first write, and then kept up to
+    date with the writes of this build; those of concurrent builds are only
+    seen at the next scan. An entry that cannot be decoded, such as one
+    damaged on disk, is deleted and treated as missing.
+    """
+
+    def __init__(self, directory: str, max_size: int = DEFAULT_CACHE_SIZE) -> None:
+        """Opens (and creates if needed) a cache directory.
+
+        Args:
+            directory (str): the cache directory.
+            max_size (int): the size in bytes the directory is kept under.
+        """
+        self.directory = directory
+        self.max_size = max_size
+        self.version = compiler_version()
+        # The total size of the entries, or None before the directory is scanned
+        self.size = None
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, source: str, *options: str) -> str:
+        """
+        Args:
+            source (str): the Jack source code.
+            options (str): anything else the cached result depends on.
+
+        Returns:
+            str: the key of the entries for the source.
+        """
+        digest = hashlib.sha256(self.version.encode())
+        for option in options:
+            digest.update(b'\0' + option.encode())
+        digest.update(b'\0' + source.encode())
+        return digest.hexdigest()
+
+    def load_tokens(self, key: str, line_index: LineIndex) -> typing.Optional[TokenBuffer]:
+        """
+        Args:
+            key (str): the key of the source.
+            line_index (LineIndex): the line index of the source.
+
+        Returns:
+            TokenBuffer: the cached tokens of the source, or None.
+        """
+        name = f"{key}.tokens"
+        data = self._read(name)
+        if data is None:
+            return None
+        buffer = TokenBuffer((), line_index)
+        try:
+            if not data.startswith(TOKENS_MAGIC):
+                raise ValueError("not a token buffer")
+            types, value_ids, offsets, values = marshal.loads(data[len(TOKENS_MAGIC):])
+            buffer.types.frombytes(types)
+            buffer.value_ids.frombytes(value_ids)
+            buffer.offsets.frombytes(offsets)
+        except (EOFError, ValueError, TypeError):
+            self._discard(name)
+            return None
+        buffer.values = values
+        return buffer
+
+    def store_tokens(self, key: str, buffer: TokenBuffer) -> None:
+        """Caches the tokens of a source.
+
+        Args:
+            key (str): the key of the source.
+            buffer (TokenBuffer): its tokens.
+        """
+        self._write(f"{key}.tokens", TOKENS_MAGIC + marshal.dumps(
+            (buffer.types.tobytes(), buffer.value_ids.tobytes(), buffer.offsets.tobytes(), buffer.values)))
+
+    def load_output(self, key: str) -> typing.Optional[str]:
+        """
+        Args:
+            key (str): the key of the source and compile options.
+
+        Returns:
+            str: the cached VM code, or None.
+        """
+        name = f"{key}.vm"
+        data = self._read(name)
+        if data is None:
+            return None
+        try:
+            return data.decode()
+        except UnicodeDecodeError:
+            self._discard(name)
+            return None
+
+    def store_output(self, key: str, output: str) -> None:
+        """Caches the VM code a source compiled to.
+
+        Args:
+            key (str): the key of the source and compile options.
+            output (str): the VM code.
+        """
+        self._write(f"{key}.vm", output.encode())
+
+    def _read(self, name: str) -> typing.Optional[bytes]:
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+            # Marks the entry as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            # Never written, or evicted by another build
+            return None
+        return data
+
+    def _discard(self, name: str) -> None:
+        """Deletes an entry that is corrupt."""
+        try:
+            os.unlink(os.path.join(self.directory, name))
+        except FileNotFoundError:
+            pass
+
+    def _write(self, name: str, data: bytes) -> None:
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory, prefix='.', suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                file.write(data)
+            os.replace(temporary, os.path.join(self.directory, name))
+        except BaseException:
+            os.unlink(temporary)
+            raise
+        if self.size is None:
+            self._evict()
+        else:
+            # Replacing an entry counts it twice, until the next scan
+            self.size += len(data)
+            if self.size > self.max_size:
+                self._evict()
+
+    def _evict(self) -> None:
+        """Scans the directory, and deletes stale temporary files and least
+        recently used entries until the cache fits its bound.
+        """
+        entries = []
+        stale = time.time() - STALE_TEMPORARY_AGE
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                try:
+                    stat = entry.stat()
+                    if entry.name.startswith('.'):
+                        if entry.name.endswith('.tmp') and stat.st_mtime < stale:
+                            os.unlink(entry.path)
+                        continue
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self.size = total
@@ -0,0 +1,88 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+
+from Constants import os_subroutines
+
+# Where a program starts: Sys.init when the OS is compiled with it, which
+# calls Main.main, and Main.main otherwise
+entry_points = ('Sys.init', 'Main.main')
+
+
+class CallGraph:
+    """The calls between the subroutines of a program, read off their VM
+    code. Jack has no function pointers, and the code generator resolves
+    every method call to the class of the variable it is called on, so each
+    call command names its callee.
+    """
+
+    def __init__(self) -> None:
+        # Subroutine -> the subroutines it calls
+        self.calls = dict()
+        # Subroutine -> the number of VM commands it compiles to
+        self.sizes = dict()
+
+    def add_subroutine(self, commands: typing.List[str]) -> None:
+        """
+        Args:
+            commands (typing.List[str]): lines of VM code of a subroutine,
+            from its function command on.
+        """
+        name = commands[0].split()[1]
+        self.calls[name] = {line.split()[1] for line in commands if line.startswith('call ')}
+        self.sizes[name] = len(commands)
+
+    def os_roots(self) -> typing.List[str]:
+        """
+        Returns:
+            list: the subroutines of the OS the program defines itself. The
+            OS calls them without calls in the program: Sys.init calls the
+            init of every OS class, and an OS subroutine, such as
+            Output.printString, may call the others, such as String.charAt.
+        """
+        return [f"{class_name}.{name}" for class_name, names in os_subroutines.items()
+                for name in names if f"{class_name}.{name}" in self.calls]
+
+    def reachable(self, roots: typing.Iterable[str] = entry_points) -> typing.Set[str]:
+        """
+        Args:
+            roots (typing.Iterable[str]): where the program starts.
+
+        Returns:
+            set: the subroutines of the program that can be called from a
+            root that is in the program, or from the OS, or all of them if
+            no root is in the program.
+        """
+        pending = [root for root in roots if root in self.calls]
+        if not pending:
+            return set(self.calls)
+        pending.extend(self.os_roots())
+        reached = set()
+        while pending:
+            name = pending.pop()
+            if name in reached:
+                continue
+            reached.add(name)
+            # Calls of the OS, when it is not part of the program, lead nowhere
+            pending.extend(callee for callee in self.calls[name] if callee in self.calls)
+        return reached
+
+    def report(self, reached: typing.AbstractSet[str]) -> str:
+        """
+        Args:
+            reached (typing.AbstractSet[str]): the subroutines that are kept.
+
+        Returns:
+            str: the subroutines that are not reached, with their sizes.
+        """
+        dropped = sorted(name for name in self.calls if name not in reached)
+        lines = [f"{name:40}{self.sizes[name]:>8}" for name in dropped]
+        total = sum(self.sizes[name] for name in dropped)
+        lines.append(f"dropped {len(dropped)} of {len(self.calls)} subroutines, "
+                     f"{total} of {sum(self.sizes.values())} VM commands")
+        return '\n'.join(lines)
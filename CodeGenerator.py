@@ -0,0 +1,865 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+
+from CommonSubexpressions import CommonSubexpressions
+from Constants import *
+from ConstantFolder import ConstantFolder, constant_value, wrap
+from FlowOptimizer import FlowOptimizer
+from LineIndex import LineIndex
+from LocalAllocator import LocalAllocator
+from LoopInvariantMotion import LoopInvariantMotion
+from PeepholeOptimizer import PeepholeOptimizer
+from Profile import Profile, loop_label
+from StrengthReducer import StrengthReducer
+from SymbolTable import *
+from SyntaxTree import *
+from ThreeAddressCode import IROptimizer
+from VMWriter import VMWriter
+
+
+# Binary operators whose operands may be evaluated in either order, and the
+# operator that applies when the right operand is evaluated first
+mirrored_ops = {'+': '+', '*': '*', '&': '&', '|': '|', '=': '=', '<': '>', '>': '<'}
+
+
+def is_boolean(expression: Expression) -> bool:
+    """
+    Returns:
+        bool: whether the expression is always 0 (false) or -1 (true).
+    """
+    kind = type(expression)
+    if kind is Binary:
+        if expression.op in ('<', '>', '='):
+            return True
+        return expression.op in ('&', '|') and is_boolean(expression.left) and is_boolean(expression.right)
+    if kind is Unary:
+        return expression.op == '~' and is_boolean(expression.operand)
+    if kind is Save:
+        return is_boolean(expression.value)
+    if kind is Reuse:
+        return is_boolean(expression.save.value)
+    value = constant_value(expression)
+    return value == 0 or value == -1
+
+
+def is_skippable(expression: Expression) -> bool:
+    """
+    Returns:
+        bool: whether leaving the expression unevaluated is unobservable: it
+        calls nothing, and keeps no value for a Reuse.
+    """
+    kind = type(expression)
+    if kind is Call or kind is StringConst or kind is Save and expression.slot is not None:
+        return False
+    if kind is Binary:
+        return expression.op not in ('*', '/') and is_skippable(expression.left) and is_skippable(expression.right)
+    if kind is Unary:
+        return is_skippable(expression.operand)
+    if kind is Index:
+        return is_skippable(expression.index)
+    if kind is Load:
+        return is_skippable(expression.address)
+    if kind is Save:
+        return is_skippable(expression.value)
+    return True
+
+
+def unsaved(expression: Expression) -> Expression:
+    """
+    Returns:
+        Expression: the expression, without the Saves around it whose value
+        is never reused, which compile to just their value.
+    """
+    while type(expression) is Save and expression.slot is None:
+        expression = expression.value
+    return expression
+
+
+def returns(statements: typing.Iterable[Statement]) -> typing.Iterator[Return]:
+    """
+    Returns:
+        iterator: the return statements among the statements, nested ones
+        included.
+    """
+    for statement in statements:
+        kind = type(statement)
+        if kind is Return:
+            yield statement
+        elif kind is If:
+            yield from returns(statement.then)
+            if statement.otherwise is not None:
+                yield from returns(statement.otherwise)
+        elif kind is While:
+            yield from returns(statement.body)
+
+
+def loops(statements: typing.Iterable[Statement]) -> typing.Iterator[While]:
+    """
+    Returns:
+        iterator: the while statements among the statements, nested ones
+        included, in source order.
+    """
+    for statement in statements:
+        kind = type(statement)
+        if kind is While:
+            yield statement
+            yield from loops(statement.body)
+        elif kind is If:
+            yield from loops(statement.then)
+            if statement.otherwise is not None:
+                yield from loops(statement.otherwise)
+
+
+class CodeGenerator:
+    """Compiles the syntax tree of a class, as built by JackParser, into VM
+    code. Emits exactly the code the single pass CompilationEngine emits for
+    the same source; statements and expressions are dispatched through
+    tables keyed by node class.
+
+    Optimizations are enabled by name:
+    - fold: evaluate constant subexpressions at compile time.
+    - strength: lower multiplication and division by constants to shifts.
+    - licm: compute loop-invariant expressions once before each while loop,
+      into new local variables, with a LoopInvariantMotion.
+    - strings: build each distinct string literal of a class once, into a
+      static variable, instead of every time it is evaluated. Programs that
+      modify or dispose of a literal then see the change at its other uses.
+    - cse: compute repeated array addresses, array reads and other pure
+      expressions once within straight-line code, keeping them in temp 1-7.
+    - branches: compile if and while conditions into jumps, without the not
+      before each if-goto where the condition allows, with & and | of pure
+      operands short-circuited, with the test at the bottom of while loops,
+      and with constant conditions resolved.
+    - tailcalls: compile return statements that return a call of the
+      subroutine itself, on the same class or on an object of it, as a jump
+      back to the start of its body.
+    - intrinsics: check calls of the OS against os_subroutines, and compile
+      the OS subroutines in intrinsic_names inline, without a call frame.
+      The OS classes the program defines itself are left alone.
+    - schedule: evaluate the operand that needs more of the stack first, as
+      in Sethi-Ullman numbering, for the operators in mirrored_ops and for
+      array indices, where neither operand calls a subroutine.
+    - ir: take the VM code of each subroutine through its ThreeAddressCode
+      and the IR passes, with an IROptimizer, before the passes below.
+    - peephole: rewrite the VM code of each subroutine with a
+      PeepholeOptimizer before it is written.
+    - flow: drop unreachable code, jumps to the next command and unused
+      labels from the VM code of each subroutine, with a FlowOptimizer.
+    - locals: drop dead stores to local variables, and let local variables
+      that are not live at the same time share a slot, with a
+      LocalAllocator.
+    The inline and prune optimizations need every class of the program, so
+    they are applied to the VM code by JackCompiler.compile_program instead.
+
+    Given the Profile of a run of the program, licm leaves loops that never
+    ran alone, and strings only pools the literals of code that ran more
+    than once. An instrumented build puts a loop_label() at the start of
+    every loop body, to count its iterations in such a run.
+    """
+
+    def __init__(self, output_stream: typing.TextIO, line_index: typing.Optional[LineIndex] = None,
+                 optimizations: typing.AbstractSet[str] = frozenset(),
+                 peephole: typing.Optional[PeepholeOptimizer] = None,
+                 licm: typing.Optional[LoopInvariantMotion] = None,
+                 intrinsics: typing.AbstractSet[str] = frozenset(intrinsic_names),
+                 program_classes: typing.AbstractSet[str] = frozenset(),
+                 profile: typing.Optional[Profile] = None, instrument: bool = False) -> None:
+        """
+        Args:
+            output_stream (typing.TextIO): the VM code is written here.
+            line_index (LineIndex): the line index of the source, for
+            diagnostics.
+            optimizations (typing.AbstractSet[str]): names of the
+            optimizations to apply.
+            peephole (PeepholeOptimizer): the optimizer to use for
+            'peephole', so its counts can be shared between classes. A new
+            one with every rule enabled is made if it is not given.
+            licm (LoopInvariantMotion): likewise, the pass to use for
+            'licm'.
+            intrinsics (typing.AbstractSet[str]): the OS subroutines that
+            'intrinsics' compiles inline.
+            program_classes (typing.AbstractSet[str]): the classes of the
+            program, whose calls 'intrinsics' does not check or inline even
+            if they are OS classes.
+            profile (Profile): the execution profile to optimize for.
+            instrument (bool): label every loop body for profiling.
+        """
+        passes = []
+        if 'ir' in optimizations:
+            passes.append(IROptimizer())
+        if 'peephole' in optimizations:
+            passes.append(peephole if peephole is not None else PeepholeOptimizer())
+        if 'flow' in optimizations:
+            passes.append(FlowOptimizer())
+        if 'locals' in optimizations:
+            passes.append(LocalAllocator())
+        self.writer = VMWriter(output_stream, passes)
+        self.line_index = line_index
+        self.optimizations = optimizations
+        self.licm = licm if licm is not None else LoopInvariantMotion()
+        self.intrinsics = intrinsics
+        self.program_classes = program_classes
+        self.profile = profile
+        self.instrument = instrument
+        # While statement -> its number within its subroutine, in source order
+        self.loop_numbers = dict()
+        # The numbers of the loops around the code being compiled
+        self.loop_stack = []
+        self.symbol_table = SymbolTable()
+        self.class_name = ''
+        self.label_num = 1
+        # The subroutine being compiled, and the label at the start of its
+        # body if it has self tail calls
+        self.subroutine = None
+        self.body_label = None
+        # String literal -> the static variable holding it
+        self.string_pool = dict()
+        # Expression -> its scheduling(), for the current subroutine
+        self.schedulings = dict()
+
+    def error(self, message: str, offset: typing.Optional[int]) -> Exception:
+        if self.line_index is None or offset is None:
+            return Exception(message)
+        line, column = self.line_index.position(offset)
+        return Exception(f"line {line}, column {column}: {message}")
+
+    def variable(self, name: str, offset: typing.Optional[int]) -> typing.Tuple[str, str, int]:
+        """
+        Returns:
+            tuple: the (type, kind, index) of the named variable.
+        """
+        entry = self.symbol_table.entry_of(name)
+        if entry is None:
+            raise self.error(f"Tried referencing a variable the doesn't exist: {name}", offset)
+        return entry
+
+    def compile_class(self, tree: Class) -> None:
+        """Compiles a complete class."""
+        # Numbered before the loops are transformed, so they match the
+        # numbers of the instrumented build
+        cold_loops = set()
+        for subroutine in tree.subroutines:
+            for number, loop in enumerate(loops(subroutine.statements)):
+                self.loop_numbers[loop] = number
+                if self.profile is not None and \
+                        self.profile.loop_iterations(f"{tree.name}.{subroutine.name}", number) == 0:
+                    cold_loops.add(loop)
+        self.licm.cold_loops = cold_loops
+
+        if 'fold' in self.optimizations:
+            tree = ConstantFolder().visit(tree)
+        if 'strength' in self.optimizations:
+            tree = StrengthReducer().visit(tree)
+        if 'licm' in self.optimizations:
+            tree = self.licm.visit(tree)
+        if 'cse' in self.optimizations:
+            tree = CommonSubexpressions().visit(tree)
+
+        self.class_name = tree.name
+        for var_dec in tree.class_var_decs:
+            for name in var_dec.names:
+                self.symbol_table.define(name, var_dec.type, var_dec.kind)
+        for subroutine in tree.subroutines:
+            self.compile_subroutine(subroutine)
+
+    def compile_subroutine(self, subroutine: Subroutine) -> None:
+        """Compiles a complete method, function, or constructor."""
+        symbol_table, writer = self.symbol_table, self.writer
+        symbol_table.start_subroutine()
+        self.schedulings = dict()
+        if subroutine.kind == 'method':
+            symbol_table.define('this', self.class_name, ARG)
+        for _type, name in subroutine.parameters:
+            symbol_table.define(name, _type, ARG)
+        for var_dec in subroutine.var_decs:
+            for name in var_dec.names:
+                symbol_table.define(name, var_dec.type, VAR)
+
+        writer.write_function(f"{self.class_name}.{subroutine.name}", symbol_table.var_count(VAR))
+
+        if subroutine.kind == 'method':
+            writer.write_push(ARG, 0)
+            writer.write_pop(POINTER, 0)
+        elif subroutine.kind == 'constructor':
+            writer.write_push(CONST, symbol_table.var_count(FIELD))
+            writer.write_call('Memory.alloc', 1)
+            writer.write_pop(POINTER, 0)
+
+        self.subroutine = subroutine
+        self.body_label = None
+        if 'tailcalls' in self.optimizations and \
+                any(self.is_self_call(statement.value) for statement in returns(subroutine.statements)):
+            self.body_label = self.new_label()
+            writer.write_label(self.body_label)
+
+        self.compile_statements(subroutine.statements)
+
+        writer.flush()
+
+    def compile_statements(self, statements: typing.Iterable[Statement]) -> None:
+        statement_funcs = self.statement_funcs
+        for statement in statements:
+            statement_funcs[type(statement)](self, statement)
+
+    def compile_let(self, statement: Let) -> None:
+        _type, kind, index = self.variable(statement.name, statement.offset)
+        if statement.index is not None:
+            self.writer.write_push(kind_to_segment[kind], index)
+            self.compile_expression(statement.index)
+            self.writer.write_arithmetic(biop_dict['+'])
+            self.compile_expression(statement.value)
+            self.writer.write_pop(TEMP, 0)
+            self.writer.write_pop(POINTER, 1)
+            self.writer.write_push(TEMP, 0)
+            self.writer.write_pop(THAT, 0)
+        else:
+            self.compile_expression(statement.value)
+            self.writer.write_pop(kind_to_segment[kind], index)
+
+    def compile_store(self, statement: Store) -> None:
+        self.compile_expression(statement.address)
+        self.compile_expression(statement.value)
+        self.writer.write_pop(TEMP, 0)
+        self.writer.write_pop(POINTER, 1)
+        self.writer.write_push(TEMP, 0)
+        self.writer.write_pop(THAT, 0)
+
+    def new_label(self) -> str:
+        self.label_num += 1
+        return f"L{self.label_num - 1}"
+
+    def compile_branch(self, condition: Expression, label: str, jump_if: bool) -> None:
+        """Jumps to the label if the condition is true, or if it is false when
+        jump_if is False, and falls through otherwise. As with the not and
+        if-goto of compile_if, only -1 is true.
+        """
+        writer = self.writer
+        condition = unsaved(condition)
+        value = constant_value(condition)
+        if value is not None:
+            if (value == -1) == jump_if:
+                writer.write_goto(label)
+            return
+
+        kind = type(condition)
+        if kind is Unary and condition.op == '~' and is_boolean(condition.operand):
+            self.compile_branch(condition.operand, label, not jump_if)
+            return
+        # x & y is -1 exactly when both are, x | y when either is if both
+        # are booleans
+        if kind is Binary and is_skippable(condition.right) and \
+                (condition.op == '&' or condition.op == '|' and is_boolean(condition)):
+            if (condition.op == '&') != jump_if:
+                # Either operand decides
+                self.compile_branch(condition.left, label, jump_if)
+                self.compile_branch(condition.right, label, jump_if)
+            else:
+                # Both operands are needed
+                skip = self.new_label()
+                self.compile_branch(condition.left, skip, not jump_if)
+                self.compile_branch(condition.right, label, jump_if)
+                writer.write_label(skip)
+            return
+
+        self.compile_expression(condition)
+        if is_boolean(condition):
+            if not jump_if:
+                writer.write_arithmetic(unop_dict['~'])
+            writer.write_if(label)
+        else:
+            writer.write_arithmetic(unop_dict['~'])
+            if jump_if:
+                skip = self.new_label()
+                writer.write_if(skip)
+                writer.write_goto(label)
+                writer.write_label(skip)
+            else:
+                writer.write_if(label)
+
+    def compile_branching_if(self, statement: If) -> None:
+        """Compiles an if with compile_branch. The condition jumps to the then
+        clause, which comes last, so a comparison needs no not, unless the
+        condition is the not of a boolean, which jumps past the then clause.
+        """
+        condition = unsaved(statement.condition)
+        end = self.new_label()
+        if type(condition) is Unary and condition.op == '~' and is_boolean(condition.operand):
+            otherwise = self.new_label() if statement.otherwise is not None else end
+            self.compile_branch(condition, otherwise, False)
+            self.compile_statements(statement.then)
+            if statement.otherwise is not None:
+                self.writer.write_goto(end)
+                self.writer.write_label(otherwise)
+                self.compile_statements(statement.otherwise)
+        else:
+            then = self.new_label()
+            self.compile_branch(condition, then, True)
+            if statement.otherwise is not None:
+                self.compile_statements(statement.otherwise)
+            self.writer.write_goto(end)
+            self.writer.write_label(then)
+            self.compile_statements(statement.then)
+        self.writer.write_label(end)
+
+    def compile_branching_while(self, statement: While) -> None:
+        """Compiles a while with the test at the bottom, so an iteration runs
+        the body and the test and jumps back, with no goto or not.
+        """
+        value = constant_value(statement.condition)
+        if value is not None and value != -1:
+            return
+        body = self.new_label()
+        if value is None:
+            test = self.new_label()
+            self.writer.write_goto(test)
+            self.writer.write_label(body)
+            self.compile_loop_body(statement)
+            self.writer.write_label(test)
+            self.compile_branch(statement.condition, body, True)
+        else:
+            self.writer.write_label(body)
+            self.compile_loop_body(statement)
+            self.writer.write_goto(body)
+
+    def compile_if(self, statement: If) -> None:
+        if 'branches' in self.optimizations:
+            self.compile_branching_if(statement)
+            return
+        self.compile_expression(statement.condition)
+        self.writer.write_arithmetic(unop_dict['~'])
+        first = self.label_num
+        second = self.label_num + 1
+        self.label_num += 2
+        self.writer.write_if(f"L{first}")
+
+        self.compile_statements(statement.then)
+
+        if statement.otherwise is not None:
+            self.label_num += 1
+            self.writer.write_goto(f"L{second}")
+            self.writer.write_label(f"L{first}")
+            self.compile_statements(statement.otherwise)
+            self.writer.write_label(f"L{second}")
+        else:
+            self.writer.write_label(f"L{first}")
+
+    def compile_while(self, statement: While) -> None:
+        if 'branches' in self.optimizations:
+            self.compile_branching_while(statement)
+            return
+        first = self.label_num
+        second = self.label_num + 1
+        self.label_num += 2
+        self.writer.write_label(f"L{first}")
+
+        self.compile_expression(statement.condition)
+        self.writer.write_arithmetic(unop_dict['~'])
+        self.writer.write_if(f"L{second}")
+
+        self.compile_loop_body(statement)
+
+        self.writer.write_goto(f"L{first}")
+        self.writer.write_label(f"L{second}")
+
+        self.label_num += 1
+
+    def compile_loop_body(self, statement: While) -> None:
+        number = self.loop_numbers.get(statement)
+        if self.instrument and number is not None:
+            self.writer.write_label(loop_label(number))
+        self.loop_stack.append(number)
+        self.compile_statements(statement.body)
+        self.loop_stack.pop()
+
+    def runs(self) -> typing.Optional[int]:
+        """
+        Returns:
+            int: how often the code being compiled ran in the profile, or None
+            if that is not known.
+        """
+        if self.profile is None:
+            return None
+        name = f"{self.class_name}.{self.subroutine.name}"
+        if self.loop_stack and self.loop_stack[-1] is not None:
+            return self.profile.loop_iterations(name, self.loop_stack[-1])
+        return self.profile.calls.get(name)
+
+    def compile_do(self, statement: Do) -> None:
+        if 'intrinsics' in self.optimizations and self.compile_intrinsic(statement.call, True):
+            return
+        self.compile_call(statement.call)
+        self.writer.write_pop(TEMP, 0)
+
+    def is_self_call(self, expression: typing.Optional[Expression]) -> bool:
+        """
+        Returns:
+            bool: whether the expression calls the subroutine being compiled,
+            with all its parameters.
+        """
+        subroutine = self.subroutine
+        if type(expression) is not Call or expression.name != subroutine.name or \
+                len(expression.arguments) != len(subroutine.parameters):
+            return False
+        if subroutine.kind == 'function':
+            return expression.target == self.class_name and self.symbol_table.entry_of(expression.target) is None
+        if subroutine.kind == 'method':
+            if expression.target is None:
+                return True
+            entry = self.symbol_table.entry_of(expression.target)
+            return entry is not None and entry[0] == self.class_name
+        return False
+
+    def compile_tail_call(self, call: Call) -> None:
+        """Compiles the return of a self call as a jump to the start of the
+        body, after the arguments of the call replace those of the current
+        call, and for a call on another object, this. The local variables are
+        zeroed again, as the function command would.
+        """
+        writer = self.writer
+        first = int(self.subroutine.kind == 'method')
+        if call.target is not None and first:
+            _type, kind, index = self.variable(call.target, call.offset)
+            writer.write_push(kind_to_segment[kind], index)
+        for argument in call.arguments:
+            self.compile_expression(argument)
+        for index in reversed(range(first, first + len(call.arguments))):
+            writer.write_pop(ARG, index)
+        if call.target is not None and first:
+            writer.write_pop(ARG, 0)
+            writer.write_push(ARG, 0)
+            writer.write_pop(POINTER, 0)
+        for index in range(self.symbol_table.var_count(VAR)):
+            writer.write_push(CONST, 0)
+            writer.write_pop(LOCAL, index)
+        writer.write_goto(self.body_label)
+
+    def compile_return(self, statement: Return) -> None:
+        if self.body_label is not None and self.is_self_call(statement.value):
+            self.compile_tail_call(statement.value)
+            return
+        if statement.value is not None:
+            self.compile_expression(statement.value)
+        else:
+            self.writer.write_push(CONST, 0)
+        self.writer.write_return()
+
+    def compile_expression(self, expression: Expression) -> None:
+        self.expression_funcs[type(expression)](self, expression)
+
+    def compile_int(self, term: IntConst) -> None:
+        # push constant only takes 0..32767, other words are built with not
+        value = wrap(term.value)
+        if value >= 0:
+            self.writer.write_push(CONST, value)
+        else:
+            self.writer.write_push(CONST, ~value)
+            self.writer.write_arithmetic(unop_dict['~'])
+
+    def compile_string(self, term: StringConst) -> None:
+        runs = self.runs()
+        if 'strings' in self.optimizations and (runs is None or runs > 1):
+            self.compile_pooled_string(term)
+        else:
+            self.compile_new_string(term)
+
+    def compile_pooled_string(self, term: StringConst) -> None:
+        """Builds the string the first time the literal is evaluated, when
+        its static variable is still 0, and pushes the static variable.
+        """
+        index = self.string_pool.get(term.value)
+        if index is None:
+            index = self.string_pool[term.value] = self.symbol_table.var_count(STATIC) + len(self.string_pool)
+        done = self.label_num
+        self.label_num += 1
+
+        self.writer.write_push(STATIC, index)
+        self.writer.write_if(f"L{done}")
+        self.compile_new_string(term)
+        self.writer.write_pop(STATIC, index)
+        self.writer.write_label(f"L{done}")
+        self.writer.write_push(STATIC, index)
+
+    def compile_new_string(self, term: StringConst) -> None:
+        self.writer.write_push(CONST, len(term.value))
+        self.writer.write_call('String.new', 1)
+        for c in term.value:
+            self.writer.write_push(CONST, ord(c))
+            self.writer.write_call('String.appendChar', 2)
+
+    def compile_keyword(self, term: KeywordConst) -> None:
+        if term.value == 'true':
+            self.writer.write_push(CONST, 0)
+            self.writer.write_arithmetic(unop_dict['~'])
+        elif term.value == 'this':
+            self.writer.write_push(POINTER, 0)
+        else:
+            self.writer.write_push(CONST, 0)
+
+    def compile_var(self, term: Var) -> None:
+        _type, kind, index = self.variable(term.name, term.offset)
+        self.writer.write_push(kind_to_segment[kind], index)
+
+    def compile_index(self, term: Index) -> None:
+        _type, kind, index = self.variable(term.name, term.offset)
+        need, reorderable = self.scheduling(term.index) if 'schedule' in self.optimizations else (1, False)
+        if reorderable and need > 1:
+            self.compile_expression(term.index)
+            self.writer.write_push(kind_to_segment[kind], index)
+        else:
+            self.writer.write_push(kind_to_segment[kind], index)
+            self.compile_expression(term.index)
+        self.writer.write_arithmetic(biop_dict['+'])
+        self.writer.write_pop(POINTER, 1)
+        self.writer.write_push(THAT, 0)
+
+    def compile_load(self, term: Load) -> None:
+        self.compile_expression(term.address)
+        self.writer.write_pop(POINTER, 1)
+        self.writer.write_push(THAT, 0)
+
+    def compile_save(self, term: Save) -> None:
+        self.compile_expression(term.value)
+        if term.slot is not None:
+            self.writer.write_pop(TEMP, term.slot)
+            self.writer.write_push(TEMP, term.slot)
+
+    def compile_reuse(self, term: Reuse) -> None:
+        self.writer.write_push(TEMP, term.save.slot)
+
+    def compile_call(self, call: Call) -> None:
+        if 'intrinsics' in self.optimizations and self.compile_intrinsic(call, False):
+            return
+        if call.target is None:
+            # A subroutine of this class, called on this object
+            subroutine, n_args = f"{self.class_name}.{call.name}", len(call.arguments) + 1
+            self.writer.write_push(POINTER, 0)
+        else:
+            entry = self.symbol_table.entry_of(call.target)
+            if entry is None:
+                # className.subroutineName
+                subroutine, n_args = f"{call.target}.{call.name}", len(call.arguments)
+            else:
+                # varName.methodName
+                _type, kind, index = entry
+                subroutine, n_args = f"{_type}.{call.name}", len(call.arguments) + 1
+                self.writer.write_push(kind_to_segment[kind], index)
+
+        for argument in call.arguments:
+            self.compile_expression(argument)
+
+        self.writer.write_call(subroutine, n_args)
+
+    def compile_intrinsic(self, call: Call, discard: bool) -> bool:
+        """Checks a call of an OS subroutine against its signature, and
+        compiles it inline if it is one of the intrinsics.
+
+        Args:
+            call (Call): the call.
+            discard (bool): the value of the call is not used, as in a do.
+
+        Returns:
+            bool: whether the call was compiled inline.
+        """
+        if call.target is None:
+            return False
+        entry = self.symbol_table.entry_of(call.target)
+        class_name = call.target if entry is None else entry[0]
+        if class_name not in os_subroutines or class_name == self.class_name or \
+                class_name in self.program_classes:
+            # The program defines this class itself
+            return False
+        signature = os_subroutines[class_name].get(call.name)
+        name = f"{class_name}.{call.name}"
+        if signature is None:
+            raise self.error(f"The OS has no subroutine {name}", call.offset)
+        kind, n_parameters = signature
+        if (kind == 'method') != (entry is not None):
+            raise self.error(f"{name} is a {kind}", call.offset)
+        if len(call.arguments) != n_parameters:
+            raise self.error(f"{name} takes {n_parameters} arguments, not {len(call.arguments)}",
+                             call.offset)
+        if name not in self.intrinsics:
+            return False
+        self.intrinsic_funcs[name](self, call.arguments, discard)
+        return True
+
+    def compile_peek(self, arguments: typing.Sequence[Expression], discard: bool) -> None:
+        self.compile_expression(arguments[0])
+        if discard:
+            self.writer.write_pop(TEMP, 0)
+            return
+        self.writer.write_pop(POINTER, 1)
+        self.writer.write_push(THAT, 0)
+
+    def compile_poke(self, arguments: typing.Sequence[Expression], discard: bool) -> None:
+        self.compile_expression(arguments[0])
+        self.compile_expression(arguments[1])
+        self.writer.write_pop(TEMP, 0)
+        self.writer.write_pop(POINTER, 1)
+        self.writer.write_push(TEMP, 0)
+        self.writer.write_pop(THAT, 0)
+        if not discard:
+            # The value of a void subroutine
+            self.writer.write_push(CONST, 0)
+
+    def compile_array_new(self, arguments: typing.Sequence[Expression], discard: bool) -> None:
+        # Array.new only checks the size, as Memory.alloc does
+        self.compile_expression(arguments[0])
+        self.writer.write_call('Memory.alloc', 1)
+        if discard:
+            self.writer.write_pop(TEMP, 0)
+
+    def compile_abs(self, arguments: typing.Sequence[Expression], discard: bool) -> None:
+        self.compile_expression(arguments[0])
+        if discard:
+            self.writer.write_pop(TEMP, 0)
+            return
+        done = self.new_label()
+        self.writer.write_pop(TEMP, 0)
+        self.writer.write_push(TEMP, 0)
+        self.writer.write_push(TEMP, 0)
+        self.writer.write_push(CONST, 0)
+        self.writer.write_arithmetic(biop_dict['>'])
+        self.writer.write_if(done)
+        # -0 is 0, so x = 0 may go either way
+        self.writer.write_arithmetic(unop_dict['-'])
+        self.writer.write_label(done)
+
+    def compile_min_max(self, arguments: typing.Sequence[Expression], discard: bool, op: str) -> None:
+        """Compiles Math.min, with op '<', or Math.max, with op '>': the
+        first argument if it compares true to the second, else the second.
+        The first is kept in pointer 1, which array accesses set right before
+        they use it, and the second in temp 0.
+        """
+        self.compile_expression(arguments[0])
+        self.compile_expression(arguments[1])
+        self.writer.write_pop(TEMP, 0)
+        if discard:
+            self.writer.write_pop(TEMP, 0)
+            return
+        first, done = self.new_label(), self.new_label()
+        self.writer.write_pop(POINTER, 1)
+        self.writer.write_push(POINTER, 1)
+        self.writer.write_push(TEMP, 0)
+        self.writer.write_arithmetic(biop_dict[op])
+        self.writer.write_if(first)
+        self.writer.write_push(TEMP, 0)
+        self.writer.write_goto(done)
+        self.writer.write_label(first)
+        self.writer.write_push(POINTER, 1)
+        self.writer.write_label(done)
+
+    def compile_min(self, arguments: typing.Sequence[Expression], discard: bool) -> None:
+        self.compile_min_max(arguments, discard, '<')
+
+    def compile_max(self, arguments: typing.Sequence[Expression], discard: bool) -> None:
+        self.compile_min_max(arguments, discard, '>')
+
+    def compile_unary(self, term: Unary) -> None:
+        self.compile_expression(term.operand)
+        self.writer.write_arithmetic(unop_dict[term.op])
+
+    def compile_binary(self, expression: Binary) -> None:
+        op = expression.op
+        if 'schedule' in self.optimizations and self.right_first(expression):
+            self.compile_expression(expression.right)
+            self.compile_expression(expression.left)
+            op = mirrored_ops[op]
+        else:
+            self.compile_expression(expression.left)
+            self.compile_expression(expression.right)
+        if op == '*':
+            self.writer.write_call('Math.multiply', 2)
+        elif op == '/':
+            self.writer.write_call('Math.divide', 2)
+        else:
+            self.writer.write_arithmetic(biop_dict[op])
+
+    def right_first(self, expression: Binary) -> bool:
+        """Whether the right operand of the expression needs more of the
+        stack than the left, and may be evaluated before it."""
+        if expression.op not in mirrored_ops:
+            return False
+        left, left_reorderable = self.scheduling(expression.left)
+        right, right_reorderable = self.scheduling(expression.right)
+        return left_reorderable and right_reorderable and right > left
+
+    def scheduling(self, expression: Expression) -> typing.Tuple[int, bool]:
+        """
+        Returns:
+            tuple: the most values evaluating the expression keeps on the
+            stack at once, with the schedule optimization, and whether it may
+            be evaluated before or after another such expression: it calls
+            nothing but Math.multiply, and keeps no value for a Reuse.
+        """
+        known = self.schedulings.get(expression)
+        if known is not None:
+            return known
+        kind = type(expression)
+        if kind is Binary:
+            left, left_reorderable = self.scheduling(expression.left)
+            right, right_reorderable = self.scheduling(expression.right)
+            reorderable = left_reorderable and right_reorderable and expression.op != '/'
+            if not reorderable or expression.op not in mirrored_ops:
+                need = max(left, right + 1)
+            elif left == right:
+                need = left + 1
+            else:
+                need = max(left, right)
+            result = need, reorderable
+        elif kind is Unary:
+            result = self.scheduling(expression.operand)
+        elif kind is Index:
+            need, reorderable = self.scheduling(expression.index)
+            result = (max(need, 2) if reorderable else need + 1), reorderable
+        elif kind is Load:
+            result = self.scheduling(expression.address)
+        elif kind is Save:
+            need, reorderable = self.scheduling(expression.value)
+            result = need, reorderable and expression.slot is None
+        elif kind is Call:
+            # After the receiver, each argument is evaluated on top of those
+            # before it
+            result = max((self.scheduling(argument)[0] + i
+                          for i, argument in enumerate(expression.arguments, 1)), default=1), False
+        elif kind is StringConst:
+            # The string, and a character to append
+            result = 2, False
+        else:
+            result = 1, kind is not Reuse
+        self.schedulings[expression] = result
+        return result
+
+    # Dispatch tables, keyed by node class
+    statement_funcs = {Let: compile_let,
+                       If: compile_if,
+                       While: compile_while,
+                       Do: compile_do,
+                       Return: compile_return,
+                       Store: compile_store}
+
+    expression_funcs = {IntConst: compile_int,
+                        StringConst: compile_string,
+                        KeywordConst: compile_keyword,
+                        Var: compile_var,
+                        Index: compile_index,
+                        Call: compile_call,
+                        Unary: compile_unary,
+                        Binary: compile_binary,
+                        Load: compile_load,
+                        Save: compile_save,
+                        Reuse: compile_reuse}
+
+    # Keyed by OS subroutine, see Constants.intrinsic_names
+    intrinsic_funcs = {'Memory.peek': compile_peek,
+                       'Memory.poke': compile_poke,
+                       'Array.new': compile_array_new,
+                       'Math.abs': compile_abs,
+                       'Math.min': compile_min,
+                       'Math.max': compile_max}
@@ -0,0 +1,211 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+
+from SyntaxTree import *
+
+# The temp slots values are kept in. temp 0 is used by do and array stores.
+CSE_SLOTS = range(1, 8)
+
+# Keeping a value costs a pop and a push of a temp slot, about 13 Hack
+# instructions, and each reuse a push, about 7, so only expressions that
+# cost more than this are kept
+MIN_CSE_COST = 20
+
+# Estimated Hack instructions of the VM commands of each operator
+_op_costs = {'+': 5, '-': 5, '&': 5, '|': 5, '=': 13, '<': 13, '>': 13}
+
+
+def expression_key(expression: Expression) -> typing.Optional[tuple]:
+    """
+    Returns:
+        tuple: a key that is equal for expressions that compute the same
+        value from the same variables and memory, or None for expressions
+        that call subroutines.
+    """
+    kind = type(expression)
+    if kind is Var:
+        return 'var', expression.name
+    if kind is IntConst or kind is KeywordConst:
+        return 'const', expression.value
+    if kind is Unary:
+        operand = expression_key(expression.operand)
+        return None if operand is None else (expression.op, operand)
+    if kind is Binary:
+        if expression.op not in _op_costs:
+            # Math.multiply and Math.divide
+            return None
+        left = expression_key(expression.left)
+        right = expression_key(expression.right)
+        return None if left is None or right is None else (expression.op, left, right)
+    if kind is Index:
+        index = expression_key(expression.index)
+        return None if index is None else ('load', ('+', ('var', expression.name), index))
+    if kind is Load:
+        address = expression_key(expression.address)
+        return None if address is None else ('load', address)
+    return None
+
+
+def _cost(key: tuple) -> int:
+    """Estimated Hack instructions that compute the expression of a key."""
+    if key[0] in ('var', 'const'):
+        return 10
+    if key[0] == 'load':
+        return _cost(key[1]) + 16
+    if len(key) == 2:
+        return _cost(key[1]) + 3
+    return _cost(key[1]) + _cost(key[2]) + _op_costs[key[0]]
+
+
+def _reads_memory(key: tuple) -> bool:
+    if key[0] == 'load':
+        return True
+    return key[0] not in ('var', 'const') and any(_reads_memory(part) for part in key[1:])
+
+
+def _names(key: tuple) -> typing.Set[str]:
+    """The variables the expression of a key reads."""
+    if key[0] == 'var':
+        return {key[1]}
+    if key[0] == 'const':
+        return set()
+    return set().union(*(_names(part) for part in key[1:]))
+
+
+class _Available:
+    """A value that has been computed and is still valid."""
+
+    def __init__(self, save: Save, names: typing.Set[str], memory: bool) -> None:
+        self.save = save
+        self.names = names
+        self.memory = memory
+
+
+class CommonSubexpressions(NodeTransformer):
+    """Computes repeated pure expressions once within straight-line code,
+    and reuses the value from a temp slot. Array accesses are lowered to
+    Load and Store of base + index first, so a[i] and let a[i] = ... share
+    the address computation, and a[i] read twice is loaded once.
+
+    Evaluation order is followed, and an expression is available from its
+    first evaluation until:
+    - a variable it reads is assigned;
+    - for loads, any array element is stored, as arrays may alias;
+    - any subroutine is called, including the Math, String and Memory calls
+      of *, /, string literals and constructors, since the callee may use
+      the same temp slots, or change fields, statics and memory;
+    - control flow joins, after if statements and at the head of loops.
+    Both branches of an if start with what was available after the
+    condition, and a loop body with what was available after its condition.
+
+    Every first evaluation is wrapped in a Save, which only gets a slot, and
+    only stores the value, when a later evaluation reuses it. A slot is only
+    given to a Save when nothing used it since the Save was evaluated.
+    """
+
+    def __init__(self) -> None:
+        # Expression key -> _Available
+        self.available = dict()
+        # Slot -> the Save whose value it holds
+        self.slot_holders = dict()
+        # Slot -> when it was last written or read
+        self.last_used = {slot: -1 for slot in CSE_SLOTS}
+        # Visit counter, in evaluation order
+        self.time = 0
+        # Save -> when it was evaluated
+        self.saved_at = dict()
+
+    def kill(self, predicate: typing.Callable[[_Available], bool]) -> None:
+        for key in [key for key, entry in self.available.items() if predicate(entry)]:
+            slot = self.available.pop(key).save.slot
+            if slot is not None:
+                self.slot_holders.pop(slot, None)
+
+    def kill_all(self) -> None:
+        self.kill(lambda entry: True)
+
+    def restore(self, available: typing.Dict[tuple, _Available]) -> None:
+        """Makes available what was available at an earlier point, which
+        dominates the current one."""
+        self.kill_all()
+        self.available = dict(available)
+        self.slot_holders = {entry.save.slot: entry.save for entry in available.values()
+                             if entry.save.slot is not None}
+
+    def reuse(self, entry: _Available) -> typing.Optional[Reuse]:
+        save = entry.save
+        if save.slot is None:
+            saved_at = self.saved_at[save]
+            free = [slot for slot in CSE_SLOTS
+                    if slot not in self.slot_holders and self.last_used[slot] < saved_at]
+            if not free:
+                return None
+            save.slot = free[0]
+            self.slot_holders[save.slot] = save
+        self.last_used[save.slot] = self.time
+        return Reuse(save)
+
+    def visit(self, node: Node) -> typing.Any:
+        self.time += 1
+        key = expression_key(node)
+        if key is None:
+            node = super().visit(node)
+            if isinstance(node, (Call, StringConst)) or type(node) is Binary and node.op not in _op_costs:
+                self.kill_all()
+            return node
+
+        entry = self.available.get(key)
+        if entry is not None:
+            reused = self.reuse(entry)
+            if reused is not None:
+                return reused
+        node = super().visit(node)
+        if _cost(key) <= MIN_CSE_COST or key in self.available:
+            return node
+        save = Save(node)
+        self.saved_at[save] = self.time
+        self.available[key] = _Available(save, _names(key), _reads_memory(key))
+        return save
+
+    def visit_Subroutine(self, node: Subroutine) -> Subroutine:
+        self.kill_all()
+        node.statements = self.visit_sequence(node.statements)
+        self.kill_all()
+        return node
+
+    def visit_Index(self, node: Index) -> Load:
+        return Load(self.visit(Binary('+', Var(node.name, node.offset), node.index)))
+
+    def visit_Let(self, node: Let) -> Statement:
+        if node.index is not None:
+            address = self.visit(Binary('+', Var(node.name, node.offset), node.index))
+            value = self.visit(node.value)
+            self.kill(lambda entry: entry.memory)
+            return Store(address, value)
+        node.value = self.visit(node.value)
+        self.kill(lambda entry: node.name in entry.names)
+        return node
+
+    def visit_If(self, node: If) -> If:
+        node.condition = self.visit(node.condition)
+        after_condition = dict(self.available)
+        node.then = self.visit_sequence(node.then)
+        if node.otherwise is not None:
+            self.restore(after_condition)
+            node.otherwise = self.visit_sequence(node.otherwise)
+        self.kill_all()
+        return node
+
+    def visit_While(self, node: While) -> While:
+        # The condition is evaluated right before every run of the body
+        self.kill_all()
+        node.condition = self.visit(node.condition)
+        node.body = self.visit_sequence(node.body)
+        self.kill_all()
+        return node
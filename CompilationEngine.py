@@ -9,51 +9,51 @@ import typing
 
 from JackTokenizer import JackTokenizer
 from SymbolTable import *
+from TokenReader import *
 from VMWriter import VMWriter
 from Constants import *
 
-KEYWORD = "KEYWORD"
-SYMBOL = "SYMBOL"
-IDENTIFIER = "IDENTIFIER"
-INT_CONST = "INT_CONST"
-STRING_CONST = "STRING_CONST"
+binary_op_funcs = {'+': lambda writer: writer.write_arithmetic(biop_dict['+']),
+                   '-': lambda writer: writer.write_arithmetic(biop_dict['-']),
+                   '=': lambda writer: writer.write_arithmetic(biop_dict['=']),
+                   '>': lambda writer: writer.write_arithmetic(biop_dict['>']),
+                   '<': lambda writer: writer.write_arithmetic(biop_dict['<']),
+                   '&': lambda writer: writer.write_arithmetic(biop_dict['&']),
+                   '|': lambda writer: writer.write_arithmetic(biop_dict['|']),
+                   '*': lambda writer: writer.write_call('Math.multiply', 2),
+                   '/': lambda writer: writer.write_call('Math.divide', 2)}
 
-xml_element_names = {KEYWORD: 'keyword',
-                     SYMBOL: 'symbol',
-                     IDENTIFIER: 'identifier',
-                     INT_CONST: 'integerConstant',
-                     STRING_CONST: 'stringConstant'}
 
-statement_comp_funcs = {"let": lambda self: self.compile_let(),
-                        "do": lambda self: self.compile_do(),
-                        "while": lambda self: self.compile_while(),
-                        "if": lambda self: self.compile_if(),
-                        "return": lambda self: self.compile_return()}
+def _write_true(writer: VMWriter) -> None:
+    writer.write_push(CONST, 0)
+    writer.write_arithmetic(unop_dict['~'])
 
-tokenizer_value_funcs = {KEYWORD: lambda tokenizer: tokenizer.keyword(),
-                         SYMBOL: lambda tokenizer: tokenizer.symbol(),
-                         IDENTIFIER: lambda tokenizer: tokenizer.identifier(),
-                         INT_CONST: lambda tokenizer: tokenizer.int_val(),
-                         STRING_CONST: lambda tokenizer: tokenizer.string_val()}
 
+keyword_constant_funcs = {"true": _write_true,
+                          "false": lambda writer: writer.write_push(CONST, 0),
+                          "null": lambda writer: writer.write_push(CONST, 0),
+                          "this": lambda writer: writer.write_push(POINTER, 0)}
 
-class CompilationEngine:
+
+class CompilationEngine(TokenReader):
     """Gets input from a JackTokenizer and emits its parsed structure into an
     output stream.
+
+    Compiles in a single pass, emitting VM code while it parses, reading the
+    tokens with a TokenReader like the JackParser. Statements and terms are
+    dispatched through tables keyed by keyword and by token type code.
     """
 
-    def __init__(self, input_stream: JackTokenizer, output_stream: typing.TextIO) -> None:
+    def __init__(self, input_stream: typing.Union[JackTokenizer, "TokenBuffer"],
+                 output_stream: typing.TextIO) -> None:
         """
         Creates a new compilation engine with the given input and output. The
         next routine called must be compileClass()
-        :param input_stream: The input stream.
+        :param input_stream: The input stream, a JackTokenizer or a
+        TokenBuffer. The engine consumes its coded_tokens().
         :param output_stream: The output stream.
         """
-        # Your code goes here!
-        # Note that you can write to output_stream like so:
-        # output_stream.write("Hello world! \n")
-
-        self.tokenizer = input_stream
+        super().__init__(input_stream)
         self.output_stream = output_stream
         self.writer = VMWriter(output_stream)
 
@@ -63,113 +63,61 @@ class CompilationEngine:
         self.label_num = 1
 
     # added
-    def compare(self, token_type, value=None):
-        return self.tokenizer.token_type() == token_type and (value is None or self.current_token() == value)
-
-    # added
-    def start_root(self, name):
-        pass
-        # self.output_stream.write(self.indent_count * '\t' + f"<{name}>\n")
-        # self.indent_count += 1
-
-    # added
-    def end_root(self, name):
-        pass
-        # self.indent_count -= 1
-        # self.output_stream.write(self.indent_count * '\t' + f"</{name}>\n")
-
-    # added
-    def add_element(self, _name=None, _value=None):
-        value = self.current_token() if _value is None else _value
-        if self.tokenizer.token_type() != IDENTIFIER or not self.symbol_table.is_symbol(value):
-            name = xml_element_names[self.tokenizer.token_type()] if _name is None else _name
-        else:
-            name = f"{xml_element_names[IDENTIFIER]}_{self.symbol_table.type_of(value)}_{self.symbol_table.kind_of(value)}_{self.symbol_table.index_of(value)}"
-
-        #self.output_stream.write(self.indent_count * '\t' + f"<{name}> {value} </{name}>\n")
-
-    # added
-    def compile_token(self, condition=True, advance=True):
-        if condition:
-            # self.add_element()
-            pass
-        else:
-            raise Exception(f"got type:{self.tokenizer.token_type()}, value:{self.current_token()}")
-
-        if advance:
-            self.tokenizer.advance()
+    def variable(self, name):
+        entry = self.symbol_table.entry_of(name)
+        if entry is None:
+            raise self.error(f"Tried referencing a variable the doesn't exist: {name}")
+        return entry
 
     # added
-    def is_type(self):
-        return (self.compare(KEYWORD) and self.current_token() in ("int", "char", "boolean")) \
-               or self.compare(IDENTIFIER)
-
-    # added
-    def current_token(self):
-        token = tokenizer_value_funcs[self.tokenizer.token_type()](self.tokenizer)
-        return token
+    def write_push_variable(self, name):
+        _type, kind, index = self.variable(name)
+        self.writer.write_push(kind_to_segment[kind], index)
 
     def compile_class(self) -> None:
         """Compiles a complete class."""
         # 'class'
-        if self.tokenizer.advance() and self.compare(KEYWORD, "class"):
-            self.start_root('class')
-            self.compile_token()
-
-            # className
-            self.class_name = self.current_token()
-            self.compile_token(self.compare(IDENTIFIER))
+        self.advance()
+        if self.type != KEYWORD_CODE or self.token != "class":
+            return
+        self.advance()
 
-            # '{'
-            self.compile_token(self.compare(SYMBOL, '{'))
+        # className
+        self.class_name = self.expect_identifier()
 
-            # classVarDec*
-            while self.current_token() in ("static", "field"):
-                self.compile_class_var_dec()
-
-            # subroutineDec*
-            while self.current_token() in ("constructor", "function", "method"):
-                self.compile_subroutine()
+        # '{'
+        self.expect('{')
 
-            # '}'
-            self.compile_token(self.compare(SYMBOL, '}'))
+        # classVarDec*
+        while self.type == KEYWORD_CODE and self.token in class_var_kinds:
+            self.compile_class_var_dec()
 
-            self.end_root('class')
+        # subroutineDec*
+        while self.type == KEYWORD_CODE and self.token in subroutine_kinds:
+            self.compile_subroutine()
 
-            self.symbol_table.print()
+        # '}'
+        self.expect('}')
 
     def compile_class_var_dec(self) -> None:
         """Compiles a static declaration or a field declaration."""
-        # Your code goes here!
-        self.start_root('classVarDec')
-
         # 'static' | 'field'
-        kind = self.current_token()
-        if kind not in ("static", "field"):
-            raise Exception
-        self.compile_token()
+        kind = self.token
+        if self.type != KEYWORD_CODE or kind not in class_var_kinds:
+            raise self.error(f"expected static or field, got: {kind}")
+        self.advance()
 
         # type
-        _type = self.current_token()
-        self.compile_token(self.is_type())
-
-        has_more = True
-        while has_more:
-            # varName
-            name = self.current_token()
-            self.symbol_table.define(name, _type, kind)
-            self.compile_token(self.compare(IDENTIFIER))
-
-            # ','
-            if self.compare(SYMBOL, ','):
-                self.compile_token()
-            else:
-                has_more = False
+        _type = self.expect_type()
 
-        # ';'
-        self.compile_token(self.compare(SYMBOL, ';'))
+        # varName (',' varName)*
+        self.symbol_table.define(self.expect_identifier(), _type, kind)
+        while self.token == ',' and self.type == SYMBOL_CODE:
+            self.advance()
+            self.symbol_table.define(self.expect_identifier(), _type, kind)
 
-        self.end_root('classVarDec')
+        # ';'
+        self.expect(';')
 
     def compile_subroutine(self) -> None:
         """
@@ -177,42 +125,35 @@ class CompilationEngine:
         You can assume that classes with constructors have at least one field,
         you will understand why this is necessary in project 11.
         """
-
-        self.start_root('subroutineDec')
-
         self.symbol_table.start_subroutine()
 
         # 'constructor' | 'function' | 'method'
-        subroutine_type = self.current_token()
-        self.compile_token()
+        subroutine_type = self.token
+        self.advance()
 
         if subroutine_type == 'method':
             self.symbol_table.define('this', self.class_name, ARG)
 
         # ('void' | type)
-        self.compile_token(self.compare(KEYWORD, 'void') or self.is_type())
+        if self.type == KEYWORD_CODE and self.token == 'void':
+            self.advance()
+        else:
+            self.expect_type()
 
         # subroutineName
-        subroutine_name = self.current_token()
-        self.compile_token(self.compare(IDENTIFIER))
+        subroutine_name = self.expect_identifier()
 
-        # '('
-        self.compile_token(self.compare(SYMBOL, '('))
-
-        # parameterList
+        # '(' parameterList ')'
+        self.expect('(')
         self.compile_parameter_list()
-
-        # ')'
-        self.compile_token(self.compare(SYMBOL, ')'))
+        self.expect(')')
 
         # subroutineBody
-        self.start_root('subroutineBody')
-
         # '{'
-        self.compile_token(self.compare(SYMBOL, '{'))
+        self.expect('{')
 
         # varDec*
-        while self.compare(KEYWORD, 'var'):
+        while self.type == KEYWORD_CODE and self.token == 'var':
             self.compile_var_dec()
 
         self.writer.write_function(f"{self.class_name}.{subroutine_name}", self.symbol_table.var_count(VAR))
@@ -229,167 +170,119 @@ class CompilationEngine:
         self.compile_statements()
 
         # '}'
-        self.compile_token(self.compare(SYMBOL, '}'))
+        self.expect('}')
 
-        self.end_root('subroutineBody')
-
-        self.end_root('subroutineDec')
+        self.writer.flush()
 
     def compile_parameter_list(self) -> int:
         """Compiles a (possibly empty) parameter list, not including the
         enclosing "()".
         """
-        # Your code goes here!
-        self.start_root('parameterList')
-
-        count = 0
-
-        has_more = self.is_type()
-        while has_more:
-            # type
-            _type = self.current_token()
-            self.compile_token()
-
-            # varName
-            name = self.current_token()
-            self.symbol_table.define(name, _type, ARG)
-            self.compile_token(self.compare(IDENTIFIER))
-
+        if self.token == ')' and self.type == SYMBOL_CODE:
+            return 0
+
+        # type varName (',' type varName)*
+        _type = self.expect_type()
+        self.symbol_table.define(self.expect_identifier(), _type, ARG)
+        count = 1
+        while self.token == ',' and self.type == SYMBOL_CODE:
+            self.advance()
+            _type = self.expect_type()
+            self.symbol_table.define(self.expect_identifier(), _type, ARG)
             count += 1
 
-            # ','
-            if self.compare(SYMBOL, ','):
-                self.compile_token()
-            else:
-                has_more = False
-
-        self.end_root('parameterList')
-
         return count
 
     def compile_var_dec(self) -> None:
         """Compiles a var declaration."""
-        # Your code goes here!
-        self.start_root('varDec')
-
         # 'var'
-        self.compile_token()
+        self.advance()
 
         # type
-        _type = self.current_token()
-        self.compile_token(self.is_type())
-
-        has_more = True
-        while has_more:
-            # varName
-            name = self.current_token()
-            self.symbol_table.define(name, _type, VAR)
-            self.compile_token(self.compare(IDENTIFIER))
-
-            # ','
-            if self.compare(SYMBOL, ','):
-                self.compile_token()
-            else:
-                has_more = False
+        _type = self.expect_type()
 
-        # ';'
-        self.compile_token(self.compare(SYMBOL, ';'))
+        # varName (',' varName)*
+        self.symbol_table.define(self.expect_identifier(), _type, VAR)
+        while self.token == ',' and self.type == SYMBOL_CODE:
+            self.advance()
+            self.symbol_table.define(self.expect_identifier(), _type, VAR)
 
-        self.end_root('varDec')
+        # ';'
+        self.expect(';')
 
     def compile_statements(self) -> None:
         """Compiles a sequence of statements, not including the enclosing
         "{}".
         """
-        # Your code goes here!
-        self.start_root('statements')
-
-        while self.tokenizer.token_type() == KEYWORD and self.current_token() in statement_comp_funcs.keys():
-            statement_comp_funcs[self.current_token()](self)
-
-        self.end_root('statements')
+        statement_funcs = self.statement_funcs
+        while self.type == KEYWORD_CODE:
+            compile_statement = statement_funcs.get(self.token)
+            if compile_statement is None:
+                break
+            compile_statement(self)
 
     def compile_do(self) -> None:
         """Compiles a do statement."""
-        # Your code goes here!
-        self.start_root('doStatement')
-
         # 'do'
-        self.compile_token()
+        self.advance()
 
-        # subroutineName | className | varName
-        prev_value = self.current_token()
-        self.compile_token(self.compare(IDENTIFIER))
+        # subroutineCall
+        self.compile_subroutine_call(self.expect_identifier())
 
+        # ';'
+        self.expect(';')
+
+        self.writer.write_pop(TEMP, 0)
+
+    # added
+    def compile_subroutine_call(self, prev_value):
+        """Compiles a subroutine call, after its first identifier."""
         identifier, subroutine = None, f"{self.class_name}.{prev_value}"
         is_static_function = False
 
         # ('.' subroutineName)?
-        if self.compare(SYMBOL, '.'):
-            # '.'
-            self.compile_token()
+        if self.token == '.' and self.type == SYMBOL_CODE:
+            self.advance()
             # subroutineName
-            if self.symbol_table.is_symbol(prev_value):
-                identifier, subroutine = prev_value, f"{self.symbol_table.type_of(prev_value)}.{self.current_token()}"
+            entry = self.symbol_table.entry_of(prev_value)
+            if entry is not None:
+                identifier, subroutine = entry, f"{entry[0]}.{self.expect_identifier()}"
             else:
-                subroutine = f"{prev_value}.{self.current_token()}"
+                subroutine = f"{prev_value}.{self.expect_identifier()}"
                 is_static_function = True
-            self.compile_token(self.compare(IDENTIFIER))
 
         if not is_static_function:
             if identifier:
-                self.writer.write_push(self.symbol_table.segment_of(identifier), self.symbol_table.index_of(identifier))
+                self.writer.write_push(kind_to_segment[identifier[1]], identifier[2])
             else:
                 self.writer.write_push(POINTER, 0)
 
-        # '('
-        self.compile_token(self.compare(SYMBOL, '('))
-        # expressionList
+        # '(' expressionList ')'
+        self.expect('(')
         n = self.compile_expression_list()
-        # ')'
-        self.compile_token(self.compare(SYMBOL, ')'))
-
-        # ';'
-        self.compile_token(self.compare(SYMBOL, ';'))
+        self.expect(')')
 
         self.writer.write_call(subroutine, n if is_static_function else n + 1)
-        self.writer.write_pop(TEMP, 0)
-
-        self.end_root('doStatement')
 
     def compile_let(self) -> None:
         """Compiles a let statement."""
-        # Your code goes here!
-        self.start_root('letStatement')
-
-        is_arr = False
-
         # 'let'
-        self.compile_token()
+        self.advance()
 
         # varName
-        variable = self.current_token()
-        self.compile_token(self.compare(IDENTIFIER))
+        variable = self.expect_identifier()
 
         # ('[' expression ']')?
-        if self.compare(SYMBOL, '['):
-            # '['
-            self.compile_token()
-            self.writer.write_push(self.symbol_table.segment_of(variable), self.symbol_table.index_of(variable))
-            # expression
+        is_arr = self.token == '[' and self.type == SYMBOL_CODE
+        if is_arr:
+            self.advance()
+            self.write_push_variable(variable)
             self.compile_expression()
-
             self.writer.write_arithmetic(biop_dict['+'])
+            self.expect(']')
 
-            # ']'
-            self.compile_token(self.compare(SYMBOL, ']'))
-
-            is_arr = True
-
-        # '='
-        self.compile_token(self.compare(SYMBOL, '='))
-
-        # expression
+        # '=' expression ';'
+        self.expect('=')
         self.compile_expression()
 
         if is_arr:
@@ -398,46 +291,33 @@ class CompilationEngine:
             self.writer.write_push(TEMP, 0)
             self.writer.write_pop(THAT, 0)
         else:
-            self.writer.write_pop(self.symbol_table.segment_of(variable), self.symbol_table.index_of(variable))
-
-        # ';'
-        self.compile_token(self.compare(SYMBOL, ';'))
+            _type, kind, index = self.variable(variable)
+            self.writer.write_pop(kind_to_segment[kind], index)
 
-        self.end_root('letStatement')
+        self.expect(';')
 
     def compile_while(self) -> None:
         """Compiles a while statement."""
-        # Your code goes here!
-        self.start_root('whileStatement')
-
         # 'while'
-        self.compile_token()
+        self.advance()
 
         first = self.label_num
         second = self.label_num + 1
         self.label_num += 2
         self.writer.write_label(f"L{first}")
 
-        # '('
-        self.compile_token(self.compare(SYMBOL, '('))
-
-        # expression
+        # '(' expression ')'
+        self.expect('(')
         self.compile_expression()
-
-        # ')'
-        self.compile_token(self.compare(SYMBOL, ')'))
+        self.expect(')')
 
         self.writer.write_arithmetic(unop_dict['~'])
         self.writer.write_if(f"L{second}")
 
-        # '{'
-        self.compile_token(self.compare(SYMBOL, '{'))
-
-        # statements
+        # '{' statements '}'
+        self.expect('{')
         self.compile_statements()
-
-        # '}'
-        self.compile_token(self.compare(SYMBOL, '}'))
+        self.expect('}')
 
         self.writer.write_goto(f"L{first}")
 
@@ -445,18 +325,13 @@ class CompilationEngine:
 
         self.label_num += 1
 
-        self.end_root('whileStatement')
-
     def compile_return(self) -> None:
         """Compiles a return statement."""
-        # Your code goes here!
-        self.start_root('returnStatement')
-
         # 'return'
-        self.compile_token()
+        self.advance()
 
         # expression?
-        if not self.compare(SYMBOL, ';'):
+        if self.token != ';' or self.type != SYMBOL_CODE:
             self.compile_expression()
         else:
             self.writer.write_push(CONST, 0)
@@ -464,26 +339,17 @@ class CompilationEngine:
         self.writer.write_return()
 
         # ';'
-        self.compile_token(self.compare(SYMBOL, ';'))
-
-        self.end_root('returnStatement')
+        self.expect(';')
 
     def compile_if(self) -> None:
         """Compiles a if statement, possibly with a trailing else clause."""
-        # Your code goes here!
-        self.start_root('ifStatement')
-
         # 'if'
-        self.compile_token()
-
-        # '('
-        self.compile_token(self.compare(SYMBOL, '('))
+        self.advance()
 
-        # expression
+        # '(' expression ')'
+        self.expect('(')
         self.compile_expression()
-
-        # ')'
-        self.compile_token(self.compare(SYMBOL, ')'))
+        self.expect(')')
 
         self.writer.write_arithmetic(unop_dict['~'])
         first = self.label_num
@@ -491,65 +357,44 @@ class CompilationEngine:
         self.label_num += 2
         self.writer.write_if(f"L{first}")
 
-        # '{'
-        self.compile_token(self.compare(SYMBOL, '{'))
-
-        # statements
+        # '{' statements '}'
+        self.expect('{')
         self.compile_statements()
-
-        # '}'
-        self.compile_token(self.compare(SYMBOL, '}'))
+        self.expect('}')
 
         # ('else' '{' statements '}')?
-        if self.compare(KEYWORD, 'else'):
+        if self.type == KEYWORD_CODE and self.token == 'else':
             self.label_num += 1
             self.writer.write_goto(f"L{second}")
 
             # 'else'
-            self.compile_token()
+            self.advance()
             self.writer.write_label(f"L{first}")
 
-            # '{'
-            self.compile_token(self.compare(SYMBOL, '{'))
-
-            # statements
+            # '{' statements '}'
+            self.expect('{')
             self.compile_statements()
-
-            # '}'
-            self.compile_token(self.compare(SYMBOL, '}'))
+            self.expect('}')
             self.writer.write_label(f"L{second}")
 
         else:
             self.writer.write_label(f"L{first}")
 
-        self.end_root('ifStatement')
-
     def compile_expression(self) -> None:
         """Compiles an expression."""
-
-        self.start_root('expression')
+        term_funcs = self.term_funcs
 
         # term
-        self.compile_term()
+        term_funcs[self.type](self)
 
         # (op term)*
-        while self.compare(SYMBOL) and self.current_token() in ('+', '-', '*', '/', '=', '>', '<', '&', '|'):
-            # op
-            op = self.current_token()
-            self.compile_token()
-
-            # term
-            self.compile_term()
-
-            # compile op
-            if op in biop_dict.keys():
-                self.writer.write_arithmetic(biop_dict[op])
-            elif op == '*':
-                self.writer.write_call('Math.multiply', 2)
-            elif op == '/':
-                self.writer.write_call('Math.divide', 2)
-
-        self.end_root('expression')
+        while self.type == SYMBOL_CODE:
+            write_op = binary_op_funcs.get(self.token)
+            if write_op is None:
+                break
+            self.type, self.token, self.offset = next(self._tokens, END_OF_INPUT)
+            term_funcs[self.type](self)
+            write_op(self.writer)
 
     def compile_term(self) -> None:
         """Compiles a term.
@@ -561,141 +406,104 @@ class CompilationEngine:
         to distinguish between the three possibilities. Any other token is not
         part of this term and should not be advanced over.
         """
-        # Your code goes here!
-        self.start_root('term')
-
-        # integerConstant | stringConstant | keywordConstant
-        if self.tokenizer.token_type() == INT_CONST:
-            self.writer.write_push(CONST, self.current_token())
-            self.tokenizer.advance()
-        elif self.tokenizer.token_type() == STRING_CONST:
-            self.writer.write_push(CONST, len(self.current_token()))
-            self.writer.write_call('String.new', 1)
-            for c in self.current_token():
-                self.writer.write_push(CONST, ord(c))
-                self.writer.write_call('String.appendChar', 2)
-            self.tokenizer.advance()
-        elif self.compare(KEYWORD) and self.current_token() in ('true', 'false', 'null', 'this'):
-            if self.current_token() == 'true':
-                self.writer.write_push(CONST, 0)
-                self.writer.write_arithmetic(unop_dict['~'])
-            elif self.current_token() in ('false', 'null'):
-                self.writer.write_push(CONST, 0)
-            else:
-                self.writer.write_push(POINTER, 0)
-            self.tokenizer.advance()
+        self.term_funcs[self.type](self)
 
+    # added
+    def compile_keyword_term(self):
+        # keywordConstant
+        write_constant = keyword_constant_funcs.get(self.token)
+        if write_constant is None:
+            raise self.error(f'Invalid Expression. curr_token: {self.token}')
+        write_constant(self.writer)
+        self.advance()
+
+    # added
+    def compile_symbol_term(self):
+        op = self.token
         # '(' expression ')'
-        elif self.compare(SYMBOL, '('):
-            # '('
-            self.compile_token()
-            # expression
+        if op == '(':
+            self.advance()
             self.compile_expression()
-            # ')'
-            self.compile_token(self.compare(SYMBOL, ')'))
-
+            self.expect(')')
         # unaryOp term
-
-        elif self.compare(SYMBOL) and self.current_token() in "-~^#":
-            # unaryOp
-            op = self.current_token()
-            self.compile_token()
-            # term
+        elif op in unop_dict:
+            self.advance()
             self.compile_term()
-
             self.writer.write_arithmetic(unop_dict[op])
+        else:
+            raise self.error(f'Invalid Expression. curr_token: {op}')
 
+    # added
+    def compile_identifier_term(self):
         # varName | varName '[' expression ']' | subroutineCall
-        elif self.compare(IDENTIFIER):
-            prev_name = xml_element_names[self.tokenizer.token_type()]
-            prev_value = self.current_token()
-
-            self.tokenizer.advance()
-
-            # varName '[' expression ']'
-            if self.compare(SYMBOL, '['):
-                # varName
-                self.add_element(prev_name, prev_value)
-                self.writer.write_push(self.symbol_table.segment_of(prev_value), self.symbol_table.index_of(prev_value))
-                # '['
-                self.compile_token()
-                # expression
-                self.compile_expression()
-                # ']'
-                self.compile_token(self.compare(SYMBOL, ']'))
-
-                self.writer.write_arithmetic(biop_dict['+'])
-                self.writer.write_pop(POINTER, 1)
-                self.writer.write_push(THAT, 0)
-
-            # subroutineCall
-            elif self.compare(SYMBOL, '(') or self.compare(SYMBOL, '.'):
-                # subroutineName | className | varName
-                self.add_element(prev_name, prev_value)
-                identifier, subroutine = None, f"{self.class_name}.{prev_value}"
-                is_static_function = False
-
-                print(f'--COMPILING--\nprev_value: {prev_value}, curr_value: {self.current_token()}')
-                print(f'checking if {prev_value} is symbol: {self.symbol_table.is_symbol(prev_value)}')
-
-                # ('.' subroutineName)?
-                if self.compare(SYMBOL, '.'):
-                    # '.'
-                    self.compile_token()
-                    # subroutineName
-                    if self.symbol_table.is_symbol(prev_value):
-                        identifier, subroutine = prev_value, f"{self.symbol_table.type_of(prev_value)}.{self.current_token()}"
-                    else:
-                        subroutine = f"{prev_value}.{self.current_token()}"
-                        is_static_function = True
-                    self.compile_token(self.compare(IDENTIFIER))
-
-                if not is_static_function:
-                    if identifier:
-                        self.writer.write_push(self.symbol_table.segment_of(identifier), self.symbol_table.index_of(identifier))
-                    else:
-                        self.writer.write_push(POINTER, 0)
-
-                # '('
-                self.compile_token(self.compare(SYMBOL, '('))
-                # expressionList
-                n = self.compile_expression_list()
-                # ')'
-                self.compile_token(self.compare(SYMBOL, ')'))
-
-                self.writer.write_call(subroutine, n if is_static_function else n+1)
-
-            # varName
-            else:
-                self.writer.write_push(self.symbol_table.segment_of(prev_value), self.symbol_table.index_of(prev_value))
+        prev_value = self.token
+        self.advance()
+        next_symbol = self.token if self.type == SYMBOL_CODE else None
+
+        # varName '[' expression ']'
+        if next_symbol == '[':
+            self.write_push_variable(prev_value)
+            self.advance()
+            self.compile_expression()
+            self.expect(']')
+
+            self.writer.write_arithmetic(biop_dict['+'])
+            self.writer.write_pop(POINTER, 1)
+            self.writer.write_push(THAT, 0)
 
+        # subroutineCall
+        elif next_symbol == '(' or next_symbol == '.':
+            self.compile_subroutine_call(prev_value)
+
+        # varName
         else:
-            raise Exception(f'Invalid Expression. curr_token: {self.current_token()}')
+            self.write_push_variable(prev_value)
 
-        self.end_root('term')
+    # added
+    def compile_missing_term(self):
+        raise self.error('Invalid Expression')
+
+    # added
+    def compile_int_term(self):
+        # integerConstant
+        self.writer.write_push(CONST, self.token)
+        self.advance()
+
+    # added
+    def compile_string_term(self):
+        # stringConstant
+        self.writer.write_push(CONST, len(self.token))
+        self.writer.write_call('String.new', 1)
+        for c in self.token:
+            self.writer.write_push(CONST, ord(c))
+            self.writer.write_call('String.appendChar', 2)
+        self.advance()
 
     def compile_expression_list(self) -> int:
         """Compiles a (possibly empty) comma-separated list of expressions."""
-        # Your code goes here!
-        self.start_root('expressionList')
-
-        count = 0
+        if self.token == ')' and self.type == SYMBOL_CODE:
+            return 0
 
-        # ( expression (',' expression)* )?
-        if not self.compare(SYMBOL, ')'):
-            # expression
+        # expression (',' expression)*
+        self.compile_expression()
+        count = 1
+        while self.token == ',' and self.type == SYMBOL_CODE:
+            self.advance()
             self.compile_expression()
             count += 1
 
-            # (',' expression)*
-            while self.compare(SYMBOL, ','):
-                # ','
-                self.compile_token()
-
-                # expression
-                self.compile_expression()
-                count += 1
-
-        self.end_root('expressionList')
-
         return count
+
+    # Dispatch tables, keyed by statement keyword and by token type code
+    statement_funcs = {"let": compile_let,
+                       "do": compile_do,
+                       "while": compile_while,
+                       "if": compile_if,
+                       "return": compile_return}
+
+    term_funcs = {KEYWORD_CODE: compile_keyword_term,
+                  SYMBOL_CODE: compile_symbol_term,
+                  IDENTIFIER_CODE: compile_identifier_term,
+                  INT_CONST_CODE: compile_int_term,
+                  STRING_CONST_CODE: compile_string_term,
+                  None: compile_missing_term}
@@ -0,0 +1,105 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+
+from SyntaxTree import *
+
+
+def wrap(value: int) -> int:
+    """
+    Returns:
+        int: the value as a Hack word, a 16-bit two's complement integer in
+        the range -32768..32767.
+    """
+    value &= 0xFFFF
+    return value - 0x10000 if value & 0x8000 else value
+
+
+def _divide(x: int, y: int) -> typing.Optional[int]:
+    # Math.divide divides the absolute values and truncates towards zero. It
+    # fails on zero divisors, and abs(-32768) overflows, so those are left to
+    # run (and fail) as they would have.
+    if y == 0 or x == -32768 or y == -32768:
+        return None
+    quotient = abs(x) // abs(y)
+    return -quotient if (x < 0) != (y < 0) else quotient
+
+
+binary_op_funcs = {'+': lambda x, y: wrap(x + y),
+                   '-': lambda x, y: wrap(x - y),
+                   '*': lambda x, y: wrap(x * y),
+                   '/': _divide,
+                   '=': lambda x, y: -1 if x == y else 0,
+                   '>': lambda x, y: -1 if x > y else 0,
+                   '<': lambda x, y: -1 if x < y else 0,
+                   '&': lambda x, y: x & y,
+                   '|': lambda x, y: x | y}
+
+# shiftright is arithmetic: it keeps the sign bit
+unary_op_funcs = {'-': lambda x: wrap(-x),
+                  '~': lambda x: ~x,
+                  '^': lambda x: wrap(x << 1),
+                  '#': lambda x: x >> 1}
+
+keyword_values = {'true': -1, 'false': 0, 'null': 0}
+
+
+def constant_value(expression: Expression) -> typing.Optional[int]:
+    """
+    Returns:
+        int: the value of the expression as a Hack word, if it is a constant,
+        or None.
+    """
+    if type(expression) is IntConst:
+        return wrap(expression.value)
+    if type(expression) is KeywordConst:
+        return keyword_values.get(expression.value)
+    return None
+
+
+class ConstantFolder(NodeTransformer):
+    """Evaluates constant subexpressions at compile time, with the
+    wraparound of Hack's 16-bit words, so 2*8+1 compiles to a single
+    constant instead of a call to Math.multiply and an add. Folded values may
+    be negative; the CodeGenerator materializes those.
+
+    Chains of additions and subtractions of constants, which Jack's lack of
+    precedence parses as ((x + 1) + 2), are reassociated into x + 3, which
+    is exact in modular arithmetic.
+    """
+
+    def visit_Unary(self, node: Unary) -> Expression:
+        self.generic_visit(node)
+        value = constant_value(node.operand)
+        if value is None:
+            return node
+        return IntConst(unary_op_funcs[node.op](value))
+
+    def visit_Binary(self, node: Binary) -> Expression:
+        self.generic_visit(node)
+        right = constant_value(node.right)
+        if right is None:
+            return node
+        left = constant_value(node.left)
+        if left is not None:
+            value = binary_op_funcs[node.op](left, right)
+            return node if value is None else IntConst(value)
+
+        # (x +- c1) +- c2 = x + (+-c1 +- c2)
+        inner = node.left
+        if node.op in ('+', '-') and type(inner) is Binary and inner.op in ('+', '-'):
+            inner_right = constant_value(inner.right)
+            if inner_right is not None:
+                total = wrap((inner_right if inner.op == '+' else -inner_right) +
+                             (right if node.op == '+' else -right))
+                if total == 0:
+                    return inner.left
+                if total < 0 and total != -32768:
+                    return Binary('-', inner.left, IntConst(-total))
+                return Binary('+', inner.left, IntConst(total))
+        return node
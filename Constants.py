@@ -9,6 +9,17 @@ THAT = 'that'
 POINTER = 'pointer'
 TEMP = 'temp'
 
+KEYWORD = "KEYWORD"
+SYMBOL = "SYMBOL"
+IDENTIFIER = "IDENTIFIER"
+INT_CONST = "INT_CONST"
+STRING_CONST = "STRING_CONST"
+
+# Token types, indexed by their compact integer code
+token_types = (KEYWORD, SYMBOL, IDENTIFIER, INT_CONST, STRING_CONST)
+KEYWORD_CODE, SYMBOL_CODE, IDENTIFIER_CODE, INT_CONST_CODE, STRING_CONST_CODE = range(len(token_types))
+token_type_codes = {token_type: code for code, token_type in enumerate(token_types)}
+
 biop_dict = {'+': 'add',
              '-': 'sub',
              '=': 'eq',
@@ -21,3 +32,35 @@ unop_dict = {'-': 'neg',
              '~': 'not',
              '^': 'shiftleft',
              '#': 'shiftright'}
+
+# Optimizations the compiler can be asked for by name (JackCompiler -O)
+optimization_names = ('fold', 'strength', 'licm', 'strings', 'cse', 'branches', 'tailcalls',
+                      'intrinsics', 'schedule', 'ir', 'peephole', 'flow', 'locals', 'inline',
+                      'prune')
+
+# The subroutines of the Jack OS: class -> name -> (kind, parameters, not
+# counting this)
+os_subroutines = {
+    'Math': {'init': ('function', 0), 'abs': ('function', 1), 'multiply': ('function', 2),
+             'divide': ('function', 2), 'min': ('function', 2), 'max': ('function', 2),
+             'sqrt': ('function', 1)},
+    'String': {'new': ('constructor', 1), 'dispose': ('method', 0), 'length': ('method', 0),
+               'charAt': ('method', 1), 'setCharAt': ('method', 2), 'appendChar': ('method', 1),
+               'eraseLastChar': ('method', 0), 'intValue': ('method', 0), 'setInt': ('method', 1),
+               'backSpace': ('function', 0), 'doubleQuote': ('function', 0), 'newLine': ('function', 0)},
+    'Array': {'new': ('function', 1), 'dispose': ('method', 0)},
+    'Output': {'init': ('function', 0), 'moveCursor': ('function', 2), 'printChar': ('function', 1),
+               'printString': ('function', 1), 'printInt': ('function', 1), 'println': ('function', 0),
+               'backSpace': ('function', 0)},
+    'Screen': {'init': ('function', 0), 'clearScreen': ('function', 0), 'setColor': ('function', 1),
+               'drawPixel': ('function', 2), 'drawLine': ('function', 4), 'drawRectangle': ('function', 4),
+               'drawCircle': ('function', 3)},
+    'Keyboard': {'init': ('function', 0), 'keyPressed': ('function', 0), 'readChar': ('function', 0),
+                 'readLine': ('function', 1), 'readInt': ('function', 1)},
+    'Memory': {'init': ('function', 0), 'peek': ('function', 1), 'poke': ('function', 2),
+               'alloc': ('function', 1), 'deAlloc': ('function', 1)},
+    'Sys': {'init': ('function', 0), 'halt': ('function', 0), 'error': ('function', 1),
+            'wait': ('function', 1)}}
+
+# OS subroutines that -O intrinsics compiles inline instead of calling
+intrinsic_names = ('Memory.peek', 'Memory.poke', 'Array.new', 'Math.abs', 'Math.min', 'Math.max')
@@ -0,0 +1,170 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+
+# A basic block: lines of VM code, of which only the first may be a label
+# and only the last may be a goto, if-goto or return
+Block = typing.List[str]
+
+# The first two letters of the lines that begin or end a block
+_block_bounds = frozenset(('la', 'go', 'if', 're'))
+
+
+def basic_blocks(commands: typing.List[str]) -> typing.List[Block]:
+    """
+    Args:
+        commands (typing.List[str]): lines of VM code of a subroutine.
+
+    Returns:
+        list: the basic blocks of the code, in order.
+    """
+    blocks = []
+    block = []
+    for line in commands:
+        if line[:2] in _block_bounds:
+            if line[0] == 'l':
+                if block:
+                    blocks.append(block)
+                block = [line]
+                continue
+            block.append(line)
+            blocks.append(block)
+            block = []
+        else:
+            block.append(line)
+    if block:
+        blocks.append(block)
+    return blocks
+
+
+def label_of(block: Block) -> typing.Optional[str]:
+    """
+    Returns:
+        str: the label that starts the block, or None.
+    """
+    first = block[0]
+    return first.split()[1] if first.startswith('label ') else None
+
+
+def jump_target(line: str) -> typing.Optional[str]:
+    """
+    Returns:
+        str: the label a goto or if-goto line jumps to, or None.
+    """
+    return line.split()[1] if line.startswith(('goto ', 'if-goto ')) else None
+
+
+class FlowOptimizer:
+    """Cleans up the control flow of a subroutine, on the basic blocks of its
+    VM code. The code generator emits a goto past the else clause even when
+    the then clause returns, code after return statements and after
+    while (true) loops, and labels nothing jumps to. Until nothing changes:
+    - jumps to a label that only jumps on, or that is directly followed by
+      another label, go straight to the final label;
+    - blocks that cannot be reached from the function command are dropped;
+    - a goto to the label right after it is dropped;
+    - labels nothing jumps to are dropped, merging their block into the one
+      before it.
+    """
+
+    def optimize(self, commands: typing.List[str]) -> typing.List[str]:
+        """
+        Args:
+            commands (typing.List[str]): lines of VM code of a subroutine.
+
+        Returns:
+            typing.List[str]: the optimized lines.
+        """
+        blocks = basic_blocks(commands)
+        changed = True
+        while changed:
+            changed = self._thread_jumps(blocks)
+            reachable = self._reachable(blocks)
+            changed |= len(reachable) < len(blocks)
+            changed |= self._remove_jumps_to_next(reachable)
+            blocks = self._merge_blocks(reachable)
+            changed |= len(blocks) < len(reachable)
+        return [line for block in blocks for line in block]
+
+    @staticmethod
+    def _thread_jumps(blocks: typing.List[Block]) -> bool:
+        index = {label_of(block): i for i, block in enumerate(blocks)}
+        index.pop(None, None)
+
+        def final(label: str) -> str:
+            seen = {label}
+            while True:
+                i = index[label]
+                block = blocks[i]
+                if len(block) == 1 and i + 1 < len(blocks) and label_of(blocks[i + 1]) is not None:
+                    following = label_of(blocks[i + 1])
+                elif len(block) == 2 and block[1].startswith('goto '):
+                    following = jump_target(block[1])
+                else:
+                    return label
+                if following in seen:
+                    # A loop that only jumps, keep it
+                    return label
+                seen.add(following)
+                label = following
+
+        changed = False
+        for block in blocks:
+            target = jump_target(block[-1])
+            if target is not None:
+                threaded = final(target)
+                if threaded != target:
+                    block[-1] = f"{block[-1].split()[0]} {threaded}\n"
+                    changed = True
+        return changed
+
+    @staticmethod
+    def _reachable(blocks: typing.List[Block]) -> typing.List[Block]:
+        index = {label_of(block): i for i, block in enumerate(blocks)}
+        reached = set()
+        pending = [0] if blocks else []
+        while pending:
+            i = pending.pop()
+            if i in reached or i >= len(blocks):
+                continue
+            reached.add(i)
+            last = blocks[i][-1]
+            target = jump_target(last)
+            if target is not None:
+                pending.append(index[target])
+            if not last.startswith(('goto ', 'return')):
+                pending.append(i + 1)
+        return [block for i, block in enumerate(blocks) if i in reached]
+
+    @staticmethod
+    def _remove_jumps_to_next(blocks: typing.List[Block]) -> bool:
+        changed = False
+        for block, following in zip(blocks, blocks[1:]):
+            if block[-1].startswith('goto ') and jump_target(block[-1]) == label_of(following):
+                block.pop()
+                changed = True
+        return changed
+
+    @staticmethod
+    def _merge_blocks(blocks: typing.List[Block]) -> typing.List[Block]:
+        """Drops the labels nothing jumps to, and appends each block that no
+        longer starts with a label to the block before it, if that one falls
+        through to it.
+        """
+        targets = {jump_target(block[-1]) for block in blocks if block}
+        merged = []
+        for block in blocks:
+            if block and block[0][:2] == 'la' and block[0].split()[1] not in targets:
+                del block[0]
+            if not block:
+                continue
+            if merged and block[0][:2] != 'la' and merged[-1][-1][:2] not in _block_bounds:
+                merged[-1].extend(block)
+            else:
+                merged.append(block)
+        return merged
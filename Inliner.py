@@ -0,0 +1,243 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+
+from Constants import *
+from Profile import Profile
+
+# The most VM commands a subroutine body may have to be inlined, not
+# counting the method prologue and the return
+DEFAULT_INLINE_THRESHOLD = 8
+
+# How many times larger a hot subroutine may be, to be inlined
+HOT_INLINE_FACTOR = 4
+
+# Commands that make a subroutine more than a straight-line leaf
+_not_inlined = frozenset(('call', 'label', 'goto', 'if-goto', 'return', 'function'))
+
+
+def subroutines(commands: typing.List[str]) -> typing.Iterator[typing.List[str]]:
+    """
+    Args:
+        commands (typing.List[str]): lines of VM code of a class.
+
+    Returns:
+        iterator: the lines of each subroutine, from its function command on.
+    """
+    subroutine = []
+    for line in commands:
+        if line.startswith('function ') and subroutine:
+            yield subroutine
+            subroutine = []
+        subroutine.append(line)
+    if subroutine:
+        yield subroutine
+
+
+def result_discarded(commands: typing.List[str], i: int) -> bool:
+    """
+    Args:
+        commands (typing.List[str]): lines of VM code of a subroutine.
+        i (int): the line after a call.
+
+    Returns:
+        bool: whether the call is a do, whose result is popped to temp 0
+        and never read. A let of an array element pops its value to temp 0
+        too, but pushes it back before the end of the statement.
+    """
+    if i >= len(commands) or commands[i] != f"pop {TEMP} 0\n":
+        return False
+    for line in commands[i + 1:]:
+        if line == f"push {TEMP} 0\n":
+            return False
+        if line == f"pop {TEMP} 0\n" or line.split()[0] in _not_inlined:
+            # The code of a statement does not keep temp 0 past its end
+            return True
+    return True
+
+
+class InlineBody:
+    """The VM code of a subroutine that can be inlined."""
+
+    def __init__(self, class_name: str, method: bool, n_locals: int,
+                 n_arguments: int, body: typing.List[typing.List[str]]) -> None:
+        """
+        Args:
+            class_name (str): the class the subroutine belongs to.
+            method (bool): the subroutine starts with the method prologue,
+            which is not part of the body.
+            n_locals (int): the local variables of the subroutine.
+            n_arguments (int): the arguments the body uses, the receiver
+            included.
+            body (list): the commands of the body, as lists of words,
+            without the final return.
+        """
+        self.class_name = class_name
+        self.method = method
+        self.n_locals = n_locals
+        self.n_arguments = n_arguments
+        self.body = body
+
+
+class Inliner:
+    """Inlines calls of small leaf subroutines, across classes, on VM code.
+
+    A subroutine can be inlined if its body is straight-line code without
+    calls, ending in its only return, and has at most threshold commands.
+    At a call site the arguments are popped off the stack into local
+    variables added to the caller, after the caller's own, and the callee's
+    local variables get slots after those, zeroed as the function command
+    would. For a method, the receiver is popped into pointer 1 and the body
+    reads its fields through that instead of this, so the caller's this is
+    left alone, as a call would. Methods that use that or pointer, and
+    functions that use this, are not inlined. Neither are subroutines that
+    use static variables, into other classes, since every class has its own
+    static segment.
+
+    Given the Profile of a run of the program, hot subroutines are inlined
+    up to HOT_INLINE_FACTOR times the threshold, and nothing is inlined
+    into or from subroutines that were never called, which stay compact.
+
+    The Inliner first sees every subroutine in add_subroutine(), then
+    rewrites each subroutine in optimize(), as a VMWriter pass would.
+    """
+
+    def __init__(self, threshold: int = DEFAULT_INLINE_THRESHOLD,
+                 profile: typing.Optional[Profile] = None) -> None:
+        """
+        Args:
+            threshold (int): the most commands of an inlined body.
+            profile (Profile): the execution profile to inline for.
+        """
+        self.threshold = threshold
+        self.profile = profile
+        # Subroutine name -> its InlineBody
+        self.bodies = dict()
+        # Call sites inlined so far
+        self.inlined = 0
+
+    def add_subroutine(self, commands: typing.List[str]) -> None:
+        """Records the subroutine if it can be inlined.
+
+        Args:
+            commands (typing.List[str]): lines of VM code of the subroutine,
+            from its function command on.
+        """
+        _function, name, n_locals = commands[0].split()
+        threshold = self.threshold
+        if self.profile is not None:
+            if self.profile.is_cold(name):
+                return
+            if self.profile.is_hot(name):
+                threshold *= HOT_INLINE_FACTOR
+        body = self.inline_body(name.split('.')[0], int(n_locals),
+                                [line.split() for line in commands[1:]], threshold)
+        if body is not None:
+            self.bodies[name] = body
+
+    def inline_body(self, class_name: str, n_locals: int,
+                    body: typing.List[typing.List[str]],
+                    threshold: int) -> typing.Optional[InlineBody]:
+        """
+        Returns:
+            InlineBody: the subroutine with the given body, or None if it
+            cannot be inlined.
+        """
+        if not body or body[-1] != ['return']:
+            return None
+        body = body[:-1]
+        method = body[:2] == [['push', ARG, '0'], ['pop', POINTER, '0']]
+        if method:
+            body = body[2:]
+        if len(body) > threshold:
+            return None
+
+        n_arguments = int(method)
+        for command in body:
+            if command[0] in _not_inlined:
+                return None
+            if len(command) == 3:
+                segment, index = command[1], command[2]
+                if segment == ARG:
+                    n_arguments = max(n_arguments, int(index) + 1)
+                elif (segment == THIS or segment == POINTER and index == '0') and not method:
+                    return None
+                elif (segment == THAT or segment == POINTER) and method:
+                    return None
+        return InlineBody(class_name, method, n_locals, n_arguments, body)
+
+    def optimize(self, commands: typing.List[str]) -> typing.List[str]:
+        """
+        Args:
+            commands (typing.List[str]): lines of VM code of a subroutine.
+
+        Returns:
+            typing.List[str]: the lines with the calls inlined.
+        """
+        _function, name, n_locals = commands[0].split()
+        if self.profile is not None and self.profile.is_cold(name):
+            return commands
+        class_name = name.split('.')[0]
+        base = int(n_locals)
+        extra_locals = 0
+
+        output = [commands[0]]
+        i = 1
+        while i < len(commands):
+            line = commands[i]
+            i += 1
+            if not line.startswith('call '):
+                output.append(line)
+                continue
+            _call, callee, n_args = line.split()
+            n_args = int(n_args)
+            inline = self.bodies.get(callee)
+            if inline is None or n_args < inline.n_arguments or \
+                    inline.class_name != class_name and \
+                    any(command[1:2] == [STATIC] for command in inline.body):
+                output.append(line)
+                continue
+
+            self.inlined += 1
+            first = int(inline.method)
+            # Slots of the arguments and the locals of the callee
+            arguments = {str(j): f"{LOCAL} {base + j - first}" for j in range(first, n_args)}
+            local_base = base + n_args - first
+            extra_locals = max(extra_locals, local_base - base + inline.n_locals)
+
+            for j in reversed(range(first, n_args)):
+                output.append(f"pop {arguments[str(j)]}\n")
+            if inline.method:
+                output.append(f"pop {POINTER} 1\n")
+                arguments['0'] = f"{POINTER} 1"
+            for j in range(inline.n_locals):
+                output.append(f"push {CONST} 0\n")
+                output.append(f"pop {LOCAL} {local_base + j}\n")
+
+            body = inline.body
+            if body and body[-1] == ['push', CONST, '0'] and result_discarded(commands, i):
+                # The result of a void subroutine, discarded by a do
+                body = body[:-1]
+                i += 1
+            for command in body:
+                if len(command) == 3:
+                    operation, segment, index = command
+                    if segment == ARG:
+                        output.append(f"{operation} {arguments[index]}\n")
+                        continue
+                    if segment == LOCAL:
+                        output.append(f"{operation} {LOCAL} {local_base + int(index)}\n")
+                        continue
+                    if segment == THIS:
+                        output.append(f"{operation} {THAT} {index}\n")
+                        continue
+                output.append(' '.join(command) + '\n')
+
+        if extra_locals:
+            output[0] = f"function {name} {base + extra_locals}\n"
+        return output
@@ -5,27 +5,225 @@ was written by Aviv Yaish. It is an extension to the specifications given
 as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
+import argparse
+import io
 import os
 import sys
 import typing
+from BuildCache import BuildCache, DEFAULT_CACHE_SIZE
+from CallGraph import CallGraph
+from Constants import intrinsic_names, optimization_names, os_subroutines
+from CodeGenerator import CodeGenerator
 from CompilationEngine import CompilationEngine
+from FlowOptimizer import FlowOptimizer
+from Inliner import DEFAULT_INLINE_THRESHOLD, Inliner, subroutines
+from JackParser import JackParser
 from JackTokenizer import JackTokenizer
+from LineIndex import LineIndex
+from LocalAllocator import LocalAllocator
+from LoopInvariantMotion import LoopInvariantMotion
+from PeepholeOptimizer import PeepholeOptimizer, peephole_rules
+from Profile import Profile
+from StackDepth import StackDepth
 from SymbolTable import SymbolTable
 from VMWriter import VMWriter
 
 
 def compile_file(
-        input_file: typing.TextIO, output_file: typing.TextIO) -> None:
+        input_file: typing.TextIO, output_file: typing.TextIO,
+        streaming: bool = False, token_buffer: bool = False,
+        mapped: bool = False, cache: typing.Optional[BuildCache] = None,
+        ast: bool = False, optimizations: typing.AbstractSet[str] = frozenset(),
+        peephole: typing.Optional[PeepholeOptimizer] = None,
+        licm: typing.Optional[LoopInvariantMotion] = None,
+        intrinsics: typing.AbstractSet[str] = frozenset(intrinsic_names),
+        program_classes: typing.AbstractSet[str] = frozenset(),
+        profile: typing.Optional[Profile] = None, instrument: bool = False) -> None:
     """Compiles a single file.
 
     Args:
         input_file (typing.TextIO): the file to compile.
         output_file (typing.TextIO): writes all output to this file.
+        streaming (bool): read the input in chunks instead of all at once.
+        token_buffer (bool): tokenize the whole input into a TokenBuffer
+        before parsing it.
+        mapped (bool): memory-map the input instead of reading it.
+        cache (BuildCache): reuse the tokens or VM code of a previous build of
+        the same source, if there is one. The input is then read all at once.
+        ast (bool): parse the whole class into a syntax tree, then generate
+        code from the tree, instead of generating code while parsing.
+        optimizations (typing.AbstractSet[str]): names of the optimizations to
+        apply (see Constants.optimization_names). They work on the syntax
+        tree, so they imply ast.
+        peephole (PeepholeOptimizer): the optimizer for 'peephole'.
+        licm (LoopInvariantMotion): the pass for 'licm'.
+        intrinsics (typing.AbstractSet[str]): the OS subroutines that
+        'intrinsics' compiles inline (see Constants.intrinsic_names).
+        program_classes (typing.AbstractSet[str]): the names of the classes
+        of the program. 'intrinsics' leaves the OS classes among them alone.
+        profile (Profile): the execution profile to optimize for.
+        instrument (bool): label every loop body, so that a run of the
+        program in the VMEmulator profiles the loops. Implies ast.
     """
-    # Your code goes here!
-    # This function should be relatively similar to "analyze_file" in
-    # JackAnalyzer.py from the previous project.
-    pass
+    if cache is not None:
+        compile_cached(input_file.read(), output_file, cache, ast, optimizations, peephole, licm,
+                       intrinsics, program_classes, profile, instrument)
+        return
+
+    with JackTokenizer(input_file, streaming, mapped) as tokenizer:
+        tokens = tokenizer.token_buffer() if token_buffer else tokenizer
+        compile_tokens(tokens, output_file, ast, optimizations, peephole, licm, intrinsics,
+                       program_classes, profile, instrument)
+
+
+def compile_tokens(tokenizer: typing.Union[JackTokenizer, "TokenBuffer"],
+                   output_file: typing.TextIO, ast: bool = False,
+                   optimizations: typing.AbstractSet[str] = frozenset(),
+                   peephole: typing.Optional[PeepholeOptimizer] = None,
+                   licm: typing.Optional[LoopInvariantMotion] = None,
+                   intrinsics: typing.AbstractSet[str] = frozenset(intrinsic_names),
+                   program_classes: typing.AbstractSet[str] = frozenset(),
+                   profile: typing.Optional[Profile] = None, instrument: bool = False) -> None:
+    """Compiles the tokens of a single file.
+
+    Args:
+        tokenizer: a JackTokenizer or a TokenBuffer.
+        output_file (typing.TextIO): writes all output to this file.
+        ast (bool): go through a syntax tree.
+        optimizations (typing.AbstractSet[str]): the optimizations to apply.
+        peephole (PeepholeOptimizer): the optimizer for 'peephole'.
+        licm (LoopInvariantMotion): the pass for 'licm'.
+        intrinsics (typing.AbstractSet[str]): the intrinsics to compile inline.
+        program_classes (typing.AbstractSet[str]): the classes of the program.
+        profile (Profile): the execution profile to optimize for.
+        instrument (bool): label every loop body.
+    """
+    if ast or optimizations or instrument:
+        tree = JackParser(tokenizer).parse_class()
+        if tree is not None:
+            CodeGenerator(output_file, tokenizer.line_index, optimizations,
+                          peephole, licm, intrinsics, program_classes, profile,
+                          instrument).compile_class(tree)
+    else:
+        CompilationEngine(tokenizer, output_file).compile_class()
+
+
+def compile_cached(source: str, output_file: typing.TextIO, cache: BuildCache,
+                   ast: bool = False, optimizations: typing.AbstractSet[str] = frozenset(),
+                   peephole: typing.Optional[PeepholeOptimizer] = None,
+                   licm: typing.Optional[LoopInvariantMotion] = None,
+                   intrinsics: typing.AbstractSet[str] = frozenset(intrinsic_names),
+                   program_classes: typing.AbstractSet[str] = frozenset(),
+                   profile: typing.Optional[Profile] = None, instrument: bool = False) -> None:
+    """Compiles a single source, through a build cache.
+
+    Args:
+        source (str): the Jack source code.
+        output_file (typing.TextIO): writes all output to this file.
+        cache (BuildCache): the build cache.
+        ast (bool): go through a syntax tree.
+        optimizations (typing.AbstractSet[str]): the optimizations to apply.
+        peephole (PeepholeOptimizer): the optimizer for 'peephole'. Its counts
+        only include the subroutines compiled, not those found in the cache.
+        licm (LoopInvariantMotion): the pass for 'licm'. Likewise, it only
+        records the loops of classes compiled.
+        intrinsics (typing.AbstractSet[str]): the intrinsics to compile inline.
+        program_classes (typing.AbstractSet[str]): the classes of the program.
+        profile (Profile): the execution profile to optimize for.
+        instrument (bool): label every loop body.
+    """
+    # The tokens only depend on the source, the output also on optimizations
+    options = sorted(optimizations)
+    if 'peephole' in optimizations and peephole is not None:
+        options += sorted('no-' + rule for rule in peephole.disabled)
+    if 'intrinsics' in optimizations:
+        options += sorted('no-' + name for name in intrinsic_names if name not in intrinsics)
+        options += sorted('os-' + name for name in program_classes if name in os_subroutines)
+    if instrument:
+        options.append('instrument')
+    if profile is not None and optimizations:
+        options.append('profile-' + profile.key())
+    tokens_key = cache.key(source)
+    output_key = cache.key(source, *options)
+    output = cache.load_output(output_key)
+    if output is None:
+        tokens = cache.load_tokens(tokens_key, LineIndex(source))
+        if tokens is None:
+            tokens = JackTokenizer(io.StringIO(source)).token_buffer()
+            cache.store_tokens(tokens_key, tokens)
+        output_buffer = io.StringIO()
+        compile_tokens(tokens, output_buffer, ast, optimizations, peephole, licm, intrinsics,
+                       program_classes, profile, instrument)
+        output = output_buffer.getvalue()
+        cache.store_output(output_key, output)
+    output_file.write(output)
+
+
+def compile_program(
+        input_paths: typing.List[str],
+        streaming: bool = False, token_buffer: bool = False,
+        mapped: bool = False, cache: typing.Optional[BuildCache] = None,
+        ast: bool = False, optimizations: typing.AbstractSet[str] = frozenset(),
+        peephole: typing.Optional[PeepholeOptimizer] = None,
+        licm: typing.Optional[LoopInvariantMotion] = None,
+        intrinsics: typing.AbstractSet[str] = frozenset(intrinsic_names),
+        program_classes: typing.AbstractSet[str] = frozenset(),
+        inline_threshold: int = DEFAULT_INLINE_THRESHOLD,
+        profile: typing.Optional[Profile] = None, instrument: bool = False) -> CallGraph:
+    """Compiles the files of a program together, for the optimizations that
+    need every class: inline and prune. Every file is compiled into memory
+    first. With inline, the VM code of each subroutine then goes through an
+    Inliner, and through the peephole, flow and locals optimizations again
+    if they are enabled. With prune, the subroutines that cannot be called
+    from Sys.init or Main.main, or by the OS, are left out. The rest is
+    written to the .vm file next to its source.
+
+    Args:
+        input_paths (typing.List[str]): the .jack files of the program.
+        inline_threshold (int): the most commands of an inlined body.
+        profile (Profile): the execution profile, for the Inliner too.
+        The other arguments are passed on to compile_file.
+
+    Returns:
+        CallGraph: the call graph of the program.
+    """
+    program = dict()
+    inliner = Inliner(inline_threshold, profile)
+    for input_path in input_paths:
+        with open(input_path, 'r') as input_file:
+            output_buffer = io.StringIO()
+            compile_file(input_file, output_buffer, streaming, token_buffer,
+                         mapped, cache, ast, optimizations, peephole, licm, intrinsics,
+                         program_classes, profile, instrument)
+        program[input_path] = list(subroutines(output_buffer.getvalue().splitlines(keepends=True)))
+        if 'inline' in optimizations:
+            for subroutine in program[input_path]:
+                inliner.add_subroutine(subroutine)
+
+    passes = []
+    if 'inline' in optimizations:
+        passes.append(inliner)
+        if 'peephole' in optimizations and peephole is not None:
+            passes.append(peephole)
+        if 'flow' in optimizations:
+            passes.append(FlowOptimizer())
+        if 'locals' in optimizations:
+            passes.append(LocalAllocator())
+    call_graph = CallGraph()
+    for class_subroutines in program.values():
+        for i, subroutine in enumerate(class_subroutines):
+            for optimizer in passes:
+                subroutine = optimizer.optimize(subroutine)
+            class_subroutines[i] = subroutine
+            call_graph.add_subroutine(subroutine)
+
+    reached = call_graph.reachable() if 'prune' in optimizations else call_graph.calls
+    for input_path, class_subroutines in program.items():
+        with open(os.path.splitext(input_path)[0] + ".vm", 'w') as output_file:
+            for subroutine in class_subroutines:
+                if subroutine[0].split()[1] in reached:
+                    output_file.write(''.join(subroutine))
+    return call_graph
 
 
 if "__main__" == __name__:
@@ -34,20 +232,113 @@ if "__main__" == __name__:
     # Both are closed automatically when the code finishes running.
     # If the output file does not exist, it is created automatically in the
     # correct path, using the correct filename.
-    if not len(sys.argv) == 2:
-        sys.exit("Invalid usage, please use: JackCompiler <input path>")
-    argument_path = os.path.abspath(sys.argv[1])
+    parser = argparse.ArgumentParser(prog="JackCompiler")
+    parser.add_argument("input_path")
+    parser.add_argument("--stream", action="store_true",
+                        help="read the input in chunks, so memory use is "
+                             "bounded by the largest subroutine")
+    parser.add_argument("--token-buffer", action="store_true",
+                        help="tokenize each file up front into a compact "
+                             "token buffer")
+    parser.add_argument("--mmap", action="store_true",
+                        help="memory-map each file instead of reading it, "
+                             "and only copy out the tokens that are used")
+    parser.add_argument("--ast", action="store_true",
+                        help="parse each class into a syntax tree and "
+                             "generate code from it in a separate pass")
+    parser.add_argument("-O", "--optimize", action="append", default=[],
+                        choices=optimization_names + ('all',),
+                        help="enable an optimization (implies --ast), may be "
+                             "given more than once")
+    parser.add_argument("--disable-rule", action="append", default=[],
+                        choices=tuple(peephole_rules), metavar="RULE",
+                        help="do not apply this peephole rule, may be given "
+                             "more than once (rules: %(choices)s)")
+    parser.add_argument("--peephole-report", action="store_true",
+                        help="print how often each peephole rule applied "
+                             "to stderr")
+    parser.add_argument("--disable-intrinsic", action="append", default=[],
+                        choices=intrinsic_names, metavar="NAME",
+                        help="call this OS subroutine instead of compiling "
+                             "it inline with -O intrinsics, may be given more "
+                             "than once (intrinsics: %(choices)s)")
+    parser.add_argument("--licm-report", action="store_true",
+                        help="print the expressions -O licm moves out of "
+                             "loops to stderr")
+    parser.add_argument("--inline-threshold", type=int,
+                        default=DEFAULT_INLINE_THRESHOLD,
+                        help="the most VM commands of a subroutine inlined "
+                             "by -O inline (default: %(default)s)")
+    parser.add_argument("--prune-report", action="store_true",
+                        help="print the subroutines -O prune leaves out to "
+                             "stderr")
+    parser.add_argument("--stack-report", action="store_true",
+                        help="print the most values each subroutine keeps "
+                             "on the stack at once to stderr")
+    parser.add_argument("--instrument", action="store_true",
+                        help="compile without optimizations and label every "
+                             "loop body, for a profile of the program run "
+                             "in VMEmulator.py (implies --ast)")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="optimize for the profile VMEmulator.py "
+                             "--profile wrote: inline more of the hot "
+                             "subroutines, and keep cold code compact")
+    parser.add_argument("--cache-dir",
+                        help="reuse the results of previous builds of "
+                             "unchanged files from this directory")
+    parser.add_argument("--cache-size", type=int,
+                        default=DEFAULT_CACHE_SIZE // (1024 * 1024),
+                        help="size bound of the cache directory, in MB "
+                             "(default: %(default)s)")
+    args = parser.parse_args()
+    optimizations = frozenset(optimization_names if 'all' in args.optimize else args.optimize)
+    peephole = PeepholeOptimizer(args.disable_rule)
+    licm = LoopInvariantMotion()
+    intrinsics = frozenset(intrinsic_names) - frozenset(args.disable_intrinsic)
+    if args.instrument:
+        # The labels are counted in the loops as written
+        optimizations = frozenset()
+    profile = Profile.load(args.profile) if args.profile else None
+    argument_path = os.path.abspath(args.input_path)
+    cache = None
+    if args.cache_dir:
+        cache = BuildCache(args.cache_dir, args.cache_size * 1024 * 1024)
     if os.path.isdir(argument_path):
         files_to_assemble = [
             os.path.join(argument_path, filename)
             for filename in os.listdir(argument_path)]
     else:
         files_to_assemble = [argument_path]
-    for input_path in files_to_assemble:
-        filename, extension = os.path.splitext(input_path)
-        if extension.lower() != ".jack":
-            continue
-        output_path = filename + ".vm"
-        with open(input_path, 'r') as input_file, \
-                open(output_path, 'w') as output_file:
-            compile_file(input_file, output_file)
+    files_to_assemble = [input_path for input_path in files_to_assemble
+                         if os.path.splitext(input_path)[1].lower() == ".jack"]
+    # Each class is in the file named after it
+    program_classes = frozenset(os.path.splitext(os.path.basename(input_path))[0]
+                                for input_path in files_to_assemble)
+    if 'inline' in optimizations or 'prune' in optimizations:
+        # These need the whole program
+        call_graph = compile_program(
+            files_to_assemble, args.stream, args.token_buffer, args.mmap,
+            cache, args.ast, optimizations, peephole, licm, intrinsics,
+            program_classes, args.inline_threshold, profile, args.instrument)
+        if args.prune_report and 'prune' in optimizations:
+            print(call_graph.report(call_graph.reachable()), file=sys.stderr)
+    else:
+        for input_path in files_to_assemble:
+            output_path = os.path.splitext(input_path)[0] + ".vm"
+            with open(input_path, 'r') as input_file, \
+                    open(output_path, 'w') as output_file:
+                compile_file(input_file, output_file, args.stream,
+                             args.token_buffer, args.mmap, cache, args.ast,
+                             optimizations, peephole, licm, intrinsics,
+                             program_classes, profile, args.instrument)
+    if args.stack_report:
+        stack_depth = StackDepth()
+        for input_path in files_to_assemble:
+            with open(os.path.splitext(input_path)[0] + ".vm", 'r') as output_file:
+                for subroutine in subroutines(output_file.readlines()):
+                    stack_depth.add_subroutine(subroutine)
+        print(stack_depth.report(), file=sys.stderr)
+    if args.licm_report:
+        print(licm.report(), file=sys.stderr)
+    if args.peephole_report:
+        print(peephole.report(), file=sys.stderr)
@@ -0,0 +1,284 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+
+from Constants import *
+from SyntaxTree import *
+from TokenReader import *
+
+binary_ops = frozenset(('+', '-', '*', '/', '=', '>', '<', '&', '|'))
+
+keyword_constants = frozenset(('true', 'false', 'null', 'this'))
+
+
+class JackParser(TokenReader):
+    """Parses the tokens of a JackTokenizer or TokenBuffer into a syntax tree
+    (see SyntaxTree), for the CodeGenerator to compile.
+
+    The current token is read with a TokenReader, as a type code, a value
+    and an offset. Statements and terms are dispatched through tables keyed
+    by keyword and by token type code, so each token is classified exactly
+    once, by the tokenizer.
+    """
+
+    def parse_class(self) -> typing.Optional[Class]:
+        """
+        Returns:
+            Class: the class the input holds, or None if the input does not
+            start with a class.
+        """
+        # 'class'
+        self.advance()
+        if self.type != KEYWORD_CODE or self.token != "class":
+            return None
+        self.advance()
+
+        # className '{'
+        name = self.expect_identifier()
+        self.expect('{')
+
+        # classVarDec*
+        class_var_decs = []
+        while self.type == KEYWORD_CODE and self.token in class_var_kinds:
+            class_var_decs.append(self.parse_var_dec())
+
+        # subroutineDec*
+        subroutines = []
+        while self.type == KEYWORD_CODE and self.token in subroutine_kinds:
+            subroutines.append(self.parse_subroutine())
+
+        # '}'
+        self.expect('}')
+
+        return Class(name, tuple(class_var_decs), tuple(subroutines))
+
+    def parse_var_dec(self) -> VarDec:
+        """Parses a class variable or a local variable declaration."""
+        # 'static' | 'field' | 'var'
+        kind = self.token
+        self.advance()
+
+        # type varName (',' varName)* ';'
+        _type = self.expect_type()
+        names = [self.expect_identifier()]
+        while self.token == ',' and self.type == SYMBOL_CODE:
+            self.advance()
+            names.append(self.expect_identifier())
+        self.expect(';')
+
+        return VarDec(kind, _type, tuple(names))
+
+    def parse_subroutine(self) -> Subroutine:
+        # 'constructor' | 'function' | 'method'
+        kind = self.token
+        self.advance()
+
+        # ('void' | type)
+        if self.type == KEYWORD_CODE and self.token == 'void':
+            return_type = self.token
+            self.advance()
+        else:
+            return_type = self.expect_type()
+
+        # subroutineName '(' parameterList ')'
+        name = self.expect_identifier()
+        self.expect('(')
+        parameters = []
+        if self.token != ')' or self.type != SYMBOL_CODE:
+            parameters.append((self.expect_type(), self.expect_identifier()))
+            while self.token == ',' and self.type == SYMBOL_CODE:
+                self.advance()
+                parameters.append((self.expect_type(), self.expect_identifier()))
+        self.expect(')')
+
+        # '{' varDec* statements '}'
+        self.expect('{')
+        var_decs = []
+        while self.type == KEYWORD_CODE and self.token == 'var':
+            var_decs.append(self.parse_var_dec())
+        statements = self.parse_statements()
+        self.expect('}')
+
+        return Subroutine(kind, return_type, name, tuple(parameters), tuple(var_decs), statements)
+
+    def parse_statements(self) -> typing.Tuple[Statement, ...]:
+        statement_parsers = self.statement_parsers
+        statements = []
+        while self.type == KEYWORD_CODE:
+            parse_statement = statement_parsers.get(self.token)
+            if parse_statement is None:
+                break
+            statements.append(parse_statement(self))
+        return tuple(statements)
+
+    def parse_block(self) -> typing.Tuple[Statement, ...]:
+        """'{' statements '}'"""
+        self.expect('{')
+        statements = self.parse_statements()
+        self.expect('}')
+        return statements
+
+    def parse_condition(self) -> Expression:
+        """'(' expression ')'"""
+        self.expect('(')
+        condition = self.parse_expression()
+        self.expect(')')
+        return condition
+
+    def parse_let(self) -> Let:
+        # 'let' varName
+        self.advance()
+        offset = self.offset
+        name = self.expect_identifier()
+
+        # ('[' expression ']')?
+        index = None
+        if self.token == '[' and self.type == SYMBOL_CODE:
+            self.advance()
+            index = self.parse_expression()
+            self.expect(']')
+
+        # '=' expression ';'
+        self.expect('=')
+        value = self.parse_expression()
+        self.expect(';')
+
+        return Let(name, index, value, offset)
+
+    def parse_if(self) -> If:
+        # 'if' '(' expression ')' '{' statements '}'
+        self.advance()
+        condition = self.parse_condition()
+        then = self.parse_block()
+
+        # ('else' '{' statements '}')?
+        otherwise = None
+        if self.type == KEYWORD_CODE and self.token == 'else':
+            self.advance()
+            otherwise = self.parse_block()
+
+        return If(condition, then, otherwise)
+
+    def parse_while(self) -> While:
+        # 'while' '(' expression ')' '{' statements '}'
+        self.advance()
+        condition = self.parse_condition()
+        return While(condition, self.parse_block())
+
+    def parse_do(self) -> Do:
+        # 'do' subroutineCall ';'
+        self.advance()
+        offset = self.offset
+        call = self.parse_call(self.expect_identifier(), offset)
+        self.expect(';')
+        return Do(call)
+
+    def parse_return(self) -> Return:
+        # 'return' expression? ';'
+        self.advance()
+        value = None
+        if self.token != ';' or self.type != SYMBOL_CODE:
+            value = self.parse_expression()
+        self.expect(';')
+        return Return(value)
+
+    def parse_call(self, first: str, offset: int) -> Call:
+        """Parses a subroutine call, after its first identifier."""
+        # ('.' subroutineName)?
+        target, name = None, first
+        if self.token == '.' and self.type == SYMBOL_CODE:
+            self.advance()
+            target, name = first, self.expect_identifier()
+
+        # '(' expressionList ')'
+        self.expect('(')
+        arguments = []
+        if self.token != ')' or self.type != SYMBOL_CODE:
+            arguments.append(self.parse_expression())
+            while self.token == ',' and self.type == SYMBOL_CODE:
+                self.advance()
+                arguments.append(self.parse_expression())
+        self.expect(')')
+
+        return Call(target, name, tuple(arguments), offset)
+
+    def parse_expression(self) -> Expression:
+        """term (op term)*"""
+        term_parsers = self.term_parsers
+        expression = term_parsers[self.type](self)
+        while self.type == SYMBOL_CODE and self.token in binary_ops:
+            op = self.token
+            self.advance()
+            expression = Binary(op, expression, term_parsers[self.type](self))
+        return expression
+
+    def parse_term(self) -> Expression:
+        return self.term_parsers[self.type](self)
+
+    def parse_keyword_term(self) -> KeywordConst:
+        if self.token not in keyword_constants:
+            raise self.error(f'Invalid Expression. curr_token: {self.token}')
+        term = KeywordConst(self.token)
+        self.advance()
+        return term
+
+    def parse_symbol_term(self) -> Expression:
+        op = self.token
+        # '(' expression ')'
+        if op == '(':
+            self.advance()
+            term = self.parse_expression()
+            self.expect(')')
+            return term
+        # unaryOp term
+        if op in unop_dict:
+            self.advance()
+            return Unary(op, self.term_parsers[self.type](self))
+        raise self.error(f'Invalid Expression. curr_token: {op}')
+
+    def parse_identifier_term(self) -> Expression:
+        # varName | varName '[' expression ']' | subroutineCall
+        name, offset = self.token, self.offset
+        self.advance()
+        next_symbol = self.token if self.type == SYMBOL_CODE else None
+
+        if next_symbol == '[':
+            self.advance()
+            index = self.parse_expression()
+            self.expect(']')
+            return Index(name, index, offset)
+        if next_symbol == '(' or next_symbol == '.':
+            return self.parse_call(name, offset)
+        return Var(name, offset)
+
+    def parse_int_term(self) -> IntConst:
+        term = IntConst(self.token)
+        self.advance()
+        return term
+
+    def parse_string_term(self) -> StringConst:
+        term = StringConst(self.token)
+        self.advance()
+        return term
+
+    def parse_missing_term(self) -> typing.NoReturn:
+        raise self.error('Invalid Expression')
+
+    # Dispatch tables, keyed by statement keyword and by token type code
+    statement_parsers = {"let": parse_let,
+                         "do": parse_do,
+                         "while": parse_while,
+                         "if": parse_if,
+                         "return": parse_return}
+
+    term_parsers = {KEYWORD_CODE: parse_keyword_term,
+                    SYMBOL_CODE: parse_symbol_term,
+                    IDENTIFIER_CODE: parse_identifier_term,
+                    INT_CONST_CODE: parse_int_term,
+                    STRING_CONST_CODE: parse_string_term,
+                    None: parse_missing_term}
@@ -5,8 +5,273 @@ was written by Aviv Yaish. It is an extension to the specifications given
 as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
+import collections
+import itertools
+import mmap
+import re
 import typing
 
+from Constants import *
+from LineIndex import LineIndex
+from TokenBuffer import TokenBuffer
+
+try:
+    import numpy
+except ImportError:  # The bulk scanner is optional
+    numpy = None
+
+KEYWORDS = frozenset(['class', 'constructor', 'function', 'method', 'field',
+                      'static', 'var', 'int', 'char', 'boolean', 'void', 'true',
+                      'false', 'null', 'this', 'let', 'do', 'if', 'else',
+                      'while', 'return'])
+
+# Number of characters read at a time in streaming mode
+STREAM_CHUNK_SIZE = 1 << 16
+
+# Inputs of at least this many characters are scanned with NumPy if available
+NUMPY_SCAN_THRESHOLD = 1 << 12
+
+# One alternative per lexical element. Whitespace and both comment formats are
+# matched by the same pattern as the tokens, so every character of the input is
+# looked at once, and an unterminated /* comment runs to the end of the input.
+# An unterminated string is an error that spans the rest of its line. Groups
+# are named after the token type they match.
+token_pattern = r'''
+      (?P<SKIP>\s+|//[^\n]*|/\*.*?(?:\*/|\Z))
+    | (?P<INT_CONST>\d+)
+    | (?P<STRING_CONST>"[^"\n]*")
+    | (?P<KEYWORD>(?:%s)(?!\w))
+    | (?P<IDENTIFIER>[^\W\d]\w*)
+    | (?P<SYMBOL>[{}()\[\].,;+\-*/&|<>=~^#])
+    | (?P<ERROR>"[^"\n]*|.)
+''' % '|'.join(sorted(KEYWORDS))
+token_regex = re.compile(token_pattern, re.DOTALL | re.VERBOSE)
+# The same pattern for memory-mapped (ASCII) sources
+token_regex_bytes = re.compile(token_pattern.encode(), re.DOTALL | re.VERBOSE)
+
+
+# (token type, token, offset in the source, length in the source). The token is
+# None for memory-mapped sources until someone asks for its value. Scanners
+# yield the token type ERROR for input that is not a token, and the tokenizer
+# reports it with its position.
+Token = typing.Tuple[str, typing.Union[str, int, None], int, int]
+
+
+def _scan_stream(input_stream: typing.TextIO, chunk_size: int,
+                 line_index: LineIndex) -> typing.Iterator[Token]:
+    """Lazily tokenizes the input stream while reading it chunk by chunk, so
+    only the current chunk and the token it ends in are held in memory.
+
+    Args:
+        input_stream (typing.TextIO): input stream.
+        chunk_size (int): the number of characters to read at a time.
+        line_index (LineIndex): records the lines of every chunk read.
+
+    Returns:
+        typing.Iterator: the tokens of the stream, without comments.
+    """
+    # base is the source offset of buffer[0]
+    buffer, position, base, eof = '', 0, 0, False
+    read = 0
+    while True:
+        match = token_regex.match(buffer, position)
+        # A match that reaches the end of the buffer may continue in the next
+        # chunk (e.g. an identifier, or '/' that turns out to open a comment)
+        if not eof and (match is None or match.end() == len(buffer)):
+            chunk = input_stream.read(chunk_size)
+            eof = not chunk
+            line_index.add(chunk, read)
+            read += len(chunk)
+            if match is not None and match.lastgroup == 'SKIP':
+                # Only keep what decides how the skipped text continues, so an
+                # arbitrarily long comment is never buffered
+                skipped = match.group()
+                if skipped.startswith('/*') and not (len(skipped) >= 4 and skipped.endswith('*/')):
+                    # The last character matters if it is the '*' of a '*/'
+                    skipped = '/*' + skipped[2:][-1:]
+                elif skipped.startswith('//'):
+                    skipped = '//'
+                else:
+                    skipped = ''
+                base += len(buffer) - len(skipped)
+                buffer = skipped + chunk
+            else:
+                base += position
+                buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        if match is None:
+            return
+        position = match.end()
+        yield from _classify(match, base)
+
+
+def _scan(text: str) -> typing.Iterator[Token]:
+    """Lazily splits the text into tokens in a single pass.
+
+    Args:
+        text (str): the Jack source code.
+
+    Returns:
+        typing.Iterator: the tokens of the text, without comments.
+    """
+    for match in token_regex.finditer(text):
+        yield from _classify(match, 0)
+
+
+def _classify(match: typing.Match, base: int) -> typing.Iterator[Token]:
+    """Turns a match of token_regex into a token, yielding nothing for
+    whitespace and comments. String constants lose their double quotes.
+    """
+    kind = match.lastgroup
+    if kind == 'SKIP':
+        return
+    token = match.group()
+    offset = base + match.start()
+    if kind == INT_CONST:
+        yield kind, int(token), offset, len(token)
+    elif kind == STRING_CONST:
+        yield kind, token[1:-1], offset, len(token)
+    else:
+        yield kind, token, offset, len(token)
+
+
+def _scan_mapped(source: mmap.mmap) -> typing.Iterator[Token]:
+    """Lazily splits a memory-mapped source into tokens in a single pass,
+    without copying it. Tokens are only spans, see _materialize.
+
+    Args:
+        source (mmap.mmap): the Jack source code.
+
+    Returns:
+        typing.Iterator: the tokens of the source, without comments.
+    """
+    for match in token_regex_bytes.finditer(source):
+        kind = match.lastgroup
+        if kind == 'SKIP':
+            continue
+        start = match.start()
+        yield kind, None, start, match.end() - start
+
+
+def _materialize(source: mmap.mmap, token_type: str, offset: int, length: int) -> typing.Union[str, int]:
+    """
+    Returns:
+        the value of the token spanning source[offset:offset + length].
+    """
+    if token_type == STRING_CONST:
+        return source[offset + 1:offset + length - 1].decode()
+    token = source[offset:offset + length]
+    if token_type == 'ERROR':
+        return token.decode(errors='replace')
+    return int(token) if token_type == INT_CONST else token.decode()
+
+
+if numpy is not None:
+    # Character classes of the bulk scanner
+    _SPACE, _LETTER, _DIGIT, _SYMBOL, _OTHER = range(5)
+    _char_classes = numpy.full(256, _OTHER, dtype=numpy.uint8)
+    # The ASCII characters Python's \s matches
+    _char_classes[[9, 10, 11, 12, 13, 28, 29, 30, 31, 32]] = _SPACE
+    _char_classes[[ord(c) for c in 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_']] = _LETTER
+    _char_classes[[ord(c) for c in '0123456789']] = _DIGIT
+    _char_classes[[ord(c) for c in '{}()[].,;+-*/&|<>=~^#']] = _SYMBOL
+
+
+def _scan_numpy(data: bytes) -> typing.Iterator[Token]:
+    """Splits an ASCII source into the same tokens as _scan, classifying all of
+    its characters at once with NumPy. Only the comment and string delimiters
+    are visited one by one, since whether they count depends on what precedes
+    them.
+
+    Args:
+        data (bytes): the Jack source code.
+
+    Returns:
+        typing.Iterator: the tokens of the source, without comments.
+    """
+    chars = numpy.frombuffer(data, dtype=numpy.uint8)
+    size = len(chars)
+    slash, star = chars == ord('/'), chars == ord('*')
+    comment_starts = numpy.flatnonzero(slash[:-1] & star[1:])
+    line_comment_starts = numpy.flatnonzero(slash[:-1] & slash[1:])
+    comment_ends = numpy.flatnonzero(star[:-1] & slash[1:])
+    quotes = numpy.flatnonzero(chars == ord('"'))
+    newlines = numpy.flatnonzero(chars == ord('\n'))
+
+    # Walks the delimiters in source order, skipping those inside a comment or
+    # string that was already opened
+    openers = numpy.concatenate((comment_starts, line_comment_starts, quotes))
+    opener_kinds = numpy.repeat(numpy.arange(3, dtype=numpy.uint8),
+                                (len(comment_starts), len(line_comment_starts), len(quotes)))
+    order = numpy.argsort(openers, kind='stable')
+    skipped_starts, skipped_ends = [], []
+    # Closed strings, and unterminated ones which are errors
+    string_starts, string_ends, error_starts, error_ends = [], [], [], []
+    position = 0
+    for start, kind in zip(openers[order].tolist(), opener_kinds[order].tolist()):
+        if start < position:
+            continue
+        if kind == 0:
+            # The '*' of the opening '/*' cannot be part of the closing '*/'
+            index = numpy.searchsorted(comment_ends, start + 2)
+            position = int(comment_ends[index]) + 2 if index < len(comment_ends) else size
+        elif kind == 1:
+            index = numpy.searchsorted(newlines, start)
+            position = int(newlines[index]) if index < len(newlines) else size
+        else:
+            index = numpy.searchsorted(quotes, start + 1)
+            line_end = numpy.searchsorted(newlines, start)
+            line_end = int(newlines[line_end]) if line_end < len(newlines) else size
+            if index < len(quotes) and quotes[index] < line_end:
+                position = int(quotes[index]) + 1
+                string_starts.append(start)
+                string_ends.append(position)
+            else:
+                position = line_end
+                error_starts.append(start)
+                error_ends.append(position)
+        skipped_starts.append(start)
+        skipped_ends.append(position)
+
+    classes = _char_classes[chars]
+    depth = numpy.zeros(size + 1, dtype=numpy.int32)
+    numpy.add.at(depth, skipped_starts, 1)
+    numpy.add.at(depth, skipped_ends, -1)
+    classes[numpy.cumsum(depth[:size]) > 0] = _SPACE
+
+    is_word = (classes == _LETTER) | (classes == _DIGIT)
+    word_edges = numpy.diff(is_word.astype(numpy.int8), prepend=0, append=0)
+    word_starts = numpy.flatnonzero(word_edges == 1)
+    word_ends = numpy.flatnonzero(word_edges == -1)
+    symbols = numpy.flatnonzero(classes == _SYMBOL)
+    others = numpy.flatnonzero(classes == _OTHER)
+
+    # Kinds: 0 word, 1 symbol, 2 string, 3 error
+    offsets = numpy.concatenate((word_starts, symbols, string_starts, others, error_starts)).astype(numpy.intp)
+    ends = numpy.concatenate((word_ends, symbols + 1, string_ends, others + 1, error_ends)).astype(numpy.intp)
+    kinds = numpy.repeat(numpy.arange(4, dtype=numpy.uint8),
+                         (len(word_starts), len(symbols), len(string_starts), len(others) + len(error_starts)))
+    order = numpy.argsort(offsets, kind='stable')
+
+    for offset, end, kind in zip(offsets[order].tolist(), ends[order].tolist(), kinds[order].tolist()):
+        token = data[offset:end].decode()
+        if kind == 0:
+            if token[0].isdigit():
+                # A number directly followed by a word, e.g. '12ab', is two tokens
+                digits = len(token) - len(token.lstrip('0123456789'))
+                yield INT_CONST, int(token[:digits]), offset, digits
+                offset, token = offset + digits, token[digits:]
+                if not token:
+                    continue
+            yield (KEYWORD if token in KEYWORDS else IDENTIFIER), token, offset, len(token)
+        elif kind == 1:
+            yield SYMBOL, token, offset, 1
+        elif kind == 2:
+            yield STRING_CONST, token[1:-1], offset, len(token)
+        else:
+            yield 'ERROR', token, offset, len(token)
+
 
 class JackTokenizer:
     """Removes all comments from the input stream and breaks it
@@ -92,64 +357,63 @@ class JackTokenizer:
     Note that ^, # correspond to shiftleft and shiftright, respectively.
     """
 
-    def __init__(self, input_stream: typing.TextIO) -> None:
+    def __init__(self, input_stream: typing.TextIO, streaming: bool = False,
+                 mapped: bool = False) -> None:
         """Opens the input stream and gets ready to tokenize it.
 
         Args:
             input_stream (typing.TextIO): input stream.
+            streaming (bool): read the input in chunks of STREAM_CHUNK_SIZE
+            characters instead of all at once.
+            mapped (bool): memory-map the input file instead of reading it.
+            Tokens are then spans of the mapping, and only become strings when
+            their value is asked for. Offsets are in bytes. The mapping stays
+            open until close(), so the tokenizer should be used in a with
+            statement.
         """
-        # Your code goes here!
-        # A good place to start is to read all the lines of the input:
-        full_input = input_stream.read()
-
-        # Removes multi-lines comments from the code
-        i = 1
-        # Cannot use a for loop because len(full_input) isn't constant
-        while i < len(full_input):
-            if full_input[i - 1] == '/' and full_input[i] == '*':
-                found = False
-                for j in range(i, len(full_input)):
-                    if full_input[j - 1] == '*' and full_input[j] == '/':
-                        full_input = full_input[:i - 1] + full_input[j + 1:]
-                        i -= 1
-                        found = True
-                        break
-                if not found:
-                    full_input = full_input[:i - 1]
-                    break
-            i += 1
-
-        input_lines = full_input.splitlines()
-        self.words = []
-        self.i = -1
-        # Splits the code to words (texts separated by whitespace)
-        for line in input_lines:
-            in_string = False  # Keeps track of whether we are in a string
-            # Removes single-line comments from the code
-            for i in range(len(line) - 1):
-                if line[i] == '"':
-                    in_string = not in_string
-                if line[i] == '/' and line[i + 1] == '/' and not in_string:
-                    line = line[:i]
-                    break
-            if not line == '':
-                self.words.append(line)
-
-        # Remove whitespaces for the end of the code
-        has_code = False
-        for i in range(len(self.words)-1, -1, -1):
-            line = self.words[-1]
-            for j in range(len(line) - 1, -1, -1):
-                if not (line[j] == ' ' or line[j] == '\t'):
-                    has_code = True
-                    line = line[:j+1]
-                    self.words = self.words[:i+1]
-                    break
-            if has_code:
-                break
+        self._source = None
+        if mapped:
+            try:
+                self._source = mmap.mmap(input_stream.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty files cannot be mapped
+                self._source = b''
+            self._tokens = _scan_mapped(self._source)
+            self.line_index = LineIndex(self._source)
+        elif streaming:
+            self.line_index = LineIndex()
+            self._tokens = _scan_stream(input_stream, STREAM_CHUNK_SIZE, self.line_index)
+        else:
+            text = input_stream.read()
+            self.line_index = LineIndex(text)
+            if numpy is not None and len(text) >= NUMPY_SCAN_THRESHOLD and text.isascii():
+                self._tokens = _scan_numpy(text.encode())
+            else:
+                self._tokens = _scan(text)
 
         self.current_token = None
-        self.word_index = 0
+        self._current_type = None
+        self._current_offset = None
+        self._current_length = None
+        # The scan is lazy, so tokens that were peeked at wait here
+        self._lookahead = collections.deque()
+
+    def __enter__(self) -> "JackTokenizer":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Unmaps the input, if it is mapped. The values of tokens that were
+        not asked for yet cannot be asked for afterwards, but positions can.
+        """
+        if isinstance(self._source, mmap.mmap):
+            # The line index reads the mapping the first time it is used
+            self.line_index.position(0)
+            # The scan holds on to the mapping until it is closed too
+            self._tokens.close()
+            self._source.close()
 
     def has_more_tokens(self) -> bool:
         """Do we have more tokens in the input?
@@ -157,17 +421,75 @@ class JackTokenizer:
         Returns:
             bool: True if there are more tokens, False otherwise.
         """
-        # We are not done with the current words
-        if self.current_token and self.word_index + 1 < len(self.words[self.i]):
-            return True
+        return self._fill(1)
+
+    def _fill(self, count: int) -> bool:
+        """Scans until count tokens are waiting, if the input has that many."""
+        while len(self._lookahead) < count:
+            token = self._next_token()
+            if token is None:
+                return False
+            self._lookahead.append(token)
+        return True
 
-        # We have more words
-        if self.i + 1 < len(self.words):
-            return True
+    def _next_token(self) -> typing.Optional[Token]:
+        """
+        Returns:
+            the next scanned token, or None at the end of the input.
+        """
+        token = next(self._tokens, None)
+        if token is not None and token[0] == 'ERROR':
+            token_type, value, offset, length = token
+            if value is None:
+                value = _materialize(self._source, token_type, offset, length)
+            line, column = self.line_index.position(offset)
+            raise Exception(f"line {line}, column {column}: Unexpected token: {value!r}")
+        return token
+
+    def peek(self, k: int = 1) -> typing.Tuple[typing.Optional[str], typing.Union[str, int, None]]:
+        """
+        Args:
+            k (int): how many tokens past the current token to look.
 
-        # We are at the end of the last word
-        return False
-        pass
+        Returns:
+            tuple: the type and value of the k-th next token, without making it
+            the current token, or (None, None) if the input ends before it.
+        """
+        if not self._fill(k):
+            return None, None
+        token_type, token, offset, length = self._lookahead[k - 1]
+        if token is None:
+            token = _materialize(self._source, token_type, offset, length)
+        return token_type, token
+
+    def token_buffer(self) -> "TokenBuffer":
+        """
+        Returns:
+            TokenBuffer: the rest of the input, tokenized up front into a
+            compact buffer with the same interface as this tokenizer.
+        """
+        remaining = list(self._lookahead)
+        self._lookahead.clear()
+        tokens = itertools.chain(remaining, iter(self._next_token, None))
+        if self._source is not None:
+            tokens = ((token_type, _materialize(self._source, token_type, offset, length), offset, length)
+                      for token_type, _, offset, length in tokens)
+        return TokenBuffer(tokens, self.line_index)
+
+    def coded_tokens(self) -> typing.Iterator[typing.Tuple[int, typing.Union[str, int], int]]:
+        """
+        Returns:
+            typing.Iterator: the rest of the input as (token type code, token,
+            offset) triples, scanned lazily. The tokenizer itself should not
+            be advanced afterwards.
+        """
+        remaining = list(self._lookahead)
+        self._lookahead.clear()
+        tokens = itertools.chain(remaining, iter(self._next_token, None))
+        if self._source is not None:
+            return ((token_type_codes[token_type], _materialize(self._source, token_type, offset, length), offset)
+                    for token_type, _, offset, length in tokens)
+        return ((token_type_codes[token_type], token, offset) for token_type, token, offset, _ in tokens)
 
     def advance(self) -> bool:
         """Gets the next token from the input and makes it the current token.
@@ -177,90 +499,30 @@ class JackTokenizer:
         Returns:
             bool: True if there are more tokens, False otherwise.
         """
-        if not self.has_more_tokens():
+        if not self._fill(1):
             return False
 
-        # # We are not done with the current words
-        # if self.current_token and self.word_index + 1 < len(self.words[self.i]):
-        #     self.word_index += 1
-
-        # We are not done with the current words
-        if self.word_index + 1 < len(self.words[self.i]):
-            self.word_index += 1
-
-        # We have more words
-        else:
-            self.i += 1
-            self.word_index = 0
-
-        # Continue until passed all whitespaces
-        while self.words[self.i][self.word_index] == ' ' or self.words[self.i][self.word_index] == '\t':
-            self.word_index += 1
-            if self.word_index == len(self.words[self.i]):
-                self.i += 1
-                self.word_index = 0
-
-        if self.words[self.i][self.word_index] == '_' or self.words[self.i][self.word_index].isalpha():
-            start = self.word_index
-            # Increase the index in the word until the end of the word
-            while self.word_index < len(self.words[self.i]) and (self.words[self.i][self.word_index].isalnum() or
-                                                                 self.words[self.i][self.word_index] == '_'):
-                self.word_index += 1
-            self.current_token = self.words[self.i][start:self.word_index]
-            self.word_index -= 1
-
-        elif self.words[self.i][self.word_index].isnumeric():
-            start = self.word_index
-            # Increase the index in the word until the end of the number
-            while self.word_index < len(self.words[self.i]) and self.words[self.i][self.word_index].isnumeric():
-                self.word_index += 1
-            self.current_token = int(self.words[self.i][start:self.word_index])
-            self.word_index -= 1
-
-        elif self.words[self.i][self.word_index] == '"':
-            start = self.word_index
-            self.word_index += 1
-            # Check if it is an empty string
-            if self.word_index == len(self.words[self.i]) or self.words[self.i][self.word_index] == '"':
-                self.current_token = '""'
-            else:
-                # Increase the index in the word until the end of the string
-                while self.word_index + 1 < len(self.words[self.i]) and not self.words[self.i][self.word_index] == '"':
-                    self.word_index += 1
-                self.current_token = self.words[self.i][start:self.word_index + 1]
-
-        elif self.words[self.i][self.word_index] \
-                in ['{', '}', '(', ')', '[', ']', '.', ',', ';', '+', '-', '*', '/', '&', '|', '<', '>', '=', '~', '^',
-                    '#']:
-            self.current_token = self.words[self.i][self.word_index]
-
+        self._current_type, self.current_token, self._current_offset, self._current_length = \
+            self._lookahead.popleft()
         return True
 
+    def _value(self) -> typing.Union[str, int]:
+        """
+        Returns:
+            the current token, materialized from the mapped source if needed.
+        """
+        if self.current_token is None:
+            self.current_token = _materialize(self._source, self._current_type,
+                                              self._current_offset, self._current_length)
+        return self.current_token
+
     def token_type(self) -> str:
         """
         Returns:
             str: the type of the current token, can be
             "KEYWORD", "SYMBOL", "IDENTIFIER", "INT_CONST", "STRING_CONST"
         """
-        if type(self.current_token) is int:
-            return "INT_CONST"
-
-        if self.current_token[0] == '"':
-            return "STRING_CONST"
-
-        if self.current_token \
-                in ['{', '}', '(', ')', '[', ']', '.', ',', ';', '+', '-', '*', '/', '&', '|', '<', '>', '=', '~', '^',
-                    '#']:
-            return "SYMBOL"
-
-        if self.current_token \
-                in ['class', 'constructor', 'function', 'method', 'field',
-                    'static', 'var', 'int', 'char', 'boolean', 'void', 'true',
-                    'false', 'null', 'this', 'let', 'do', 'if', 'else',
-                    'while', 'return']:
-            return "KEYWORD"
-
-        return "IDENTIFIER"
+        return self._current_type
 
     def keyword(self) -> str:
         """
@@ -271,7 +533,7 @@ class JackTokenizer:
             "BOOLEAN", "CHAR", "VOID", "VAR", "STATIC", "FIELD", "LET", "DO",
             "IF", "ELSE", "WHILE", "RETURN", "TRUE", "FALSE", "NULL", "THIS"
         """
-        return self.current_token
+        return self._value()
 
     def symbol(self) -> str:
         """
@@ -282,7 +544,7 @@ class JackTokenizer:
             symbol: '{' | '}' | '(' | ')' | '[' | ']' | '.' | ',' | ';' | '+' |
               '-' | '*' | '/' | '&' | '|' | '<' | '>' | '=' | '~' | '^' | '#'
         """
-        return self.current_token
+        return self._value()
 
     def identifier(self) -> str:
         """
@@ -294,7 +556,7 @@ class JackTokenizer:
                   starting with a digit. You can assume keywords cannot be
                   identifiers, so 'self' cannot be an identifier, etc'.
         """
-        return self.current_token
+        return self._value()
 
     def int_val(self) -> int:
         """
@@ -304,7 +566,7 @@ class JackTokenizer:
             Recall that integerConstant was defined in the grammar like so:
             integerConstant: A decimal number in the range 0-32767.
         """
-        return self.current_token
+        return self._value()
 
     def string_val(self) -> str:
         """
@@ -315,7 +577,21 @@ class JackTokenizer:
             StringConstant: '"' A sequence of Unicode characters not including
                       double quote or newline '"'
         """
-        return self.current_token[1:-1]
+        return self._value()
+
+    def offset(self) -> int:
+        """
+        Returns:
+            int: the offset of the current token in the input.
+        """
+        return self._current_offset
+
+    def position(self) -> typing.Tuple[int, int]:
+        """
+        Returns:
+            tuple: the line and column of the current token, starting from 1.
+        """
+        return self.line_index.position(self._current_offset)
 
 
 if __name__ == '__main__':
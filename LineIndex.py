@@ -0,0 +1,56 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import bisect
+import typing
+from array import array
+
+
+class LineIndex:
+    """Turns source offsets into (line, column) positions. Only the offset at
+    which every line starts is stored, in a packed array that is searched with
+    bisect, so tokens only need to carry their offset.
+    """
+
+    def __init__(self, source: typing.Union[str, bytes, None] = None) -> None:
+        """Creates an index of the given source. The source is only scanned
+        for line starts the first time a position is asked for.
+
+        Args:
+            source (str | bytes | None): the whole source, or None if it will
+            be given piece by piece to add().
+        """
+        self._source = source
+        self._line_starts = array('I', [0])
+
+    def add(self, text: typing.Union[str, bytes], base: int) -> None:
+        """Records the lines that start in a piece of the source.
+
+        Args:
+            text (str | bytes): the piece of the source.
+            base (int): the offset of the piece in the source.
+        """
+        newline = '\n' if isinstance(text, str) else b'\n'
+        find, append = text.find, self._line_starts.append
+        index = find(newline)
+        while index != -1:
+            append(base + index + 1)
+            index = find(newline, index + 1)
+
+    def position(self, offset: int) -> typing.Tuple[int, int]:
+        """
+        Args:
+            offset (int): an offset in the source.
+
+        Returns:
+            tuple: the line and column of the offset, both starting from 1.
+        """
+        if self._source is not None:
+            self.add(self._source, 0)
+            self._source = None
+        line = bisect.bisect_right(self._line_starts, offset)
+        return line, offset - self._line_starts[line - 1] + 1
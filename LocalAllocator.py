@@ -0,0 +1,149 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+
+from Constants import *
+from FlowOptimizer import Block, basic_blocks, jump_target, label_of
+
+_local_commands = (f"push {LOCAL} ", f"pop {LOCAL} ")
+
+
+class LocalAllocator:
+    """Shrinks the frame of a subroutine, on its VM code. The function
+    command pushes a zero for every local variable on every call, so:
+    - a store to a local variable that is not read before it is stored
+      again or the subroutine returns is dropped, with the push before it,
+      or popped into temp 0 if the value comes from further back;
+    - local variables that are never live at the same time share a slot of
+      the local segment, and the function command only makes the slots
+      that are used.
+
+    Liveness is computed over the basic blocks of the code, so it also
+    applies to the local variables added by the Inliner and LICM. Every slot
+    still starts at zero, so two variables whose first reads come before
+    any store may share a slot: both read zero there, and the slot is only
+    shared if neither is stored while the other is live.
+    """
+
+    def __init__(self) -> None:
+        # Local slots and dead stores removed so far
+        self.removed_slots = 0
+        self.removed_stores = 0
+
+    def optimize(self, commands: typing.List[str]) -> typing.List[str]:
+        """
+        Args:
+            commands (typing.List[str]): lines of VM code of a subroutine.
+
+        Returns:
+            typing.List[str]: the lines, with the local variables reallocated.
+        """
+        _function, name, n_locals = commands[0].split()
+        if n_locals == '0':
+            return commands
+        blocks = basic_blocks(commands)
+        live_out = self._live_out(blocks)
+
+        # Local -> bit mask of the locals it may not share a slot with
+        conflicts = [0] * int(n_locals)
+        used = 0
+        dead = set()
+        for block, live in zip(blocks, live_out):
+            for i in reversed(range(len(block))):
+                line = block[i]
+                if line.startswith(_local_commands):
+                    operation, _segment, index = line.split()
+                    bit = 1 << int(index)
+                    if operation == 'push':
+                        live |= bit
+                        used |= bit
+                    elif live & bit:
+                        conflicts[int(index)] |= live & ~bit
+                        live &= ~bit
+                        used |= bit
+                    else:
+                        dead.add((id(block), i))
+
+        # Greedy coloring, in order of the original slots
+        slots = dict()
+        for local in range(int(n_locals)):
+            if not used >> local & 1:
+                continue
+            taken = {slots[other] for other in slots if conflicts[local] >> other & 1 or
+                     conflicts[other] >> local & 1}
+            slot = 0
+            while slot in taken:
+                slot += 1
+            slots[local] = slot
+        n_slots = max(slots.values(), default=-1) + 1
+        self.removed_slots += int(n_locals) - n_slots
+        self.removed_stores += len(dead)
+
+        output = [f"function {name} {n_slots}\n"]
+        for block in blocks:
+            start = len(output)
+            for i, line in enumerate(block):
+                if line.startswith('function '):
+                    continue
+                if line.startswith(_local_commands):
+                    operation, _segment, index = line.split()
+                    if (id(block), i) in dead:
+                        if len(output) > start and output[-1].startswith('push '):
+                            output.pop()
+                        else:
+                            output.append(f"pop {TEMP} 0\n")
+                        continue
+                    line = f"{operation} {LOCAL} {slots[int(index)]}\n"
+                output.append(line)
+        return output
+
+    @staticmethod
+    def _live_out(blocks: typing.List[Block]) -> typing.List[int]:
+        """
+        Returns:
+            list: for each block, the bit mask of the local variables that
+            may be read after it before they are stored.
+        """
+        index = {label_of(block): i for i, block in enumerate(blocks)}
+        successors = []
+        uses = []
+        stores = []
+        for i, block in enumerate(blocks):
+            last = block[-1]
+            following = [] if last.startswith(('goto ', 'return')) or i + 1 == len(blocks) else [i + 1]
+            target = jump_target(last)
+            if target is not None:
+                following.append(index[target])
+            successors.append(following)
+            use = store = 0
+            for line in block:
+                if line.startswith(_local_commands):
+                    operation, _segment, local = line.split()
+                    bit = 1 << int(local)
+                    if operation == 'push':
+                        use |= bit & ~store
+                    else:
+                        store |= bit
+            uses.append(use)
+            stores.append(store)
+
+        live_in = [0] * len(blocks)
+        live_out = [0] * len(blocks)
+        changed = True
+        while changed:
+            changed = False
+            for i in reversed(range(len(blocks))):
+                out = 0
+                for successor in successors[i]:
+                    out |= live_in[successor]
+                live_out[i] = out
+                new_in = uses[i] | out & ~stores[i]
+                if new_in != live_in[i]:
+                    live_in[i] = new_in
+                    changed = True
+        return live_out
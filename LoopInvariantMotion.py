@@ -0,0 +1,217 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+
+from SyntaxTree import *
+
+# The expressions worth keeping in a local variable, rather than evaluating
+# again: a variable or a constant costs a single push either way
+_hoisted_kinds = (Unary, Binary, Index, StringConst)
+
+
+def expression_text(expression: Expression) -> str:
+    """
+    Returns:
+        str: the expression as Jack source, with every binary operation in
+        parentheses.
+    """
+    kind = type(expression)
+    if kind is IntConst or kind is KeywordConst:
+        return str(expression.value)
+    if kind is StringConst:
+        return f'"{expression.value}"'
+    if kind is Var:
+        return expression.name
+    if kind is Index:
+        return f"{expression.name}[{expression_text(expression.index)}]"
+    if kind is Unary:
+        # Shifts, from StrengthReducer, have no Jack syntax
+        op = {'^': '<<', '#': '>>'}.get(expression.op, expression.op)
+        return f"{op}{expression_text(expression.operand)}"
+    if kind is Binary:
+        return f"({expression_text(expression.left)} {expression.op} {expression_text(expression.right)})"
+    if kind is Call:
+        target = '' if expression.target is None else expression.target + '.'
+        arguments = ', '.join(expression_text(argument) for argument in expression.arguments)
+        return f"{target}{expression.name}({arguments})"
+    return repr(expression)
+
+
+class _LoopEffects(NodeTransformer):
+    """What the statements of a loop may change."""
+
+    def __init__(self) -> None:
+        # Variables assigned by let statements
+        self.assigned = set()
+        # Whether an array element is stored
+        self.stores = False
+        # Whether a subroutine is called, which may change fields, statics
+        # and memory
+        self.calls = False
+
+    def visit_Let(self, node: Let) -> Let:
+        if node.index is None:
+            self.assigned.add(node.name)
+        else:
+            self.stores = True
+        return self.generic_visit(node)
+
+    def visit_Call(self, node: Call) -> Call:
+        self.calls = True
+        return self.generic_visit(node)
+
+
+class _Hoister(NodeTransformer):
+    """Replaces the largest loop-invariant expressions of a loop with local
+    variables, which the LoopInvariantMotion assigns before the loop."""
+
+    def __init__(self, motion: "LoopInvariantMotion", effects: _LoopEffects) -> None:
+        self.motion = motion
+        self.effects = effects
+        # Expression key -> the local variable holding it
+        self.temps = dict()
+        # The let statements that compute the local variables
+        self.lets = []
+
+    def key(self, expression: Expression) -> typing.Optional[tuple]:
+        """
+        Returns:
+            tuple: a key that is equal for expressions that compute the same
+            value, or None if the expression is not loop-invariant.
+        """
+        kind = type(expression)
+        if kind is IntConst or kind is KeywordConst:
+            return 'const', expression.value
+        if kind is StringConst:
+            return 'string', expression.value
+        if kind is Var:
+            return ('var', expression.name) if self.invariant(expression.name) else None
+        if kind is Index:
+            if self.effects.calls or self.effects.stores or not self.invariant(expression.name):
+                return None
+            index = self.key(expression.index)
+            return None if index is None else ('index', expression.name, index)
+        if kind is Unary:
+            operand = self.key(expression.operand)
+            return None if operand is None else (expression.op, operand)
+        if kind is Binary and expression.op != '/':
+            # Math.divide is not moved, as it fails on a zero divisor the
+            # loop may be guarding against
+            left = self.key(expression.left)
+            right = self.key(expression.right)
+            return None if left is None or right is None else (expression.op, left, right)
+        return None
+
+    def invariant(self, name: str) -> bool:
+        if name in self.effects.assigned:
+            return False
+        # Fields and statics may also be changed by a called subroutine, and
+        # through an array that aliases them
+        return name in self.motion.locals or not (self.effects.calls or self.effects.stores)
+
+    def visit(self, node: Node) -> typing.Any:
+        if isinstance(node, _hoisted_kinds):
+            key = self.key(node)
+            if key is not None and _reads_operand(key):
+                temp = self.temps.get(key)
+                if temp is None:
+                    temp = self.temps[key] = self.motion.new_local()
+                    self.lets.append(Let(temp, None, node, None))
+                    self.motion.hoisted.append((self.motion.subroutine_name, expression_text(node)))
+                return Var(temp, None)
+        return super().visit(node)
+
+
+def _reads_operand(key: tuple) -> bool:
+    """Whether the expression of a key is more than a constant, which is
+    cheaper to push than a local variable."""
+    if key[0] == 'const':
+        return False
+    if key[0] in ('var', 'string', 'index'):
+        return True
+    return any(_reads_operand(part) for part in key[1:])
+
+
+class LoopInvariantMotion(NodeTransformer):
+    """Moves loop-invariant expressions out of while loops: each is computed
+    once before the loop into a new local variable, which the loop reads
+    instead.
+
+    An expression is loop-invariant if it calls no subroutine, divides by
+    nothing, and reads only:
+    - local variables and arguments the loop does not assign;
+    - fields and statics the loop does not assign, if the loop calls no
+      subroutine and stores no array element;
+    - array elements, under the same conditions;
+    - constants, including string literals.
+    The largest invariant expressions are moved, and equal ones share a
+    local variable. Outer loops are done first, so an expression that is
+    invariant in nested loops moves out of all of them.
+
+    Moved expressions are evaluated even when the loop runs no iterations,
+    and string literals are built once instead of on every iteration, so, as
+    with the strings optimization, a loop that modifies or disposes of a
+    literal sees the change in later iterations.
+
+    Loops in cold_loops, which a profile shows never ran, are left as they
+    are, apart from what moves out of the loops around them.
+
+    The same LoopInvariantMotion can be used for every class, and keeps a
+    record of what it moved, for report().
+    """
+
+    def __init__(self) -> None:
+        # (subroutine, expression) for every expression moved
+        self.hoisted = []
+        self.class_name = ''
+        self.subroutine_name = ''
+        # The local variables and arguments of the current subroutine
+        self.locals = set()
+        self.new_locals = []
+        self.cold_loops = frozenset()
+
+    def new_local(self) -> str:
+        # Not a Jack identifier, so it cannot clash with one
+        name = f"licm${len(self.new_locals)}"
+        self.new_locals.append(name)
+        self.locals.add(name)
+        return name
+
+    def visit_Class(self, node: Class) -> Class:
+        self.class_name = node.name
+        return self.generic_visit(node)
+
+    def visit_Subroutine(self, node: Subroutine) -> Subroutine:
+        self.subroutine_name = f"{self.class_name}.{node.name}"
+        self.locals = {name for _type, name in node.parameters}
+        self.locals.update(name for var_dec in node.var_decs for name in var_dec.names)
+        self.new_locals = []
+        node.statements = self.visit_sequence(node.statements)
+        if self.new_locals:
+            node.var_decs += (VarDec('var', 'int', tuple(self.new_locals)),)
+        return node
+
+    def visit_While(self, node: While) -> typing.Union[While, typing.Tuple[Statement, ...]]:
+        if node in self.cold_loops:
+            node.body = self.visit_sequence(node.body)
+            return node
+        effects = _LoopEffects()
+        effects.visit(node)
+        hoister = _Hoister(self, effects)
+        node = hoister.visit(node)
+        node.body = self.visit_sequence(node.body)
+        return (*hoister.lets, node)
+
+    def report(self) -> str:
+        """
+        Returns:
+            str: the expressions moved out of loops, by subroutine.
+        """
+        lines = [f"{name:40}{expression}" for name, expression in self.hoisted]
+        lines.append(f"hoisted {len(self.hoisted)} expressions out of loops")
+        return '\n'.join(lines)
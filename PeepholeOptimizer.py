@@ -0,0 +1,163 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import collections
+import typing
+
+from Constants import *
+
+# A VM command as the list of its words, e.g. ['push', 'local', '0']
+Command = typing.List[str]
+
+
+def _push_pop(window: typing.List[Command]) -> typing.Optional[typing.List[Command]]:
+    # push S i; pop S i stores a value where it already is
+    push, pop = window
+    if push[0] == 'push' and pop[0] == 'pop' and push[1:] == pop[1:]:
+        return []
+    return None
+
+
+def _double_not(window: typing.List[Command]) -> typing.Optional[typing.List[Command]]:
+    if window[0] == window[1] == ['not']:
+        return []
+    return None
+
+
+def _double_neg(window: typing.List[Command]) -> typing.Optional[typing.List[Command]]:
+    if window[0] == window[1] == ['neg']:
+        return []
+    return None
+
+
+def _identity_op(window: typing.List[Command]) -> typing.Optional[typing.List[Command]]:
+    # x + 0, x - 0 and x | 0 are x
+    push, op = window
+    if push == ['push', CONST, '0'] and op[0] in ('add', 'sub', 'or'):
+        return []
+    return None
+
+
+def _never_branch(window: typing.List[Command]) -> typing.Optional[typing.List[Command]]:
+    push, branch = window
+    if push == ['push', CONST, '0'] and branch[0] == 'if-goto':
+        return []
+    return None
+
+
+def _always_branch(window: typing.List[Command]) -> typing.Optional[typing.List[Command]]:
+    # push constant 0; not is true
+    push, negate, branch = window
+    if push == ['push', CONST, '0'] and negate == ['not'] and branch[0] == 'if-goto':
+        return [['goto', branch[1]]]
+    return None
+
+
+def _goto_next(window: typing.List[Command]) -> typing.Optional[typing.List[Command]]:
+    goto, label = window
+    if goto[0] == 'goto' and label[0] == 'label' and goto[1] == label[1]:
+        return [label]
+    return None
+
+
+def _array_store(window: typing.List[Command]) -> typing.Optional[typing.List[Command]]:
+    # let a[i] = v saves v in temp 0 while it moves the address to pointer 1.
+    # When v is a single push that does not read through pointer 1, the
+    # address can be moved first and v pushed straight into that 0.
+    value, save, address, restore, store = window
+    if value[0] == 'push' and value[1] != THAT and value[1:] != [POINTER, '1'] \
+            and save == ['pop', TEMP, '0'] and address == ['pop', POINTER, '1'] \
+            and restore == ['push', TEMP, '0'] and store == ['pop', THAT, '0']:
+        return [address, value, store]
+    return None
+
+
+# name -> (commands the window ends with, window size, rule). A rule gets
+# the last commands written and returns what to replace them with, or None
+# if it does not apply.
+peephole_rules = {'push-pop': (('pop',), 2, _push_pop),
+                  'double-not': (('not',), 2, _double_not),
+                  'double-neg': (('neg',), 2, _double_neg),
+                  'identity-op': (('add', 'sub', 'or'), 2, _identity_op),
+                  'never-branch': (('if-goto',), 2, _never_branch),
+                  'always-branch': (('if-goto',), 3, _always_branch),
+                  'goto-next': (('label',), 2, _goto_next),
+                  'array-store': (('pop',), 5, _array_store)}
+
+
+class PeepholeOptimizer:
+    """Rewrites short sequences of VM commands into cheaper equivalents.
+
+    The commands of a subroutine are written one at a time to an output
+    list, and after each one the rules are tried on the window of commands
+    at its end until none applies, so a rewrite can enable another (not;
+    not before an if-goto leaves a push constant 0 that never branches).
+    Commands are matched within a window only, and labels are commands, so
+    no rule moves code across a jump target.
+
+    Each rule can be disabled by name and counts its hits and the commands
+    it removed, across every subroutine the optimizer sees.
+    """
+
+    def __init__(self, disabled: typing.Iterable[str] = ()) -> None:
+        """
+        Args:
+            disabled (typing.Iterable[str]): names of rules not to apply.
+        """
+        self.disabled = frozenset(disabled)
+        unknown = self.disabled - peephole_rules.keys()
+        if unknown:
+            raise Exception(f"Unknown peephole rules: {', '.join(sorted(unknown))}")
+        # The rules to try after each command, by the command
+        self._rules = collections.defaultdict(list)
+        for name, (commands, size, rule) in peephole_rules.items():
+            if name not in self.disabled:
+                for command in commands:
+                    self._rules[command].append((name, size, rule))
+        self.hits = collections.Counter()
+        self.removed = collections.Counter()
+
+    def optimize(self, commands: typing.List[str]) -> typing.List[str]:
+        """
+        Args:
+            commands (typing.List[str]): lines of VM code.
+
+        Returns:
+            typing.List[str]: the optimized lines.
+        """
+        output = []
+        for line in commands:
+            output.append(line.split())
+            self._rewrite(output)
+        return [' '.join(command) + '\n' for command in output]
+
+    def _rewrite(self, output: typing.List[Command]) -> None:
+        rules = self._rules
+        while output and output[-1][0] in rules:
+            for name, size, rule in rules[output[-1][0]]:
+                if len(output) < size:
+                    continue
+                replacement = rule(output[-size:])
+                if replacement is not None:
+                    output[-size:] = replacement
+                    self.hits[name] += 1
+                    self.removed[name] += size - len(replacement)
+                    break
+            else:
+                return
+
+    def report(self) -> str:
+        """
+        Returns:
+            str: the hits and removed commands of each rule.
+        """
+        lines = [f"{'rule':16}{'hits':>8}{'removed':>10}"]
+        for name in peephole_rules:
+            state = ' (disabled)' if name in self.disabled else ''
+            lines.append(f"{name:16}{self.hits[name]:>8}{self.removed[name]:>10}{state}")
+        lines.append(f"{'total':16}{sum(self.hits.values()):>8}{sum(self.removed.values()):>10}")
+        return '\n'.join(lines)
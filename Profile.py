@@ -0,0 +1,95 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import hashlib
+import typing
+
+# A subroutine is hot if at least this share of all calls go to it
+HOT_CALL_SHARE = 0.01
+
+
+def loop_label(number: int) -> str:
+    """
+    Returns:
+        str: the label an instrumented build puts at the start of the body of
+        the while loop with the given number, counting the loops of a
+        subroutine in source order from 0.
+    """
+    return f"PROFILE_LOOP_{number}"
+
+
+class Profile:
+    """The execution counts of a run of a program, as VMEmulator --profile
+    writes them: how often each subroutine was called, and how often each
+    label was passed, one per line:
+
+        function Main.main 1
+        label Main.main PROFILE_LOOP_0 100
+
+    A build made with JackCompiler --instrument has a label at the start of
+    every loop body, so the label counts are loop iterations. Subroutines
+    that are not in the profile are neither hot nor cold.
+    """
+
+    def __init__(self) -> None:
+        # Subroutine -> calls
+        self.calls = dict()
+        # (subroutine, label) -> times passed
+        self.labels = dict()
+
+    @staticmethod
+    def load(path: str) -> "Profile":
+        profile = Profile()
+        with open(path, 'r') as profile_file:
+            for line_number, line in enumerate(profile_file, 1):
+                words = line.split()
+                if not words or words[0].startswith('#'):
+                    continue
+                if words[0] == 'function' and len(words) == 3:
+                    profile.calls[words[1]] = int(words[2])
+                elif words[0] == 'label' and len(words) == 4:
+                    profile.labels[(words[1], words[2])] = int(words[3])
+                else:
+                    raise Exception(f"{path}, line {line_number}: not a profile entry: {line.strip()}")
+        return profile
+
+    def save(self, path: str) -> None:
+        with open(path, 'w') as profile_file:
+            for name, count in sorted(self.calls.items()):
+                profile_file.write(f"function {name} {count}\n")
+            for (name, label), count in sorted(self.labels.items()):
+                profile_file.write(f"label {name} {label} {count}\n")
+
+    def key(self) -> str:
+        """
+        Returns:
+            str: a digest of the counts, for build cache keys.
+        """
+        digest = hashlib.sha256()
+        for name, count in sorted(self.calls.items()):
+            digest.update(f"{name} {count}\n".encode())
+        for (name, label), count in sorted(self.labels.items()):
+            digest.update(f"{name} {label} {count}\n".encode())
+        return digest.hexdigest()[:16]
+
+    def is_hot(self, subroutine: str) -> bool:
+        count = self.calls.get(subroutine, 0)
+        return count > 1 and count >= HOT_CALL_SHARE * sum(self.calls.values())
+
+    def is_cold(self, subroutine: str) -> bool:
+        """Whether the subroutine is in the profile and was never called."""
+        return self.calls.get(subroutine) == 0
+
+    def loop_iterations(self, subroutine: str, number: int) -> typing.Optional[int]:
+        """
+        Returns:
+            int: how often the body of a loop of the subroutine ran, or None
+            if the subroutine is not in the profile.
+        """
+        if subroutine not in self.calls:
+            return None
+        return self.labels.get((subroutine, loop_label(number)), 0)
@@ -0,0 +1,105 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import typing
+
+from Constants import optimization_names
+from VMEmulator import DEFAULT_MAX_STEPS, VMEmulator
+
+# The JackCompiler arguments of every build that is checked. The first,
+# without optimizations, is the one the others must agree with.
+builds = ((),) + tuple(('-O', name) for name in optimization_names) + \
+         (('-O', 'all'), ('--instrument',), ('-O', 'intrinsics', '--stack-report'))
+
+COMPILER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "JackCompiler.py")
+
+# How the output of a build the compiler failed on starts
+COMPILE_ERROR = "compile error: "
+
+
+def programs(path: str) -> typing.List[str]:
+    """
+    Returns:
+        list: the path if it is a directory of .jack files, or else the
+        directories of .jack files in it.
+    """
+    def has_jack(directory: str) -> bool:
+        return any(os.path.splitext(name)[1].lower() == ".jack" for name in os.listdir(directory))
+
+    if has_jack(path):
+        return [path]
+    return sorted(os.path.join(path, name) for name in os.listdir(path)
+                  if os.path.isdir(os.path.join(path, name)) and has_jack(os.path.join(path, name)))
+
+
+def run_build(program: str, arguments: typing.Sequence[str], work: str, max_steps: int) -> str:
+    """Compiles a copy of the program with the arguments and runs it in the
+    VMEmulator.
+
+    Returns:
+        str: what the program printed, and whether it halted or the error
+        it stopped with, or the error the compiler failed with.
+    """
+    if os.path.exists(work):
+        shutil.rmtree(work)
+    os.makedirs(work)
+    for name in os.listdir(program):
+        if os.path.splitext(name)[1].lower() == ".jack":
+            shutil.copy(os.path.join(program, name), work)
+    result = subprocess.run([sys.executable, COMPILER, *arguments, work], capture_output=True, text=True)
+    if result.returncode:
+        lines = result.stderr.strip().splitlines()
+        return f"{COMPILE_ERROR}{lines[-1] if lines else result.returncode}"
+    output = io.StringIO()
+    emulator = VMEmulator(sorted(os.path.join(work, name) for name in os.listdir(work) if name.endswith(".vm")),
+                          output, io.StringIO())
+    try:
+        halted = emulator.run(max_steps)
+    except Exception as error:
+        # Such as Sys.error, which the other builds must stop with too
+        return output.getvalue() + f"\n(runtime error: {error})"
+    return output.getvalue() + ("" if halted else f"\n(stopped after {max_steps} VM commands)")
+
+
+if "__main__" == __name__:
+    # Compiles every program with each of the builds, and checks that every
+    # build prints the same as the first
+    parser = argparse.ArgumentParser(prog="RegressionCheck")
+    parser.add_argument("input_paths", nargs='*', default=["Regression"],
+                        help="a directory of .jack files, or a directory of "
+                             "such directories (default: %(default)s)")
+    parser.add_argument("--max-steps", type=int, default=DEFAULT_MAX_STEPS,
+                        help="stop each run after this many VM commands "
+                             "(default: %(default)s)")
+    args = parser.parse_args()
+    failures = 0
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for input_path in args.input_paths:
+            for program in programs(os.path.abspath(input_path)):
+                work = os.path.join(temp_dir, os.path.basename(program))
+                expected = run_build(program, builds[0], work, args.max_steps)
+                if expected.startswith(COMPILE_ERROR):
+                    # Nothing to compare the other builds with
+                    failures += 1
+                    print(f"{os.path.relpath(program):40}FAILED: {expected}")
+                    continue
+                failed = []
+                for arguments in builds[1:]:
+                    if run_build(program, arguments, work, args.max_steps) != expected:
+                        failed.append(' '.join(arguments))
+                failures += len(failed)
+                status = "OK" if not failed else "FAILED: " + ", ".join(failed)
+                print(f"{os.path.relpath(program):40}{status}")
+    print(f"{failures} builds fail or differ from the build without optimizations")
+    sys.exit(1 if failures else 0)
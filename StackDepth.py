@@ -0,0 +1,62 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+
+from ThreeAddressCode import ThreeAddressCode
+
+
+class StackDepth:
+    """The most values each subroutine keeps on the stack at once, above its
+    frame and not counting the frames of the subroutines it calls, read off
+    its VM code through its ThreeAddressCode. Together with the call chain,
+    this bounds how much of the Hack stack, RAM 256-2047, a program needs.
+
+    Code that cannot be reached, which flow has not dropped, is not
+    measured. The depth of a subroutine whose VM code has no IR, such as
+    code from another compiler that leaves the stack uneven, is unknown,
+    and the report says so rather than failing the build.
+    """
+
+    def __init__(self) -> None:
+        # Subroutine -> its stack depth, or None if it is unknown
+        self.depths = dict()
+
+    def add_subroutine(self, commands: typing.List[str]) -> None:
+        """
+        Args:
+            commands (typing.List[str]): lines of VM code of the subroutine,
+            from its function command on.
+        """
+        try:
+            code = ThreeAddressCode.from_vm(commands)
+        except Exception:
+            self.depths[commands[0].split()[1]] = None
+            return
+        deepest = 0
+        for block in code.blocks:
+            # Values passed from the block before are still on the stack
+            depth = len(block.params)
+            deepest = max(deepest, depth)
+            for instruction in block.instructions:
+                depth -= len(instruction.operands)
+                if instruction.dest is not None:
+                    depth += 1
+                    deepest = max(deepest, depth)
+        self.depths[code.name] = deepest
+
+    def report(self) -> str:
+        """
+        Returns:
+            str: the stack depth of every subroutine, deepest first.
+        """
+        known = {name: depth for name, depth in self.depths.items() if depth is not None}
+        lines = [f"{name:40}{depth}" for name, depth in
+                 sorted(known.items(), key=lambda item: (-item[1], item[0]))]
+        lines.extend(f"{name:40}unknown" for name in sorted(self.depths) if name not in known)
+        lines.append(f"deepest stack of a subroutine: {max(known.values(), default=0)}")
+        return '\n'.join(lines)
@@ -0,0 +1,138 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+
+from ConstantFolder import constant_value
+from SyntaxTree import *
+
+# The most additions and subtractions a multiplication is lowered to
+MAX_MULTIPLY_TERMS = 3
+
+# Operands that can be evaluated twice at no cost and with no side effects
+pure_operands = (Var, IntConst, KeywordConst)
+
+
+def _binary_digits(value: int) -> typing.List[typing.Tuple[int, int]]:
+    """
+    Returns:
+        list: the (position, 1) pairs of the set bits of a 16-bit word.
+    """
+    return [(position, 1) for position in range(16) if value >> position & 1]
+
+
+def _signed_digits(value: int) -> typing.List[typing.Tuple[int, int]]:
+    """
+    Returns:
+        list: the (position, +-1) digits of the non-adjacent form of a 16-bit
+        word, which has the fewest non-zero digits. Digits past bit 15 vanish
+        modulo 2^16.
+    """
+    digits = []
+    position = 0
+    while value:
+        if value & 1:
+            digit = 2 - (value & 3)
+            value -= digit
+            if position < 16:
+                digits.append((position, digit))
+        value >>= 1
+        position += 1
+    return digits
+
+
+def _cost(digits: typing.List[typing.Tuple[int, int]]) -> int:
+    """VM instructions of the shift-add sequence: a push and an add per digit
+    and a shift per position, plus a neg if the leading digit is negative.
+    """
+    return 2 * len(digits) - 1 + digits[-1][0] + (digits[-1][1] < 0)
+
+
+def _shift(expression: Expression, count: int) -> Expression:
+    for _ in range(count):
+        expression = Unary('^', expression)
+    return expression
+
+
+def multiply(operand: Expression, factor: int) -> typing.Optional[Expression]:
+    """
+    Returns:
+        Expression: operand * factor as shifts, additions and subtractions,
+        evaluated Horner style from the top digit down, or None if that would
+        not pay off.
+    """
+    factor &= 0xFFFF
+    if factor == 0:
+        return IntConst(0) if isinstance(operand, pure_operands) else None
+    digits = min(_binary_digits(factor), _signed_digits(factor), key=_cost)
+    # Anything but a single shifted copy reads the operand more than once
+    if len(digits) > (MAX_MULTIPLY_TERMS if isinstance(operand, pure_operands) else 1):
+        return None
+
+    position, digit = digits.pop()
+    result = operand if digit > 0 else Unary('-', operand)
+    for next_position, digit in reversed(digits):
+        result = Binary('+' if digit > 0 else '-', _shift(result, position - next_position), operand)
+        position = next_position
+    return _shift(result, position)
+
+
+def divide(dividend: Expression, divisor: int) -> typing.Optional[Expression]:
+    """
+    Returns:
+        Expression: dividend / divisor with shiftright, rounding towards zero
+        like Math.divide, or None if the divisor is not a power of two.
+
+    shiftright floors, so a negative dividend is first biased by
+    divisor - 1, which needs the dividend twice. That is only done when the
+    dividend is a pure operand.
+    """
+    magnitude = abs(divisor)
+    if magnitude == 1:
+        return dividend if divisor > 0 else Unary('-', dividend)
+    if magnitude & (magnitude - 1) or magnitude > 16384 or not isinstance(dividend, pure_operands):
+        return None
+
+    if magnitude == 2:
+        # x < 0 is -1 exactly for negative x
+        biased = Binary('-', dividend, Binary('<', dividend, IntConst(0)))
+    else:
+        biased = Binary('+', dividend, Binary('&', Binary('<', dividend, IntConst(0)), IntConst(magnitude - 1)))
+    result = biased
+    for _ in range(magnitude.bit_length() - 1):
+        result = Unary('#', result)
+    return result if divisor > 0 else Unary('-', result)
+
+
+class StrengthReducer(NodeTransformer):
+    """Lowers multiplications and divisions by constants, which would call
+    the Math.multiply and Math.divide loops, to shiftleft, shiftright, add
+    and sub. A power of two becomes shifts of the other operand. Other
+    factors become at most MAX_MULTIPLY_TERMS shifted copies, added or
+    subtracted, when the other operand is a variable or constant that can be
+    read more than once.
+
+    Division rounds towards zero, as Math.divide does, so for negative
+    dividends x / 2^k is computed as (x + ((x < 0) & (2^k - 1))) >> k. This
+    agrees with Math.divide on every dividend but -32768, where Math.divide
+    overflows its abs() and the shift gives the exact quotient.
+    """
+
+    def visit_Binary(self, node: Binary) -> Expression:
+        self.generic_visit(node)
+        if node.op == '*':
+            right = constant_value(node.right)
+            if right is not None:
+                return multiply(node.left, right) or node
+            left = constant_value(node.left)
+            if left is not None:
+                return multiply(node.right, left) or node
+        elif node.op == '/':
+            right = constant_value(node.right)
+            if right is not None and right != 0:
+                return divide(node.left, right) or node
+        return node
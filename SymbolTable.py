@@ -33,8 +33,6 @@ class SymbolTable:
         """Starts a new subroutine scope (i.e., resets the subroutine's 
         symbol table).
         """
-        self.print()
-
         self._subroutine_table = dict()
         self._indices[VAR] = 0
         self._indices[ARG] = 0
@@ -116,7 +114,17 @@ class SymbolTable:
         elif name in self._class_table.keys():
             return self._class_table
         else:
-            Exception(f'Tried referencing a variable the doesn\'t exist: {name}')
+            raise Exception(f'Tried referencing a variable the doesn\'t exist: {name}')
+
+    # added
+    def entry_of(self, name):
+        """Returns the (type, kind, index) of the named identifier in the
+        current scope, or None if it is unknown, in a single lookup per scope.
+        """
+        entry = self._subroutine_table.get(name)
+        if entry is None:
+            entry = self._class_table.get(name)
+        return entry
 
     # added
     def is_symbol(self, name):
@@ -0,0 +1,266 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+
+
+class Node:
+    """Base of the syntax tree nodes built by JackParser. Nodes only declare
+    __slots__, so they carry no per-instance dict, and child sequences are
+    tuples. Nodes that name a variable or subroutine keep the source offset
+    of the name, for diagnostics.
+    """
+    __slots__ = ()
+
+    def __repr__(self) -> str:
+        fields = ', '.join(repr(getattr(self, name)) for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class Class(Node):
+    """class name '{' class_var_decs subroutines '}'"""
+    __slots__ = ('name', 'class_var_decs', 'subroutines')
+
+    def __init__(self, name, class_var_decs, subroutines) -> None:
+        self.name = name
+        self.class_var_decs = class_var_decs
+        self.subroutines = subroutines
+
+
+class VarDec(Node):
+    """kind type names ';', where kind is 'static', 'field' or 'var'"""
+    __slots__ = ('kind', 'type', 'names')
+
+    def __init__(self, kind, type, names) -> None:
+        self.kind = kind
+        self.type = type
+        self.names = names
+
+
+class Subroutine(Node):
+    """kind return_type name '(' parameters ')' '{' var_decs statements '}'
+
+    parameters is a tuple of (type, name) pairs.
+    """
+    __slots__ = ('kind', 'return_type', 'name', 'parameters', 'var_decs', 'statements')
+
+    def __init__(self, kind, return_type, name, parameters, var_decs, statements) -> None:
+        self.kind = kind
+        self.return_type = return_type
+        self.name = name
+        self.parameters = parameters
+        self.var_decs = var_decs
+        self.statements = statements
+
+
+# Statements
+
+class Let(Node):
+    """'let' name ('[' index ']')? '=' value ';'"""
+    __slots__ = ('name', 'index', 'value', 'offset')
+
+    def __init__(self, name, index, value, offset) -> None:
+        self.name = name
+        self.index = index
+        self.value = value
+        self.offset = offset
+
+
+class If(Node):
+    """'if' '(' condition ')' '{' then '}' ('else' '{' otherwise '}')?
+
+    otherwise is None when there is no else clause.
+    """
+    __slots__ = ('condition', 'then', 'otherwise')
+
+    def __init__(self, condition, then, otherwise) -> None:
+        self.condition = condition
+        self.then = then
+        self.otherwise = otherwise
+
+
+class While(Node):
+    """'while' '(' condition ')' '{' body '}'"""
+    __slots__ = ('condition', 'body')
+
+    def __init__(self, condition, body) -> None:
+        self.condition = condition
+        self.body = body
+
+
+class Do(Node):
+    """'do' call ';'"""
+    __slots__ = ('call',)
+
+    def __init__(self, call) -> None:
+        self.call = call
+
+
+class Return(Node):
+    """'return' value? ';', where value is None when omitted."""
+    __slots__ = ('value',)
+
+    def __init__(self, value) -> None:
+        self.value = value
+
+
+# Expressions
+
+class IntConst(Node):
+    __slots__ = ('value',)
+
+    def __init__(self, value) -> None:
+        self.value = value
+
+
+class StringConst(Node):
+    __slots__ = ('value',)
+
+    def __init__(self, value) -> None:
+        self.value = value
+
+
+class KeywordConst(Node):
+    """'true', 'false', 'null' or 'this'"""
+    __slots__ = ('value',)
+
+    def __init__(self, value) -> None:
+        self.value = value
+
+
+class Var(Node):
+    __slots__ = ('name', 'offset')
+
+    def __init__(self, name, offset) -> None:
+        self.name = name
+        self.offset = offset
+
+
+class Index(Node):
+    """name '[' index ']'"""
+    __slots__ = ('name', 'index', 'offset')
+
+    def __init__(self, name, index, offset) -> None:
+        self.name = name
+        self.index = index
+        self.offset = offset
+
+
+class Call(Node):
+    """(target '.')? name '(' arguments ')'
+
+    target is None for a call of a subroutine of the current class.
+    """
+    __slots__ = ('target', 'name', 'arguments', 'offset')
+
+    def __init__(self, target, name, arguments, offset) -> None:
+        self.target = target
+        self.name = name
+        self.arguments = arguments
+        self.offset = offset
+
+
+class Unary(Node):
+    __slots__ = ('op', 'operand')
+
+    def __init__(self, op, operand) -> None:
+        self.op = op
+        self.operand = operand
+
+
+class Binary(Node):
+    """Jack has no operator precedence, so 'a op b op c' is parsed as
+    Binary(op, Binary(op, a, b), c).
+    """
+    __slots__ = ('op', 'left', 'right')
+
+    def __init__(self, op, left, right) -> None:
+        self.op = op
+        self.left = left
+        self.right = right
+
+
+# Nodes of lowered trees, which optimizations make and JackParser does not
+
+class Store(Node):
+    """Stores value at the memory address, as 'let' name '[' index ']' does
+    at name + index.
+    """
+    __slots__ = ('address', 'value')
+
+    def __init__(self, address, value) -> None:
+        self.address = address
+        self.value = value
+
+
+class Load(Node):
+    """The word at the memory address, as name '[' index ']' is the word at
+    name + index.
+    """
+    __slots__ = ('address',)
+
+    def __init__(self, address) -> None:
+        self.address = address
+
+
+class Save(Node):
+    """An expression whose value is also kept in temp slot for Reuse nodes
+    evaluated after it. slot is None while nothing reuses the value.
+    """
+    __slots__ = ('value', 'slot')
+
+    def __init__(self, value, slot=None) -> None:
+        self.value = value
+        self.slot = slot
+
+
+class Reuse(Node):
+    """The value kept by a Save node, evaluated before."""
+    __slots__ = ('save',)
+
+    def __init__(self, save) -> None:
+        self.save = save
+
+
+class NodeTransformer:
+    """Walks a syntax tree and rewrites it in place, in the manner of
+    ast.NodeTransformer: visit() calls the visit_<node class> method of the
+    node if there is one, and generic_visit() otherwise, which visits the
+    children in evaluation order. A visit returns the node to put in place
+    of the visited one. Within a tuple of statements it may also return a
+    tuple of nodes to splice in, or None to drop the statement.
+    """
+
+    def visit(self, node: Node) -> typing.Any:
+        return getattr(self, 'visit_' + type(node).__name__, self.generic_visit)(node)
+
+    def generic_visit(self, node: Node) -> Node:
+        for name in node.__slots__:
+            value = getattr(node, name)
+            if isinstance(value, Node):
+                setattr(node, name, self.visit(value))
+            elif isinstance(value, tuple):
+                setattr(node, name, self.visit_sequence(value))
+        return node
+
+    def visit_sequence(self, values: tuple) -> tuple:
+        result = []
+        for value in values:
+            if isinstance(value, Node):
+                value = self.visit(value)
+                if value is None:
+                    continue
+                if isinstance(value, tuple):
+                    result.extend(value)
+                    continue
+            result.append(value)
+        return tuple(result)
+
+
+Statement = typing.Union[Let, If, While, Do, Return, Store]
+Expression = typing.Union[IntConst, StringConst, KeywordConst, Var, Index, Call, Unary, Binary,
+                          Load, Save, Reuse]
@@ -0,0 +1,532 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import os
+import sys
+import time
+import typing
+
+from ConstantFolder import binary_op_funcs, unary_op_funcs
+from Constants import *
+from FlowOptimizer import basic_blocks, jump_target, label_of
+from Inliner import subroutines
+
+# VM arithmetic command -> its function on Hack words
+_binary_commands = {command: binary_op_funcs[op] for op, command in biop_dict.items()}
+_unary_commands = {command: unary_op_funcs[op] for op, command in unop_dict.items()}
+
+# The instructions that end a block, and only those. end marks where the
+# code of a subroutine ends without a return, after code that cannot run.
+_terminators = frozenset(('goto', 'if-goto', 'return', 'end'))
+
+
+class Instruction:
+    """dest = op operands, where dest and operands are temporaries and
+    attributes hold the rest of the VM command: (segment, index) for push
+    and pop, (name,) for call, and the labels jumped to for goto and if-goto.
+    """
+    __slots__ = ('op', 'dest', 'operands', 'attributes')
+
+    def __init__(self, op: str, dest: typing.Optional[int], operands: typing.Tuple[int, ...],
+                 attributes: tuple = ()) -> None:
+        self.op = op
+        self.dest = dest
+        self.operands = operands
+        self.attributes = attributes
+
+    def __str__(self) -> str:
+        operands = ', '.join(f"%{operand}" for operand in self.operands)
+        op = self.op
+        if op == 'push':
+            return f"%{self.dest} = {self.attributes[0]} {self.attributes[1]}"
+        if op == 'pop':
+            return f"{self.attributes[0]} {self.attributes[1]} = {operands}"
+        if op == 'call':
+            return f"%{self.dest} = call {self.attributes[0]}({operands})"
+        if op == 'goto':
+            return f"goto {self.attributes[0]}({operands})"
+        if op == 'if-goto':
+            arguments = ', '.join(f"%{operand}" for operand in self.operands[:-1])
+            return (f"if %{self.operands[-1]} goto {self.attributes[0]}({arguments}) "
+                    f"else {self.attributes[1]}({arguments})")
+        if op == 'return' or op == 'end':
+            return f"{op} {operands}".rstrip()
+        return f"%{self.dest} = {op} {operands}"
+
+
+class IRBlock:
+    """A basic block: its params are the temporaries its predecessors pass
+    it, and its last instruction, and only that one, is a terminator.
+    Blocks that had no label in the VM code are named IR.<n>.
+    """
+    __slots__ = ('name', 'labelled', 'params', 'instructions')
+
+    def __init__(self, name: str, labelled: bool, params: typing.List[int],
+                 instructions: typing.List[Instruction]) -> None:
+        self.name = name
+        self.labelled = labelled
+        self.params = params
+        self.instructions = instructions
+
+    def successors(self) -> typing.Tuple[str, ...]:
+        last = self.instructions[-1]
+        return last.attributes if last.op in ('goto', 'if-goto') else ()
+
+
+class ThreeAddressCode:
+    """The code of a subroutine as three-address instructions on virtual
+    temporaries, in basic blocks with explicit control flow, for passes that
+    would be awkward to write against stack code.
+
+    Every temporary is defined once, by an instruction or as a block param,
+    and only used in its block: values that the VM code keeps on the stack
+    from one block to the next, as the intrinsics do, are passed as
+    arguments by the jump and become params of the block jumped to. Every
+    block ends in a goto, an if-goto, which names the block it falls through
+    to, or a return, except the last, which may end in an end instead.
+
+    from_vm() builds the IR from the VM code of a subroutine and lower()
+    turns it back into VM code. Blocks that cannot be reached are left out
+    of the IR. A temporary used once, where it is on top of the stack, stays
+    on the stack, so the IR of VM code lowers to the same code, less those
+    blocks. Other temporaries are kept in local variables added after the
+    subroutine's own, for LocalAllocator to pack.
+    """
+
+    def __init__(self, name: str, n_locals: int, blocks: typing.List[IRBlock], n_temps: int) -> None:
+        self.name = name
+        self.n_locals = n_locals
+        self.blocks = blocks
+        self.n_temps = n_temps
+
+    def new_temp(self) -> int:
+        self.n_temps += 1
+        return self.n_temps - 1
+
+    @staticmethod
+    def from_vm(commands: typing.List[str]) -> "ThreeAddressCode":
+        """
+        Args:
+            commands (typing.List[str]): lines of VM code of a subroutine.
+
+        Returns:
+            ThreeAddressCode: the IR of the subroutine.
+        """
+        _function, name, n_locals = commands[0].split()
+        vm_blocks = basic_blocks(commands)
+        names = [label_of(block) or f"IR.{i}" for i, block in enumerate(vm_blocks)]
+        index = {block_name: i for i, block_name in enumerate(names)}
+        heights = _stack_heights(name, vm_blocks, names, index)
+
+        code = ThreeAddressCode(name, int(n_locals), [], 0)
+        for i, block in enumerate(vm_blocks):
+            if heights[i] is None:
+                # Unreachable, and its stack height unknown: the intrinsics
+                # end in a label that expects a value on the stack
+                continue
+            params = [code.new_temp() for _ in range(heights[i])]
+            stack = list(params)
+            instructions = []
+
+            def operands(count: int) -> typing.Tuple[int, ...]:
+                if count > len(stack):
+                    raise Exception(f"{name}, {names[i]}: stack underflow")
+                taken = tuple(stack[len(stack) - count:])
+                del stack[len(stack) - count:]
+                return taken
+
+            for line in block:
+                words = line.split()
+                op = words[0]
+                if op == 'function' or op == 'label':
+                    continue
+                if op == 'push':
+                    dest = code.new_temp()
+                    instructions.append(Instruction(op, dest, (), (words[1], int(words[2]))))
+                    stack.append(dest)
+                elif op == 'pop':
+                    instructions.append(Instruction(op, None, operands(1), (words[1], int(words[2]))))
+                elif op in _binary_commands or op in _unary_commands:
+                    arguments = operands(2 if op in _binary_commands else 1)
+                    dest = code.new_temp()
+                    instructions.append(Instruction(op, dest, arguments))
+                    stack.append(dest)
+                elif op == 'call':
+                    arguments = operands(int(words[2]))
+                    dest = code.new_temp()
+                    instructions.append(Instruction(op, dest, arguments, (words[1],)))
+                    stack.append(dest)
+                elif op == 'goto':
+                    instructions.append(Instruction(op, None, operands(len(stack)), (words[1],)))
+                elif op == 'if-goto':
+                    condition = operands(1)
+                    if i + 1 == len(vm_blocks):
+                        raise Exception(f"{name}: runs off the end")
+                    instructions.append(Instruction(op, None, operands(len(stack)) + condition,
+                                                    (words[1], names[i + 1])))
+                elif op == 'return':
+                    # Anything under the value is dropped with the frame
+                    instructions.append(Instruction(op, None, operands(1)))
+                else:
+                    raise Exception(f"{name}: unknown VM command {line.strip()}")
+            if not instructions or instructions[-1].op not in _terminators:
+                if i + 1 == len(vm_blocks):
+                    instructions.append(Instruction('end', None, operands(len(stack))))
+                else:
+                    instructions.append(Instruction('goto', None, operands(len(stack)), (names[i + 1],)))
+            code.blocks.append(IRBlock(names[i], label_of(block) is not None, params, instructions))
+        return code
+
+    def verify(self) -> None:
+        """Raises an exception naming the first block that breaks the rules
+        of the IR, if any does."""
+        index = {block.name: block for block in self.blocks}
+        if len(index) != len(self.blocks):
+            raise Exception(f"{self.name}: two blocks have the same name")
+        if not self.blocks or self.blocks[0].params:
+            raise Exception(f"{self.name}: the first block must exist and take no params")
+        defined = set()
+        for block in self.blocks:
+            where = f"{self.name}, {block.name}"
+            if not block.instructions or block.instructions[-1].op not in _terminators:
+                raise Exception(f"{where}: does not end in a goto, if-goto, return or end")
+            available = set()
+            for temp in block.params:
+                if temp in defined:
+                    raise Exception(f"{where}: %{temp} is defined twice")
+                defined.add(temp)
+                available.add(temp)
+            for instruction in block.instructions:
+                op = instruction.op
+                if op in _terminators and instruction is not block.instructions[-1]:
+                    raise Exception(f"{where}: {instruction} is not at the end of the block")
+                if op == 'end' and block is not self.blocks[-1]:
+                    raise Exception(f"{where}: only the last block may end in end")
+                for operand in instruction.operands:
+                    if operand not in available:
+                        raise Exception(f"{where}: {instruction} uses %{operand} outside its block "
+                                        f"or before it is defined")
+                expected = _arity(instruction, index)
+                if expected is None:
+                    raise Exception(f"{where}: {instruction} is not a known instruction")
+                if len(instruction.operands) != expected:
+                    raise Exception(f"{where}: {instruction} takes {expected} operands")
+                if (instruction.dest is None) != (op in _terminators or op == 'pop'):
+                    raise Exception(f"{where}: {instruction} must "
+                                    f"{'not ' if instruction.dest is not None else ''}define a temporary")
+                if instruction.dest is not None:
+                    if instruction.dest in defined:
+                        raise Exception(f"{where}: %{instruction.dest} is defined twice")
+                    defined.add(instruction.dest)
+                    available.add(instruction.dest)
+            for successor in block.successors():
+                if successor == self.blocks[0].name:
+                    raise Exception(f"{where}: jumps to the first block")
+
+    def dump(self) -> str:
+        """
+        Returns:
+            str: the IR as text, a block per paragraph.
+        """
+        lines = [f"function {self.name} {self.n_locals}"]
+        for block in self.blocks:
+            params = ', '.join(f"%{temp}" for temp in block.params)
+            lines.append(f"{block.name}({params}):" if block.params else f"{block.name}:")
+            lines.extend(f"    {instruction}" for instruction in block.instructions)
+        return '\n'.join(lines) + '\n'
+
+    def lower(self) -> typing.List[str]:
+        """
+        Returns:
+            typing.List[str]: the lines of VM code of the subroutine.
+        """
+        uses = [0] * self.n_temps
+        for block in self.blocks:
+            for instruction in block.instructions:
+                for operand in instruction.operands:
+                    uses[operand] += 1
+        # Temporaries kept in local variables instead of on the stack. This
+        # grows until every instruction finds its operands on the stack.
+        spilled = {temp for temp, count in enumerate(uses) if count > 1}
+        # The blocks after each block, and the blocks jumped to
+        following = [block.name for block in self.blocks[1:]] + [None]
+        targets = set()
+        for block, next_block in zip(self.blocks, following):
+            targets.update(target for target in block.successors() if target != next_block)
+            if block.instructions[-1].op == 'if-goto':
+                targets.add(block.instructions[-1].attributes[0])
+        while True:
+            slots = {temp: self.n_locals + i for i, temp in enumerate(sorted(spilled))}
+            output = [f"function {self.name} {self.n_locals + len(slots)}\n"]
+            misplaced = set()
+            for block, next_block in zip(self.blocks, following):
+                if block.labelled or block.name in targets:
+                    output.append(f"label {block.name}\n")
+                misplaced |= self._lower_block(block, next_block, uses, slots, output)
+            if not misplaced:
+                return output
+            spilled |= misplaced
+
+    @staticmethod
+    def _lower_block(block: IRBlock, following: typing.Optional[str], uses: typing.List[int],
+                     slots: typing.Dict[int, int], output: typing.List[str]) -> typing.Set[int]:
+        """Appends the VM code of a block, after its label, to output.
+
+        Returns:
+            set: temporaries that are not on top of the stack where they are
+            used, and must be spilled, or nothing if the code is complete.
+        """
+        # The params on the stack: those that are used and not spilled, up to
+        # the first that is not
+        kept = 0
+        while kept < len(block.params) and block.params[kept] not in slots and uses[block.params[kept]]:
+            kept += 1
+        misplaced = {temp for temp in block.params[kept:] if uses[temp] and temp not in slots}
+        if misplaced:
+            return misplaced
+        for temp in reversed(block.params[kept:]):
+            output.append(f"pop {LOCAL} {slots[temp]}\n" if temp in slots else f"pop {TEMP} 0\n")
+        stack = block.params[:kept]
+
+        for instruction in block.instructions:
+            operands = instruction.operands
+            on_stack = 0
+            while on_stack < len(operands) and operands[on_stack] not in slots:
+                on_stack += 1
+            if any(operand not in slots for operand in operands[on_stack:]) or \
+                    stack[len(stack) - on_stack:] != list(operands[:on_stack]):
+                # Any further code is wrong until these are spilled
+                return {operand for operand in operands if operand not in slots}
+            del stack[len(stack) - on_stack:]
+            for operand in operands[on_stack:]:
+                output.append(f"push {LOCAL} {slots[operand]}\n")
+
+            op = instruction.op
+            if op == 'push':
+                segment, value = instruction.attributes
+                if segment == CONST and value < 0:
+                    # push constant only takes 0..32767
+                    output.append(f"push {CONST} {~value}\n")
+                    output.append(f"{unop_dict['~']}\n")
+                else:
+                    output.append(f"push {segment} {value}\n")
+            elif op == 'pop':
+                output.append(f"pop {instruction.attributes[0]} {instruction.attributes[1]}\n")
+            elif op == 'call':
+                output.append(f"call {instruction.attributes[0]} {len(operands)}\n")
+            elif op == 'goto':
+                if instruction.attributes[0] != following:
+                    output.append(f"goto {instruction.attributes[0]}\n")
+            elif op == 'if-goto':
+                output.append(f"if-goto {instruction.attributes[0]}\n")
+                if instruction.attributes[1] != following:
+                    output.append(f"goto {instruction.attributes[1]}\n")
+            elif op == 'return':
+                output.append("return\n")
+            elif op == 'end':
+                pass
+            else:
+                output.append(f"{op}\n")
+
+            dest = instruction.dest
+            if dest is not None:
+                if not uses[dest]:
+                    output.append(f"pop {TEMP} 0\n")
+                elif dest in slots:
+                    output.append(f"pop {LOCAL} {slots[dest]}\n")
+                else:
+                    stack.append(dest)
+        return set()
+
+
+def _arity(instruction: Instruction, blocks: typing.Dict[str, IRBlock]) -> typing.Optional[int]:
+    """
+    Returns:
+        int: the number of operands the instruction takes, or None if it is
+        not a valid instruction.
+    """
+    op = instruction.op
+    if op == 'push':
+        return 0
+    if op == 'pop' or op == 'return' or op in _unary_commands:
+        return 1
+    if op in _binary_commands:
+        return 2
+    if op == 'call' or op == 'end':
+        return len(instruction.operands)
+    if op in ('goto', 'if-goto'):
+        targets = [blocks.get(target) for target in instruction.attributes]
+        if not targets or None in targets or len({len(target.params) for target in targets}) != 1:
+            return None
+        return len(targets[0].params) + (op == 'if-goto')
+    return None
+
+
+def _stack_heights(name: str, vm_blocks: typing.List[typing.List[str]], names: typing.List[str],
+                   index: typing.Dict[str, int]) -> typing.List[typing.Optional[int]]:
+    """
+    Returns:
+        list: for each block of VM code, the number of values on the stack
+        when it starts, or None if the block cannot be reached.
+    """
+    heights = [None] * len(vm_blocks)
+    heights[0] = 0
+    pending = [0]
+    while pending:
+        i = pending.pop()
+        height = heights[i]
+        successors = [i + 1] if i + 1 < len(vm_blocks) else []
+        for line in vm_blocks[i]:
+            words = line.split()
+            op = words[0]
+            if op == 'push':
+                height += 1
+            elif op == 'pop' or op in _binary_commands:
+                height -= 1
+            elif op == 'call':
+                height += 1 - int(words[2])
+            elif op == 'if-goto':
+                height -= 1
+            elif op == 'goto' or op == 'return':
+                successors = []
+            target = jump_target(line)
+            if target is not None:
+                if target not in index:
+                    raise Exception(f"{name}: jumps to the unknown label {target}")
+                successors.append(index[target])
+        for successor in successors:
+            if heights[successor] is None:
+                heights[successor] = height
+                pending.append(successor)
+            elif heights[successor] != height:
+                raise Exception(f"{name}: the stack height at {names[successor]} differs between jumps")
+    return heights
+
+
+def fold_constants(code: ThreeAddressCode) -> None:
+    """Computes arithmetic on constants at compile time, and drops the
+    pushes whose values are no longer used."""
+    for block in code.blocks:
+        values = dict()
+        for instruction in block.instructions:
+            op = instruction.op
+            if op == 'push' and instruction.attributes[0] == CONST:
+                values[instruction.dest] = instruction.attributes[1]
+            elif (op in _binary_commands or op in _unary_commands) and \
+                    all(operand in values for operand in instruction.operands):
+                function = _binary_commands.get(op) or _unary_commands[op]
+                value = function(*(values[operand] for operand in instruction.operands))
+                instruction.op, instruction.operands = 'push', ()
+                instruction.attributes = (CONST, value)
+                values[instruction.dest] = value
+
+    uses = [0] * code.n_temps
+    for block in code.blocks:
+        for instruction in block.instructions:
+            for operand in instruction.operands:
+                uses[operand] += 1
+    for block in code.blocks:
+        # Backwards, so the operands of a dropped instruction may go too
+        kept = []
+        for instruction in reversed(block.instructions):
+            if instruction.op == 'push' and not uses[instruction.dest]:
+                continue
+            kept.append(instruction)
+        block.instructions = kept[::-1]
+
+
+# Passes over the IR, by name, in the order IROptimizer applies them
+ir_passes = {'fold': fold_constants}
+
+
+class IROptimizer:
+    """Takes the VM code of each subroutine through the IR, as a VMWriter
+    pass: builds its ThreeAddressCode, applies the IR passes, verifies the
+    result and lowers it back to VM code."""
+
+    def __init__(self, passes: typing.Iterable[str] = tuple(ir_passes)) -> None:
+        """
+        Args:
+            passes (typing.Iterable[str]): names of the passes to apply, in
+            order (see ir_passes).
+        """
+        self.passes = tuple(passes)
+
+    def optimize(self, commands: typing.List[str]) -> typing.List[str]:
+        """
+        Args:
+            commands (typing.List[str]): lines of VM code of a subroutine.
+
+        Returns:
+            typing.List[str]: the lines, through the IR.
+        """
+        code = ThreeAddressCode.from_vm(commands)
+        for name in self.passes:
+            ir_passes[name](code)
+        code.verify()
+        return code.lower()
+
+
+if "__main__" == __name__:
+    # Builds the IR of VM code, from any compiler, and runs passes on it, so
+    # passes can be tried and timed without the front end
+    parser = argparse.ArgumentParser(prog="ThreeAddressCode")
+    parser.add_argument("input_path", help="a .vm file, or a directory of them")
+    parser.add_argument("--pass", dest="passes", action="append", default=[],
+                        choices=tuple(ir_passes),
+                        help="apply this IR pass, may be given more than once")
+    parser.add_argument("--dump", action="store_true",
+                        help="print the IR of every subroutine after the passes")
+    parser.add_argument("--write", action="store_true",
+                        help="write the lowered IR back to the .vm files")
+    args = parser.parse_args()
+    argument_path = os.path.abspath(args.input_path)
+    if os.path.isdir(argument_path):
+        input_paths = sorted(os.path.join(argument_path, filename)
+                             for filename in os.listdir(argument_path)
+                             if os.path.splitext(filename)[1].lower() == ".vm")
+    else:
+        input_paths = [argument_path]
+
+    # Stage -> seconds spent in it
+    seconds = dict.fromkeys(('build', *args.passes, 'verify', 'lower'), 0.0)
+    commands_in = commands_out = 0
+    for input_path in input_paths:
+        with open(input_path, 'r') as input_file:
+            lines = [line.split('//')[0].strip() for line in input_file]
+        lines = [line + '\n' for line in lines if line]
+        commands_in += len(lines)
+        output = []
+        for subroutine in subroutines(lines):
+            start = time.perf_counter()
+            code = ThreeAddressCode.from_vm(subroutine)
+            seconds['build'] += time.perf_counter() - start
+            for stage in ('build', *args.passes):
+                if stage != 'build':
+                    start = time.perf_counter()
+                    ir_passes[stage](code)
+                    seconds[stage] += time.perf_counter() - start
+                start = time.perf_counter()
+                try:
+                    code.verify()
+                except Exception as error:
+                    sys.exit(f"after {stage}: {error}")
+                seconds['verify'] += time.perf_counter() - start
+            if args.dump:
+                print(code.dump())
+            start = time.perf_counter()
+            output.extend(code.lower())
+            seconds['lower'] += time.perf_counter() - start
+        commands_out += len(output)
+        if args.write:
+            with open(input_path, 'w') as output_file:
+                output_file.write(''.join(output))
+
+    for stage, spent in seconds.items():
+        print(f"{stage:10}{spent * 1000:10.1f} ms", file=sys.stderr)
+    print(f"{commands_in} VM commands in, {commands_out} out", file=sys.stderr)
@@ -0,0 +1,133 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import itertools
+import typing
+from array import array
+
+from Constants import *
+from LineIndex import LineIndex
+
+
+class TokenBuffer:
+    """A fully tokenized input, stored as parallel arrays: a type code, an
+    index into a table of distinct (interned) token values and a source offset
+    per token. A cursor walks the arrays, so advancing and looking ahead are
+    O(1) and never re-classify a token.
+
+    Offers the same interface as JackTokenizer, so it can be handed to the
+    CompilationEngine in its place.
+    """
+
+    def __init__(self, tokens: typing.Iterable[typing.Tuple[str, typing.Union[str, int], int, int]],
+                 line_index: LineIndex) -> None:
+        """Stores the given tokens.
+
+        Args:
+            tokens (typing.Iterable): (token type, token, offset, length)
+            tuples, as produced by JackTokenizer.
+            line_index (LineIndex): the line index of the source.
+        """
+        self.line_index = line_index
+        self.types = array('B')
+        self.value_ids = array('I')
+        self.offsets = array('I')
+        self.values = []
+
+        value_ids = dict()
+        for token_type, token, offset, _ in tokens:
+            # Type is part of the key, so the int 1 and the string "1" differ
+            key = (token_type, token)
+            value_id = value_ids.get(key)
+            if value_id is None:
+                value_id = value_ids[key] = len(self.values)
+                self.values.append(token)
+            self.types.append(token_type_codes[token_type])
+            self.value_ids.append(value_id)
+            self.offsets.append(offset)
+
+        self.cursor = -1
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    def has_more_tokens(self) -> bool:
+        """Do we have more tokens in the input?
+
+        Returns:
+            bool: True if there are more tokens, False otherwise.
+        """
+        return self.cursor + 1 < len(self.types)
+
+    def advance(self) -> bool:
+        """Moves the cursor to the next token.
+
+        Returns:
+            bool: True if there was a next token, False otherwise.
+        """
+        if self.cursor + 1 >= len(self.types):
+            return False
+        self.cursor += 1
+        return True
+
+    def peek(self, k: int = 1) -> typing.Tuple[typing.Optional[str], typing.Union[str, int, None]]:
+        """
+        Args:
+            k (int): how many tokens past the current token to look.
+
+        Returns:
+            tuple: the type and value of the k-th next token, or (None, None)
+            if the input ends before it.
+        """
+        cursor = self.cursor + k
+        if cursor >= len(self.types):
+            return None, None
+        return token_types[self.types[cursor]], self.values[self.value_ids[cursor]]
+
+    def token_type(self) -> str:
+        """
+        Returns:
+            str: the type of the current token, can be
+            "KEYWORD", "SYMBOL", "IDENTIFIER", "INT_CONST", "STRING_CONST"
+        """
+        return token_types[self.types[self.cursor]]
+
+    def value(self) -> typing.Union[str, int]:
+        """
+        Returns:
+            the current token, whatever its type. String constants are given
+            without their double quotes.
+        """
+        return self.values[self.value_ids[self.cursor]]
+
+    keyword = symbol = identifier = int_val = string_val = value
+
+    def coded_tokens(self) -> typing.Iterator[typing.Tuple[int, typing.Union[str, int], int]]:
+        """
+        Returns:
+            typing.Iterator: the tokens after the current one, as (token type
+            code, token, offset) triples. Walks the arrays without moving the
+            cursor.
+        """
+        start = self.cursor + 1
+        return zip(itertools.islice(self.types, start, None),
+                   map(self.values.__getitem__, itertools.islice(self.value_ids, start, None)),
+                   itertools.islice(self.offsets, start, None))
+
+    def offset(self) -> int:
+        """
+        Returns:
+            int: the offset of the current token in the input.
+        """
+        return self.offsets[self.cursor]
+
+    def position(self) -> typing.Tuple[int, int]:
+        """
+        Returns:
+            tuple: the line and column of the current token, starting from 1.
+        """
+        return self.line_index.position(self.offsets[self.cursor])
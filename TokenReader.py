@@ -0,0 +1,89 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+
+from Constants import *
+from JackTokenizer import JackTokenizer
+
+# The current token once the input is exhausted
+END_OF_INPUT = (None, None, None)
+
+primitive_types = frozenset(("int", "char", "boolean"))
+
+class_var_kinds = frozenset(("static", "field"))
+
+subroutine_kinds = frozenset(("constructor", "function", "method"))
+
+
+class TokenReader:
+    """Reads the tokens of a JackTokenizer or TokenBuffer one at a time, for
+    the JackParser and the CompilationEngine.
+
+    The current token is kept in three attributes: its type as a small
+    integer code (see Constants.token_types), its value and its offset.
+    """
+
+    def __init__(self, input_stream: typing.Union[JackTokenizer, "TokenBuffer"]) -> None:
+        """
+        Args:
+            input_stream: a JackTokenizer or a TokenBuffer. The reader
+            consumes its coded_tokens().
+        """
+        self.tokenizer = input_stream
+        self._tokens = input_stream.coded_tokens()
+        self.type, self.token, self.offset = None, None, None
+
+    def advance(self) -> None:
+        """Makes the next token the current token."""
+        self.type, self.token, self.offset = next(self._tokens, END_OF_INPUT)
+
+    def error(self, message: str, offset: typing.Optional[int] = None) -> Exception:
+        """
+        Args:
+            message (str): what went wrong.
+            offset (int): where, by default at the current token.
+
+        Returns:
+            Exception: an error pointing at the source position.
+        """
+        if offset is None:
+            offset = self.offset
+        if offset is None:
+            return Exception(f"end of input: {message}")
+        line, column = self.tokenizer.line_index.position(offset)
+        return Exception(f"line {line}, column {column}: {message}")
+
+    def unexpected(self, expected: str) -> Exception:
+        token_type = token_types[self.type] if self.type is not None else None
+        return self.error(f"expected {expected}, got type:{token_type}, value:{self.token}")
+
+    def expect(self, symbol: str) -> None:
+        """Skips over the given symbol, which must be the current token."""
+        if self.token != symbol or self.type != SYMBOL_CODE:
+            raise self.unexpected(repr(symbol))
+        self.type, self.token, self.offset = next(self._tokens, END_OF_INPUT)
+
+    def expect_identifier(self) -> str:
+        """Skips over the current token, which must be an identifier, and
+        returns it.
+        """
+        name = self.token
+        if self.type != IDENTIFIER_CODE:
+            raise self.unexpected("an identifier")
+        self.type, self.token, self.offset = next(self._tokens, END_OF_INPUT)
+        return name
+
+    def expect_type(self) -> str:
+        """Skips over the current token, which must be a type, and returns
+        it.
+        """
+        _type = self.token
+        if self.type != IDENTIFIER_CODE and (self.type != KEYWORD_CODE or _type not in primitive_types):
+            raise self.unexpected("a type")
+        self.type, self.token, self.offset = next(self._tokens, END_OF_INPUT)
+        return _type
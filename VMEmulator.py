@@ -0,0 +1,421 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import collections
+import os
+import sys
+import typing
+
+from Constants import *
+from Profile import Profile
+
+# Where the segments of the Hack RAM start
+SP, LCL, ARG_BASE, THIS_BASE, THAT_BASE, TEMP_BASE, STATIC_BASE, STACK_BASE, HEAP_BASE, SCREEN_BASE, KEYBOARD = \
+    0, 1, 2, 3, 4, 5, 16, 256, 2048, 16384, 24576
+
+DEFAULT_MAX_STEPS = 10_000_000
+
+# The OS classes Sys.init initializes, in its order, before it calls Main.main
+os_init_classes = ('Memory', 'Math', 'Screen', 'Output', 'Keyboard')
+
+# The Jack character set codes that differ from ASCII
+NEW_LINE, BACKSPACE, DOUBLE_QUOTE = 128, 129, 34
+
+
+def word(value: int) -> int:
+    """The value as a signed 16-bit Hack word."""
+    value &= 0xFFFF
+    return value - 0x10000 if value & 0x8000 else value
+
+
+class _Halt(Exception):
+    """Raised by Sys.halt."""
+
+
+class VMEmulator:
+    """Runs the VM code of a program, and counts how often each subroutine
+    is called and each label is passed, for a Profile.
+
+    The OS subroutines the program does not define itself are built in:
+    Output prints to the output stream, Keyboard reads lines from the input
+    stream and no key is ever pressed, Screen draws nothing, and Memory
+    allocates from a heap that is never freed. Execution starts at Sys.init
+    if the program defines it. Otherwise, as the built-in Sys.init would,
+    the init of each OS class the program defines runs first, and then
+    Main.main.
+
+    Profiling a program:
+
+        JackCompiler.py --instrument Prog
+        VMEmulator.py Prog --profile Prog.profile
+        JackCompiler.py -O all --profile Prog.profile Prog
+    """
+
+    def __init__(self, input_paths: typing.Iterable[str],
+                 output_stream: typing.TextIO = sys.stdout,
+                 input_stream: typing.TextIO = sys.stdin) -> None:
+        """
+        Args:
+            input_paths (typing.Iterable[str]): the .vm files of the program.
+            output_stream (typing.TextIO): Output writes here.
+            input_stream (typing.TextIO): Keyboard reads from here.
+        """
+        self.output_stream = output_stream
+        self.input_stream = input_stream
+        # Commands as (command, first argument, second argument) tuples, and
+        # for each the subroutine it belongs to and the base of the static
+        # segment of its class
+        self.code = []
+        self.subroutine_of = []
+        self.static_base_of = []
+        # Subroutine -> index of its function command
+        self.functions = dict()
+        # (subroutine, label) -> index of the label command
+        self.label_index = dict()
+        static_base = STATIC_BASE
+        for input_path in input_paths:
+            n_statics = 0
+            subroutine = None
+            with open(input_path, 'r') as input_file:
+                for line in input_file:
+                    words = line.split('//')[0].split()
+                    if not words:
+                        continue
+                    command = words[0]
+                    if command == 'function':
+                        subroutine = words[1]
+                        self.functions[subroutine] = len(self.code)
+                    elif command == 'label':
+                        self.label_index[(subroutine, words[1])] = len(self.code)
+                    elif command in ('push', 'pop') and words[1] == STATIC:
+                        n_statics = max(n_statics, int(words[2]) + 1)
+                    argument = words[2] if command in ('push', 'pop', 'function', 'call') else None
+                    self.code.append((command, words[1] if len(words) > 1 else None,
+                                      int(argument) if argument is not None else None))
+                    self.subroutine_of.append(subroutine)
+                    self.static_base_of.append(static_base)
+            static_base += n_statics
+
+        self.ram = [0] * (KEYBOARD + 1)
+        self.heap = HEAP_BASE
+        self.steps = 0
+        self.calls = collections.Counter()
+        self.label_counts = collections.Counter()
+
+    def profile(self) -> Profile:
+        """
+        Returns:
+            Profile: the counts of the run so far, including the subroutines
+            and labels of the program that were never reached.
+        """
+        profile = Profile()
+        for name in self.functions:
+            profile.calls[name] = self.calls[name]
+        for key in self.label_index:
+            profile.labels[key] = self.label_counts[key]
+        return profile
+
+    def run(self, max_steps: int = DEFAULT_MAX_STEPS) -> bool:
+        """Runs the program until it halts, or for at most max_steps VM
+        commands.
+
+        Returns:
+            bool: whether the program halted.
+        """
+        ram = self.ram
+        ram[SP] = STACK_BASE
+        if 'Sys.init' in self.functions:
+            entries = ['Sys.init']
+        else:
+            entries = [f"{class_name}.init" for class_name in os_init_classes
+                       if f"{class_name}.init" in self.functions] + ['Main.main']
+        if entries[-1] not in self.functions:
+            raise Exception("The program has no Main.main")
+        # Each entry subroutine returns to -1, and then the next one is called
+        entries.reverse()
+        pc = self.call(entries.pop(), 0, -1)
+        code, subroutine_of, static_base_of = self.code, self.subroutine_of, self.static_base_of
+        try:
+            while self.steps < max_steps:
+                self.steps += 1
+                command, first, second = code[pc]
+                pc += 1
+                if command == 'push':
+                    self.push(ram[self.address(first, second, static_base_of[pc - 1])]
+                              if first != CONST else second)
+                elif command == 'pop':
+                    ram[SP] -= 1
+                    ram[self.address(first, second, static_base_of[pc - 1])] = ram[ram[SP]]
+                elif command in self.binary_operations:
+                    ram[SP] -= 1
+                    right = ram[ram[SP]]
+                    ram[ram[SP] - 1] = word(self.binary_operations[command](ram[ram[SP] - 1], right))
+                elif command in self.unary_operations:
+                    ram[ram[SP] - 1] = word(self.unary_operations[command](ram[ram[SP] - 1]))
+                elif command == 'label':
+                    self.label_counts[(subroutine_of[pc - 1], first)] += 1
+                elif command == 'goto':
+                    pc = self.label_index[(subroutine_of[pc - 1], first)]
+                elif command == 'if-goto':
+                    ram[SP] -= 1
+                    if ram[ram[SP]]:
+                        pc = self.label_index[(subroutine_of[pc - 1], first)]
+                elif command == 'function':
+                    self.calls[first] += 1
+                    for _ in range(second):
+                        self.push(0)
+                elif command == 'call':
+                    pc = self.call(first, second, pc)
+                elif command == 'return':
+                    pc = self.return_()
+                    if pc == -1:
+                        if not entries:
+                            return True
+                        ram[SP] = STACK_BASE
+                        pc = self.call(entries.pop(), 0, -1)
+                else:
+                    raise Exception(f"Unknown VM command: {command}")
+        except _Halt:
+            return True
+        return False
+
+    def push(self, value: int) -> None:
+        ram = self.ram
+        ram[ram[SP]] = value
+        ram[SP] += 1
+
+    def address(self, segment: str, index: int, static_base: int) -> int:
+        ram = self.ram
+        if segment == LOCAL:
+            return ram[LCL] + index
+        if segment == ARG:
+            return ram[ARG_BASE] + index
+        if segment == THIS:
+            return ram[THIS_BASE] + index
+        if segment == THAT:
+            return ram[THAT_BASE] + index
+        if segment == POINTER:
+            return THIS_BASE + index
+        if segment == TEMP:
+            return TEMP_BASE + index
+        if segment == STATIC:
+            return static_base + index
+        raise Exception(f"Unknown segment: {segment}")
+
+    def call(self, name: str, n_args: int, return_address: int) -> int:
+        """Calls a subroutine, or runs it if it is a built-in OS subroutine.
+
+        Returns:
+            int: the index of the next command to run.
+        """
+        ram = self.ram
+        if name not in self.functions:
+            builtin = self.builtins.get(name)
+            if builtin is None:
+                raise Exception(f"Call of an undefined subroutine: {name}")
+            self.calls[name] += 1
+            ram[SP] -= n_args
+            arguments = ram[ram[SP]:ram[SP] + n_args]
+            result = builtin(self, *arguments)
+            self.push(word(result or 0))
+            return return_address
+        self.push(return_address)
+        for pointer in (LCL, ARG_BASE, THIS_BASE, THAT_BASE):
+            self.push(ram[pointer])
+        ram[ARG_BASE] = ram[SP] - 5 - n_args
+        ram[LCL] = ram[SP]
+        return self.functions[name]
+
+    def return_(self) -> int:
+        ram = self.ram
+        frame = ram[LCL]
+        return_address = ram[frame - 5]
+        ram[ram[ARG_BASE]] = ram[ram[SP] - 1]
+        ram[SP] = ram[ARG_BASE] + 1
+        ram[THAT_BASE], ram[THIS_BASE], ram[ARG_BASE], ram[LCL] = ram[frame - 1:frame - 5:-1]
+        return return_address
+
+    # The built-in OS
+
+    def alloc(self, size: int) -> int:
+        if size <= 0:
+            raise Exception("Memory.alloc: the size must be positive")
+        if self.heap + size > SCREEN_BASE:
+            raise Exception("Memory.alloc: the heap is full")
+        self.heap += size
+        return self.heap - size
+
+    def error(self, code: int) -> None:
+        raise Exception(f"Sys.error: {code}")
+
+    def multiply(self, x: int, y: int) -> int:
+        return x * y
+
+    def divide(self, x: int, y: int) -> int:
+        if y == 0:
+            self.error(3)
+        quotient = abs(x) // abs(y)
+        return -quotient if (x < 0) != (y < 0) else quotient
+
+    def sqrt(self, x: int) -> int:
+        if x < 0:
+            self.error(4)
+        return int(x ** 0.5)
+
+    def peek(self, address: int) -> int:
+        return self.ram[address]
+
+    def poke(self, address: int, value: int) -> None:
+        self.ram[address] = value
+
+    def new_string(self, max_length: int) -> int:
+        # Maximum length, length, then the characters
+        string = self.alloc(max_length + 2)
+        self.ram[string] = max_length
+        self.ram[string + 1] = 0
+        return string
+
+    def string_text(self, string: int) -> str:
+        ram = self.ram
+        return ''.join(self.character(ram[string + 2 + i]) for i in range(ram[string + 1]))
+
+    def append_char(self, string: int, c: int) -> int:
+        ram = self.ram
+        if ram[string + 1] >= ram[string]:
+            self.error(17)
+        ram[string + 2 + ram[string + 1]] = c
+        ram[string + 1] += 1
+        return string
+
+    def erase_last_char(self, string: int) -> None:
+        if self.ram[string + 1] == 0:
+            self.error(18)
+        self.ram[string + 1] -= 1
+
+    def int_value(self, string: int) -> int:
+        text = self.string_text(string)
+        value, negative = 0, text.startswith('-')
+        for c in text[negative:]:
+            if not c.isdigit():
+                break
+            value = value * 10 + int(c)
+        return -value if negative else value
+
+    def set_int(self, string: int, value: int) -> None:
+        self.ram[string + 1] = 0
+        for c in str(value):
+            self.append_char(string, ord(c))
+
+    @staticmethod
+    def character(c: int) -> str:
+        return {NEW_LINE: '\n', BACKSPACE: '\b'}.get(c, chr(c))
+
+    def print_text(self, text: str) -> None:
+        self.output_stream.write(text)
+
+    def read_line(self, message: int) -> int:
+        self.print_text(self.string_text(message))
+        text = self.input_stream.readline().rstrip('\n')
+        string = self.new_string(max(len(text), 1))
+        for c in text:
+            self.append_char(string, ord(c))
+        return string
+
+    def read_char(self) -> int:
+        c = self.input_stream.read(1)
+        return NEW_LINE if c in ('', '\n') else ord(c)
+
+    def halt(self) -> None:
+        raise _Halt()
+
+    builtins = {'Math.init': lambda self: 0,
+                'Math.abs': lambda self, x: abs(x),
+                'Math.multiply': multiply,
+                'Math.divide': divide,
+                'Math.min': lambda self, x, y: min(x, y),
+                'Math.max': lambda self, x, y: max(x, y),
+                'Math.sqrt': sqrt,
+                'Memory.init': lambda self: 0,
+                'Memory.peek': peek,
+                'Memory.poke': poke,
+                'Memory.alloc': alloc,
+                'Memory.deAlloc': lambda self, address: 0,
+                'Array.new': alloc,
+                'Array.dispose': lambda self, array: 0,
+                'String.new': new_string,
+                'String.dispose': lambda self, string: 0,
+                'String.length': lambda self, string: self.ram[string + 1],
+                'String.charAt': lambda self, string, i: self.ram[string + 2 + i],
+                'String.setCharAt': lambda self, string, i, c: self.poke(string + 2 + i, c),
+                'String.appendChar': append_char,
+                'String.eraseLastChar': erase_last_char,
+                'String.intValue': int_value,
+                'String.setInt': set_int,
+                'String.backSpace': lambda self: BACKSPACE,
+                'String.doubleQuote': lambda self: DOUBLE_QUOTE,
+                'String.newLine': lambda self: NEW_LINE,
+                'Output.init': lambda self: 0,
+                'Output.moveCursor': lambda self, row, column: 0,
+                'Output.printChar': lambda self, c: self.print_text(self.character(c)),
+                'Output.printString': lambda self, string: self.print_text(self.string_text(string)),
+                'Output.printInt': lambda self, i: self.print_text(str(i)),
+                'Output.println': lambda self: self.print_text('\n'),
+                'Output.backSpace': lambda self: self.print_text('\b'),
+                'Screen.init': lambda self: 0,
+                'Screen.clearScreen': lambda self: 0,
+                'Screen.setColor': lambda self, black: 0,
+                'Screen.drawPixel': lambda self, x, y: 0,
+                'Screen.drawLine': lambda self, x1, y1, x2, y2: 0,
+                'Screen.drawRectangle': lambda self, x1, y1, x2, y2: 0,
+                'Screen.drawCircle': lambda self, x, y, r: 0,
+                'Keyboard.init': lambda self: 0,
+                'Keyboard.keyPressed': lambda self: 0,
+                'Keyboard.readChar': read_char,
+                'Keyboard.readLine': read_line,
+                'Keyboard.readInt': lambda self, message: self.int_value(self.read_line(message)),
+                'Sys.halt': halt,
+                'Sys.error': error,
+                'Sys.wait': lambda self, duration: 0}
+
+    binary_operations = {'add': lambda x, y: x + y,
+                         'sub': lambda x, y: x - y,
+                         'and': lambda x, y: x & y,
+                         'or': lambda x, y: x | y,
+                         'eq': lambda x, y: -(x == y),
+                         'gt': lambda x, y: -(x > y),
+                         'lt': lambda x, y: -(x < y)}
+
+    unary_operations = {'neg': lambda x: -x,
+                        'not': lambda x: ~x,
+                        'shiftleft': lambda x: x << 1,
+                        'shiftright': lambda x: x >> 1}
+
+
+if "__main__" == __name__:
+    parser = argparse.ArgumentParser(prog="VMEmulator")
+    parser.add_argument("input_path", help="a .vm file, or a directory of them")
+    parser.add_argument("--profile",
+                        help="write how often each subroutine was called and "
+                             "each label passed to this file, for "
+                             "JackCompiler --profile")
+    parser.add_argument("--max-steps", type=int, default=DEFAULT_MAX_STEPS,
+                        help="stop after this many VM commands "
+                             "(default: %(default)s)")
+    args = parser.parse_args()
+    argument_path = os.path.abspath(args.input_path)
+    if os.path.isdir(argument_path):
+        input_paths = sorted(os.path.join(argument_path, filename)
+                             for filename in os.listdir(argument_path)
+                             if os.path.splitext(filename)[1].lower() == ".vm")
+    else:
+        input_paths = [argument_path]
+    emulator = VMEmulator(input_paths)
+    if not emulator.run(args.max_steps):
+        print(f"\nstopped after {emulator.steps} VM commands", file=sys.stderr)
+    if args.profile:
+        emulator.profile().save(args.profile)
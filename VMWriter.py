@@ -11,11 +11,24 @@ import typing
 class VMWriter:
     """
     Writes VM commands into a file. Encapsulates the VM command syntax.
+    Commands are buffered until flush() is called, which the compilation
+    engine does after every subroutine, so memory is bounded by the largest
+    subroutine rather than by the file, and optimization passes can rewrite
+    a whole subroutine before it is written.
     """
 
-    def __init__(self, output_stream: typing.TextIO) -> None:
-        """Creates a new file and prepares it for writing VM commands."""
+    def __init__(self, output_stream: typing.TextIO, passes: typing.Sequence = ()) -> None:
+        """Creates a new file and prepares it for writing VM commands.
+
+        Args:
+            output_stream (typing.TextIO): the file.
+            passes (typing.Sequence): optimizers, such as PeepholeOptimizer,
+            whose optimize() rewrites the lines of each subroutine on flush(),
+            in order.
+        """
         self.output_stream = output_stream
+        self.passes = passes
+        self._commands = []
 
     def write_push(self, segment: str, index: int) -> None:
         """Writes a VM push command.
@@ -25,7 +38,7 @@ class VMWriter:
             "LOCAL", "STATIC", "THIS", "THAT", "POINTER", "TEMP"
             index (int): the index to push to.
         """
-        self.output_stream.write(f"push {segment} {index}\n")
+        self._commands.append(f"push {segment} {index}\n")
 
     def write_pop(self, segment: str, index: int) -> None:
         """Writes a VM pop command.
@@ -35,7 +48,7 @@ class VMWriter:
             "LOCAL", "STATIC", "THIS", "THAT", "POINTER", "TEMP".
             index (int): the index to pop from.
         """
-        self.output_stream.write(f"pop {segment} {index}\n")
+        self._commands.append(f"pop {segment} {index}\n")
 
     def write_arithmetic(self, command: str) -> None:
         """Writes a VM arithmetic command.
@@ -44,7 +57,7 @@ class VMWriter:
             command (str): the command to write, can be "ADD", "SUB", "NEG", 
             "EQ", "GT", "LT", "AND", "OR", "NOT", "SHIFTLEFT", "SHIFTRIGHT".
         """
-        self.output_stream.write(f"{command}\n")
+        self._commands.append(f"{command}\n")
 
     def write_label(self, label: str) -> None:
         """Writes a VM label command.
@@ -52,7 +65,7 @@ class VMWriter:
         Args:
             label (str): the label to write.
         """
-        self.output_stream.write(f"label {label}\n")
+        self._commands.append(f"label {label}\n")
 
     def write_goto(self, label: str) -> None:
         """Writes a VM goto command.
@@ -60,7 +73,7 @@ class VMWriter:
         Args:
             label (str): the label to go to.
         """
-        self.output_stream.write(f"goto {label}\n")
+        self._commands.append(f"goto {label}\n")
 
     def write_if(self, label: str) -> None:
         """Writes a VM if-goto command.
@@ -68,7 +81,7 @@ class VMWriter:
         Args:
             label (str): the label to go to.
         """
-        self.output_stream.write(f"if-goto {label}\n")
+        self._commands.append(f"if-goto {label}\n")
 
     def write_call(self, name: str, n_args: int) -> None:
         """Writes a VM call command.
@@ -77,7 +90,7 @@ class VMWriter:
             name (str): the name of the function to call.
             n_args (int): the number of arguments the function receives.
         """
-        self.output_stream.write(f"call {name} {n_args}\n")
+        self._commands.append(f"call {name} {n_args}\n")
 
     def write_function(self, name: str, n_locals: int) -> None:
         """Writes a VM function command.
@@ -86,8 +99,17 @@ class VMWriter:
             name (str): the name of the function.
             n_locals (int): the number of local variables the function uses.
         """
-        self.output_stream.write(f"function {name} {n_locals}\n")
+        self._commands.append(f"function {name} {n_locals}\n")
 
     def write_return(self) -> None:
         """Writes a VM return command."""
-        self.output_stream.write("return\n")
+        self._commands.append("return\n")
+
+    def flush(self) -> None:
+        """Writes all buffered commands to the output stream and flushes it."""
+        commands = self._commands
+        for optimizer in self.passes:
+            commands = optimizer.optimize(commands)
+        self.output_stream.write(''.join(commands))
+        self.output_stream.flush()
+        self._commands = []